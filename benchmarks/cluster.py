@@ -0,0 +1,276 @@
+"""
+cluster load generator - starts N EasyRpcServer nodes on local uvicorn ports
+in a chain, ring or tree topology, each registering M functions, & reports
+
+    per-hop latency - p50 / p99 latency of calls from a proxy on node 0 to a
+        function on each node, with the hops to the node from node 0's routing table
+    registry traffic - bytes/sec of registry configs & updates sent by each node
+        over a steady --window of seconds, see cluster_node.MeasuredServer
+    convergence - seconds until node 0 routes to every function, & until every
+        route has the fewest hops possible within the topology, after the cluster
+        starts & after the last node leaves & rejoins, latency is measured once
+        routes converge
+
+    python benchmarks/cluster.py [--topology chain|ring|tree] [--nodes 4] [--functions 10]
+        [--fanout 2] [--calls 200] [--window 10] [--json] [--output results.json]
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+# runnable from a source checkout, servers started are passed the same path
+REPO_DIR = os.path.dirname(BENCHMARKS_DIR)
+sys.path.insert(0, REPO_DIR)
+PYTHONPATH = os.pathsep.join(filter(None, [REPO_DIR, os.environ.get('PYTHONPATH')]))
+
+from easyrpc.proxy import EasyRpcProxy
+
+HOST = '127.0.0.1'
+SERVER_SECRET = 'abcd1234'
+TOPOLOGIES = {'chain', 'ring', 'tree'}
+
+def wait_for_port(port: int, timeout: float = 30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            with socket.create_connection((HOST, port), timeout=1):
+                return
+        except OSError:
+            time.sleep(0.1)
+    raise Exception(f"node did not start on port {port} within {timeout}s")
+
+def start_node(node: int, args):
+    env = {
+        **os.environ,
+        'PYTHONPATH': PYTHONPATH,
+        'EASYRPC_NODE': str(node),
+        'EASYRPC_NODES': str(args.nodes),
+        'EASYRPC_TOPOLOGY': args.topology,
+        'EASYRPC_FANOUT': str(args.fanout),
+        'EASYRPC_FUNCTIONS': str(args.functions),
+        'EASYRPC_BASE_PORT': str(args.base_port),
+    }
+    process = subprocess.Popen(
+        [
+            sys.executable, '-m', 'uvicorn',
+            '--app-dir', BENCHMARKS_DIR,
+            '--host', HOST,
+            '--port', str(args.base_port + node),
+            '--log-level', 'warning',
+            'cluster_node:server'
+        ],
+        env=env
+    )
+    wait_for_port(args.base_port + node)
+    return process
+
+def stop_node(process):
+    process.terminate()
+    process.wait()
+
+def expected_hops(nodes: set, args) -> dict:
+    """
+    returns {node: hops} of the shortest path from node 0 to each of `nodes`,
+    edges mirror the connections made by cluster_node.parents
+    """
+    edges = {node: set() for node in nodes}
+    for node in nodes:
+        if args.topology == 'tree':
+            parents = [(node - 1) // args.fanout] if node else []
+        elif args.topology == 'ring':
+            parents = [node - 1] if node else []
+            if node == 0 and args.nodes > 2:
+                parents.append(args.nodes - 1)
+        else:
+            parents = [node - 1] if node else []
+        for parent in parents:
+            if parent in edges:
+                edges[node].add(parent)
+                edges[parent].add(node)
+    hops = {0: 0}
+    frontier = [0]
+    while frontier:
+        node = frontier.pop(0)
+        for neighbour in edges[node]:
+            if not neighbour in hops:
+                hops[neighbour] = hops[node] + 1
+                frontier.append(neighbour)
+    return hops
+
+async def wait_for_routes(proxy, nodes: set, args):
+    """
+    waits until node 0 routes to every function of `nodes` & to no function of
+    other nodes, then until each route has the fewest hops possible, returns
+    (seconds until routed, seconds until converged)
+    """
+    expected = expected_hops(nodes, args)
+    start = time.perf_counter()
+    deadline = start + args.timeout
+    routed_s = None
+    while time.perf_counter() < deadline:
+        try:
+            routes = await proxy['node_0_routes']()
+        except Exception:
+            routes = {}
+        routed = {}
+        longer = {} # node -> hops of routes longer than expected
+        for f_name, route in routes.items():
+            if '_func_' in f_name:
+                node = int(f_name.split('_')[1])
+                routed[node] = routed.get(node, 0) + 1
+                if not route['hops'] == expected.get(node):
+                    longer[node] = route['hops']
+        if set(routed) == nodes and all(count == args.functions for count in routed.values()):
+            if routed_s is None:
+                routed_s = time.perf_counter() - start
+            if not longer:
+                return routed_s, time.perf_counter() - start
+        await asyncio.sleep(0.05)
+    raise Exception(
+        f"node 0 routes did not converge within {args.timeout}s - routed nodes {sorted(routed)}, "
+        f"hops {longer} expected {expected}"
+    )
+
+def slope(points: list):
+    """
+    least squares slope of [(x, y)]
+    """
+    if len(set(x for x, _ in points)) < 2:
+        return 0.0
+    mean_x = statistics.mean(x for x, _ in points)
+    mean_y = statistics.mean(y for _, y in points)
+    return (
+        sum((x - mean_x) * (y - mean_y) for x, y in points) /
+        sum((x - mean_x) ** 2 for x, _ in points)
+    )
+
+async def measure_latency(proxy, args):
+    await proxy.get_all_registered_functions()
+    routes = await proxy['node_0_routes']()
+    latency = {}
+    for node in range(args.nodes):
+        f_name = f"node_{node}_func_0"
+        function = proxy[f_name]
+        latencies = []
+        for _ in range(args.calls):
+            start = time.perf_counter()
+            await function(node)
+            latencies.append(time.perf_counter() - start)
+        latencies.sort()
+        latency[node] = {
+            'hops': routes[f_name]['hops'],
+            'p50_ms': latencies[len(latencies) // 2] * 1000,
+            'p99_ms': latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000
+        }
+    return latency
+
+async def node_stats(proxy, args):
+    return {
+        node: await proxy[f"node_{node}_stats"]() for node in range(args.nodes)
+    }
+
+async def measure_registry_traffic(proxy, args):
+    await proxy.get_all_registered_functions()
+    before = await node_stats(proxy, args)
+    await asyncio.sleep(args.window)
+    after = await node_stats(proxy, args)
+    traffic = {
+        node: {
+            'bytes_per_sec': (after[node]['registry_bytes'] - before[node]['registry_bytes']) / args.window,
+            'requests': after[node]['registry_requests'] - before[node]['registry_requests'],
+            'pushes': after[node]['registry_pushes'] - before[node]['registry_pushes'],
+            'total_bytes': after[node]['registry_bytes']
+        }
+        for node in range(args.nodes)
+    }
+    return {
+        'bytes_per_sec': sum(node['bytes_per_sec'] for node in traffic.values()),
+        'nodes': traffic
+    }
+
+async def run(args, processes: list):
+    proxy = await EasyRpcProxy.create(
+        HOST,
+        args.base_port,
+        '/ws/cluster',
+        server_secret=SERVER_SECRET,
+        namespace='ring' if args.topology == 'ring' else 'shared'
+    )
+    all_nodes = set(range(args.nodes))
+    routed_s, converged_s = await wait_for_routes(proxy, all_nodes, args)
+    results = {
+        'topology': args.topology,
+        'nodes': args.nodes,
+        'functions': args.functions,
+        'startup_routed_s': routed_s,
+        'startup_convergence_s': converged_s
+    }
+
+    latency = await measure_latency(proxy, args)
+    results['latency'] = latency
+    results['per_hop_ms'] = slope([(node['hops'], node['p50_ms']) for node in latency.values()])
+    results['registry'] = await measure_registry_traffic(proxy, args)
+
+    if args.nodes > 1:
+        last = args.nodes - 1
+        stop_node(processes[last])
+        _, results['leave_convergence_s'] = await wait_for_routes(proxy, all_nodes - {last}, args)
+
+        start = time.perf_counter()
+        processes[last] = start_node(last, args)
+        await wait_for_routes(proxy, all_nodes, args)
+        results['join_convergence_s'] = time.perf_counter() - start
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--topology', default='chain', choices=sorted(TOPOLOGIES))
+    parser.add_argument('--nodes', type=int, default=4)
+    parser.add_argument('--functions', type=int, default=10, help='functions registered per node')
+    parser.add_argument('--fanout', type=int, default=2, help='children per node within a tree')
+    parser.add_argument('--base-port', type=int, default=8340)
+    parser.add_argument('--calls', type=int, default=200, help='calls per node measuring latency')
+    parser.add_argument('--window', type=float, default=10, help='seconds measuring registry traffic')
+    parser.add_argument('--timeout', type=float, default=120, help='seconds waiting for convergence')
+    parser.add_argument('--json', action='store_true', help='emit results as json')
+    parser.add_argument('--output', help='write json results to file')
+    args = parser.parse_args()
+
+    processes = []
+    try:
+        for node in range(args.nodes):
+            processes.append(start_node(node, args))
+        results = asyncio.run(run(args, processes))
+    finally:
+        for process in processes:
+            stop_node(process)
+
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump(results, output, indent=2)
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"{args.topology} - {args.nodes} nodes, {args.functions} functions per node")
+    print(f"startup routed      {results['startup_routed_s']:>10.3f} s")
+    print(f"startup convergence {results['startup_convergence_s']:>10.3f} s")
+    for node, latency in results['latency'].items():
+        print(
+            f"node {node:<3} hops {latency['hops']:<3}"
+            f" p50 {latency['p50_ms']:>8.3f} ms p99 {latency['p99_ms']:>8.3f} ms"
+        )
+    print(f"per hop             {results['per_hop_ms']:>10.3f} ms")
+    print(f"registry traffic    {results['registry']['bytes_per_sec']:>10.1f} bytes/s")
+    if 'leave_convergence_s' in results:
+        print(f"leave convergence   {results['leave_convergence_s']:>10.3f} s")
+        print(f"join convergence    {results['join_convergence_s']:>10.3f} s")
+
+if __name__ == '__main__':
+    main()
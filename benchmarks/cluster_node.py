@@ -0,0 +1,116 @@
+"""
+cluster node used by benchmarks/cluster.py, started with uvicorn & configured
+by environment variables
+
+    EASYRPC_NODE - index of node, port is EASYRPC_BASE_PORT + index
+    EASYRPC_NODES - nodes within the cluster
+    EASYRPC_TOPOLOGY - chain | ring | tree
+    EASYRPC_FANOUT - children per node within a tree
+    EASYRPC_FUNCTIONS - functions registered on the node
+    EASYRPC_BASE_PORT - port of node 0
+"""
+import os
+import time
+import pickle
+import asyncio
+from fastapi import FastAPI
+from easyrpc.server import EasyRpcServer
+
+SERVER_SECRET = 'abcd1234'
+HOST = '127.0.0.1'
+
+NODE = int(os.environ.get('EASYRPC_NODE', 0))
+NODES = int(os.environ.get('EASYRPC_NODES', 3))
+TOPOLOGY = os.environ.get('EASYRPC_TOPOLOGY', 'chain')
+FANOUT = int(os.environ.get('EASYRPC_FANOUT', 2))
+FUNCTIONS = int(os.environ.get('EASYRPC_FUNCTIONS', 10))
+BASE_PORT = int(os.environ.get('EASYRPC_BASE_PORT', 8340))
+
+NAMESPACE = 'ring' if TOPOLOGY == 'ring' else 'shared'
+
+def parents(node: int):
+    """
+    returns [(parent node, namespace)] node connects to within TOPOLOGY
+
+        chain - node <- node + 1
+        tree - node <- node * FANOUT + 1 ... node * FANOUT + FANOUT
+        ring - chain within 'left', node 0 -> last node within 'right'
+    """
+    if TOPOLOGY == 'tree':
+        return [((node - 1) // FANOUT, 'shared')] if node else []
+    if TOPOLOGY == 'ring':
+        connections = [(node - 1, 'left')] if node else []
+        if node == 0 and NODES > 2:
+            connections.append((NODES - 1, 'right'))
+        return connections
+    return [(node - 1, 'shared')] if node else []
+
+class MeasuredServer(EasyRpcServer):
+    """
+    counts registry configs & updates sent by the node, sizes are of the
+    pickled config
+    """
+    stats = {'registry_bytes': 0, 'registry_requests': 0, 'registry_pushes': 0}
+
+    def get_registry_config(self, *args, **kwargs):
+        config = super().get_registry_config(*args, **kwargs)
+        self.stats['registry_requests'] += 1
+        self.stats['registry_bytes'] += len(pickle.dumps(config))
+        return config
+
+    async def server_request(self, client_id, request, *args, **kwargs):
+        if isinstance(request, dict) and request.get('action') == 'REGISTRY_UPDATE':
+            self.stats['registry_pushes'] += 1
+            self.stats['registry_bytes'] += len(pickle.dumps(request))
+        return await super().server_request(client_id, request, *args, **kwargs)
+
+server = FastAPI()
+started = time.time()
+
+@server.on_event('startup')
+async def setup():
+    node_server = MeasuredServer(server, '/ws/cluster', server_secret=SERVER_SECRET)
+    if TOPOLOGY == 'ring':
+        node_server.create_namespace_group('ring', 'left', 'right')
+
+    def create_function(name: str):
+        async def function(value=None):
+            return value
+        function.__name__ = name
+        return function
+
+    for index in range(FUNCTIONS):
+        node_server.origin(create_function(f"node_{NODE}_func_{index}"), namespace=NAMESPACE)
+
+    # named per node, nodes reach the stats & routes of every other node
+    async def node_stats():
+        return {
+            **MeasuredServer.stats,
+            'node': NODE,
+            'uptime': time.time() - started
+        }
+    node_stats.__name__ = f"node_{NODE}_stats"
+    node_server.origin(node_stats, namespace=NAMESPACE)
+
+    async def node_routes():
+        return node_server.get_routing_table(NAMESPACE)
+    node_routes.__name__ = f"node_{NODE}_routes"
+    node_server.origin(node_routes, namespace=NAMESPACE)
+
+    async def connect(parent: int, namespace: str):
+        # parents within a ring may start after this node
+        while True:
+            try:
+                await node_server.create_server_proxy(
+                    HOST,
+                    BASE_PORT + parent,
+                    '/ws/cluster',
+                    server_secret=SERVER_SECRET,
+                    namespace=namespace
+                )
+                return
+            except Exception:
+                await asyncio.sleep(0.5)
+
+    for parent, namespace in parents(NODE):
+        asyncio.create_task(connect(parent, namespace))
@@ -0,0 +1,215 @@
+"""
+loopback benchmark - throughput & latency of EasyRpcProxy calls to an
+EasyRpcServer started with uvicorn on a local port
+
+    python benchmarks/loopback.py [--calls 2000] [--scenarios tiny,large_pickle]
+        [--json] [--output results.json] [--baseline results.json] [--tolerance 0.2]
+
+scenarios:
+    tiny - single int argument & result
+    large_pickle / large_json - `--payload-bytes` payload, pickle or json codec
+    small_json - small dict payload, json codec
+    encrypted / encrypted_off - small dict payload with & without encryption
+    generator - items of a generator, each call yields `--generator-items` items
+    concurrent - `--concurrency` callers sharing one proxy
+
+with --baseline, exits 1 if any scenario's throughput dropped or p99 latency
+rose by more than --tolerance compared with the baseline results
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+# runnable from a source checkout, servers started are passed the same path
+REPO_DIR = os.path.dirname(BENCHMARKS_DIR)
+sys.path.insert(0, REPO_DIR)
+PYTHONPATH = os.pathsep.join(filter(None, [REPO_DIR, os.environ.get('PYTHONPATH')]))
+
+from easyrpc.proxy import EasyRpcProxy
+
+HOST = '127.0.0.1'
+SERVER_SECRET = 'abcd1234'
+
+SMALL = {'id': 1, 'name': 'small', 'tags': ['a', 'b', 'c'], 'value': 1.5}
+
+SCENARIOS = {
+    'tiny': {'value': lambda args: 1},
+    'small_json': {'value': lambda args: SMALL, 'serialization': 'json'},
+    'large_pickle': {'value': lambda args: 'x' * args.payload_bytes},
+    'large_json': {'value': lambda args: 'x' * args.payload_bytes, 'serialization': 'json'},
+    'encrypted_off': {'value': lambda args: SMALL},
+    'encrypted': {'value': lambda args: SMALL, 'encryption_enabled': True},
+    'generator': {'value': lambda args: SMALL, 'generator': True},
+    'concurrent': {'value': lambda args: SMALL, 'concurrent': True},
+}
+
+def start_server(port: int, timeout: float = 30):
+    """
+    starts uvicorn serving benchmarks/loopback_server.py, waits until port accepts connections
+    """
+    process = subprocess.Popen(
+        [
+            sys.executable, '-m', 'uvicorn',
+            '--app-dir', BENCHMARKS_DIR,
+            '--host', HOST,
+            '--port', str(port),
+            '--log-level', 'warning',
+            'loopback_server:server'
+        ],
+        env={**os.environ, 'PYTHONPATH': PYTHONPATH}
+    )
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            with socket.create_connection((HOST, port), timeout=1):
+                return process
+        except OSError:
+            time.sleep(0.2)
+    process.terminate()
+    raise Exception(f"benchmark server did not start on port {port} within {timeout}s")
+
+def summarize(latencies: list, elapsed: float, calls: int, items: int = None):
+    latencies = sorted(latencies)
+    def percentile(p):
+        return latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000
+    result = {
+        'calls': calls,
+        'seconds': elapsed,
+        'calls_per_sec': calls / elapsed,
+        'p50_ms': percentile(0.50),
+        'p99_ms': percentile(0.99),
+        'mean_ms': statistics.mean(latencies) * 1000
+    }
+    if items is not None:
+        result['items_per_sec'] = items / elapsed
+    return result
+
+async def run_scenario(name: str, port: int, args):
+    scenario = SCENARIOS[name]
+    proxy = await EasyRpcProxy.create(
+        HOST,
+        port,
+        '/ws/bench_encrypted' if scenario.get('encryption_enabled') else '/ws/bench',
+        server_secret=SERVER_SECRET,
+        namespace='bench',
+        serialization=scenario.get('serialization', 'pickle'),
+        encryption_enabled=scenario.get('encryption_enabled', False),
+        stream_window=args.stream_window
+    )
+    value = scenario['value'](args)
+    echo, generate = proxy['echo'], proxy['generate']
+
+    async def call():
+        start = time.perf_counter()
+        if scenario.get('generator'):
+            async for _ in await generate(args.generator_items, value):
+                pass
+        else:
+            await echo(value)
+        return time.perf_counter() - start
+
+    # warm up connection, codec & dispatch tables
+    for _ in range(min(args.calls, 50)):
+        await call()
+
+    latencies = []
+    concurrency = args.concurrency if scenario.get('concurrent') else 1
+    calls = iter(range(args.calls))
+
+    async def caller():
+        for _ in calls:
+            latencies.append(await call())
+
+    start = time.perf_counter()
+    await asyncio.gather(*[caller() for _ in range(concurrency)])
+    elapsed = time.perf_counter() - start
+
+    await proxy.cleanup_proxy_session()
+    result = summarize(
+        latencies,
+        elapsed,
+        args.calls,
+        items=args.calls * args.generator_items if scenario.get('generator') else None
+    )
+    result['concurrency'] = concurrency
+    return result
+
+def compare(results: dict, baseline: dict, tolerance: float):
+    """
+    returns list of regressions of results compared with baseline
+    """
+    regressions = []
+    for name, result in results.items():
+        if not name in baseline:
+            continue
+        previous = baseline[name]
+        if result['calls_per_sec'] < previous['calls_per_sec'] * (1 - tolerance):
+            regressions.append(
+                f"{name}: calls_per_sec {result['calls_per_sec']:.1f} < baseline {previous['calls_per_sec']:.1f}"
+            )
+        if result['p99_ms'] > previous['p99_ms'] * (1 + tolerance):
+            regressions.append(
+                f"{name}: p99_ms {result['p99_ms']:.3f} > baseline {previous['p99_ms']:.3f}"
+            )
+    return regressions
+
+async def run(args):
+    results = {}
+    for name in args.scenarios:
+        results[name] = await run_scenario(name, args.port, args)
+        if not args.json:
+            result = results[name]
+            print(
+                f"{name:<14} {result['calls_per_sec']:>10.1f} calls/s"
+                f" p50 {result['p50_ms']:>8.3f} ms p99 {result['p99_ms']:>8.3f} ms"
+            )
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--calls', type=int, default=2000)
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS), help='comma separated scenarios')
+    parser.add_argument('--port', type=int, default=8330)
+    parser.add_argument('--payload-bytes', type=int, default=1_000_000)
+    parser.add_argument('--generator-items', type=int, default=100)
+    parser.add_argument('--stream-window', type=int, default=0, help='generator items per chunk')
+    parser.add_argument('--concurrency', type=int, default=50)
+    parser.add_argument('--json', action='store_true', help='emit results as json')
+    parser.add_argument('--output', help='write json results to file')
+    parser.add_argument('--baseline', help='json results to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.2)
+    args = parser.parse_args()
+    args.scenarios = args.scenarios.split(',')
+    for name in args.scenarios:
+        if not name in SCENARIOS:
+            parser.error(f"unknown scenario {name} - available: {list(SCENARIOS)}")
+
+    server = start_server(args.port)
+    try:
+        results = asyncio.run(run(args))
+    finally:
+        server.terminate()
+        server.wait()
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump(results, output, indent=2)
+    if args.baseline:
+        with open(args.baseline) as baseline:
+            regressions = compare(results, json.load(baseline), args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,35 @@
+"""
+origin server used by benchmarks/loopback.py, started with uvicorn
+
+    uvicorn --app-dir benchmarks loopback_server:server --port 8330
+"""
+from fastapi import FastAPI
+from easyrpc.server import EasyRpcServer
+
+server = FastAPI()
+
+SERVER_SECRET = 'abcd1234'
+
+bench_server = EasyRpcServer(
+    server,
+    '/ws/bench',
+    server_secret=SERVER_SECRET,
+    dispatch_mode='concurrent'
+)
+encrypted_server = EasyRpcServer(
+    server,
+    '/ws/bench_encrypted',
+    server_secret=SERVER_SECRET,
+    encryption_enabled=True,
+    dispatch_mode='concurrent'
+)
+
+for rpc_server in [bench_server, encrypted_server]:
+    @rpc_server.origin(namespace='bench')
+    async def echo(value):
+        return value
+
+    @rpc_server.origin(namespace='bench')
+    async def generate(count: int, value):
+        for _ in range(count):
+            yield value
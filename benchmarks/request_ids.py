@@ -0,0 +1,58 @@
+"""
+micro benchmark - per call cost of allocating a request id & tracking
+it within a pending requests table
+
+    python benchmarks/request_ids.py [--calls 1000000] [--json]
+"""
+import argparse
+import itertools
+import json
+import time
+import uuid
+
+def bench_uuid1(calls: int):
+    requests = {}
+    start = time.perf_counter()
+    for _ in range(calls):
+        request_id = str(uuid.uuid1())
+        requests[request_id] = None
+        del requests[request_id]
+    return time.perf_counter() - start
+
+def bench_counter(calls: int):
+    requests = {}
+    request_ids = itertools.count(1)
+    start = time.perf_counter()
+    for _ in range(calls):
+        request_id = next(request_ids)
+        requests[request_id] = None
+        del requests[request_id]
+    return time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--calls', type=int, default=1_000_000)
+    parser.add_argument('--json', action='store_true', help='emit results as json')
+    args = parser.parse_args()
+
+    results = {}
+    for name, bench in [('uuid1', bench_uuid1), ('counter', bench_counter)]:
+        elapsed = bench(args.calls)
+        results[name] = {
+            'calls': args.calls,
+            'seconds': elapsed,
+            'ns_per_call': elapsed / args.calls * 1e9
+        }
+    results['saved_ns_per_call'] = (
+        results['uuid1']['ns_per_call'] - results['counter']['ns_per_call']
+    )
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    for name in ['uuid1', 'counter']:
+        print(f"{name:<8} {results[name]['ns_per_call']:>10.1f} ns/call")
+    print(f"saved    {results['saved_ns_per_call']:>10.1f} ns/call")
+
+if __name__ == '__main__':
+    main()
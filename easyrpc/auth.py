@@ -1,5 +1,15 @@
+import os
+import hmac
+import struct
+import hashlib
 import jwt
 
+# optional - required for session encryption
+try:
+    from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+except ImportError:
+    AESGCM = None
+
 def encode(secret, log=None, **kw):
     try:
         return jwt.encode(kw, secret, algorithm='HS256')
@@ -12,4 +22,61 @@ def decode(token, secret, log=None):
         return jwt.decode(token, secret, algorithms='HS256')
     except Exception as e:
         if log:
-            log.exception(f"error decoding token {token} using {secret}")
\ No newline at end of file
+            log.exception(f"error decoding token {token} using {secret}")
+
+def session_encryption_supported():
+    return AESGCM is not None
+
+def create_session_nonce():
+    return os.urandom(16).hex()
+
+def derive_session_keys(secret: str, client_nonce: str, server_nonce: str):
+    """
+    HKDF-SHA256 of secret salted with both setup nonces, returns
+    (client_key, server_key) - one key for each direction
+    """
+    salt = bytes.fromhex(client_nonce) + bytes.fromhex(server_nonce)
+    prk = hmac.new(salt, secret.encode(), hashlib.sha256).digest()
+    okm, block = b'', b''
+    for counter in range(1, 3):
+        block = hmac.new(prk, block + b'easyrpc session' + bytes([counter]), hashlib.sha256).digest()
+        okm += block
+    return okm[:32], okm[32:]
+
+class SessionCipher:
+    """
+    AES-GCM encryption of each websocket frame using keys derived once
+    during setup, frames are prefixed by a 12 byte nonce holding a per
+    direction counter, frames received out of order or replayed are rejected
+    """
+    nonce = struct.Struct('!4xQ')
+    def __init__(self, send_key: bytes, receive_key: bytes):
+        if not AESGCM:
+            raise Exception(f"session encryption requires the 'cryptography' package")
+        self.send_aead = AESGCM(send_key)
+        self.receive_aead = AESGCM(receive_key)
+        self.send_count = 0
+        self.receive_count = 0
+
+    @classmethod
+    def create(cls, secret: str, client_nonce: str, server_nonce: str, side: str):
+        """
+        side: 'client' | 'server'
+        """
+        client_key, server_key = derive_session_keys(secret, client_nonce, server_nonce)
+        if side == 'client':
+            return cls(client_key, server_key)
+        return cls(server_key, client_key)
+
+    def encrypt(self, data: bytes) -> bytes:
+        nonce = self.nonce.pack(self.send_count)
+        self.send_count += 1
+        return nonce + self.send_aead.encrypt(nonce, data, None)
+
+    def decrypt(self, frame: bytes) -> bytes:
+        (count,) = self.nonce.unpack_from(frame)
+        if not count == self.receive_count:
+            raise Exception(f"unexpected session frame {count} - expected {self.receive_count}")
+        data = self.receive_aead.decrypt(frame[:self.nonce.size], frame[self.nonce.size:], None)
+        self.receive_count += 1
+        return data
@@ -0,0 +1,121 @@
+import time
+import itertools
+from inspect import isawaitable
+from contextvars import ContextVar
+
+BALANCE_POLICIES = {'first', 'round_robin', 'least_in_flight', 'ewma'}
+
+# set while calling a remote provider - origins return errors as {'RPC_ERROR': repr(e)}
+# which proxy functions raise as RemoteCallError, rather than returning repr(e)
+raise_remote_errors = ContextVar('raise_remote_errors', default=False)
+
+class Provider:
+    """
+    a function providing f_name within a namespace group
+
+    available - callable returning False while the provider's connection is
+        down, None if always available
+    in_flight - calls awaiting a result
+    latency - exponentially weighted moving average of call latency, seconds
+    failed - time of last failure, providers are skipped for `cooldown`
+        seconds after failing while other providers are available
+    """
+    def __init__(self, func, available=None):
+        self.func = func
+        self.available = available
+        self.in_flight = 0
+        self.latency = 0.0
+        self.failed = None
+    def __repr__(self):
+        return f"Provider({self.func.__name__}, in_flight={self.in_flight}, latency={self.latency:.4f})"
+
+    def healthy(self, cooldown: float) -> bool:
+        if self.available and not self.available():
+            return False
+        return self.failed is None or time.monotonic() - self.failed > cooldown
+
+class BalancedFunction:
+    """
+    calls one of several providers of the same function within a namespace
+    group, failing over to the next provider if a call raises, a remote provider
+    returns an error or a provider's connection is down
+
+    policies:
+        first - providers in the order found
+        round_robin - each provider in turn
+        least_in_flight - provider with the fewest calls awaiting a result
+        ewma - provider with the lowest latency average, weighted by its
+            calls in flight
+    """
+    def __init__(self, name: str, policy: str = 'round_robin', cooldown: float = 5, decay: float = 0.3, log=None):
+        if not policy in BALANCE_POLICIES:
+            raise Exception(f"balance policy {policy} is not one of {BALANCE_POLICIES}")
+        self.__name__ = name
+        self.policy = policy
+        self.cooldown = cooldown
+        self.decay = decay
+        self.log = log
+        self.providers = []
+        self.turns = itertools.count()
+
+    def __len__(self):
+        return len(self.providers)
+
+    def update(self, providers: list):
+        """
+        replaces providers with list of (func, available), keeping the
+        stats of providers whose function is unchanged
+        """
+        existing = {id(provider.func): provider for provider in self.providers}
+        self.providers = []
+        for func, available in providers:
+            provider = existing.get(id(func)) or Provider(func, available)
+            provider.available = available
+            self.providers.append(provider)
+
+    def order(self) -> list:
+        """
+        returns providers in the order they should be tried, healthy
+        providers first
+        """
+        providers = self.providers
+        if self.policy == 'round_robin':
+            turn = next(self.turns) % len(providers)
+            providers = providers[turn:] + providers[:turn]
+        elif self.policy == 'least_in_flight':
+            providers = sorted(providers, key=lambda provider: provider.in_flight)
+        elif self.policy == 'ewma':
+            providers = sorted(
+                providers,
+                key=lambda provider: provider.latency * (provider.in_flight + 1)
+            )
+        healthy = [provider for provider in providers if provider.healthy(self.cooldown)]
+        return healthy + [provider for provider in providers if not provider in healthy]
+
+    async def __call__(self, *args, **kwargs):
+        error = None
+        for provider in self.order():
+            provider.in_flight += 1
+            start = time.monotonic()
+            remote = raise_remote_errors.set(provider.available is not None)
+            try:
+                result = provider.func(*args, **kwargs)
+                if isawaitable(result):
+                    result = await result
+            except Exception as e:
+                provider.failed = time.monotonic()
+                if self.log:
+                    self.log.error(f"{self.__name__} provider failed, trying next provider - {repr(e)}")
+                error = e
+                continue
+            finally:
+                raise_remote_errors.reset(remote)
+                provider.in_flight -= 1
+            latency = time.monotonic() - start
+            provider.latency = (
+                latency if not provider.latency else
+                self.decay * latency + (1 - self.decay) * provider.latency
+            )
+            provider.failed = None
+            return result
+        raise error
@@ -0,0 +1,91 @@
+import asyncio
+
+from easyrpc.sigtools import wire_arguments
+
+class RpcBatch:
+    """
+    collects calls to functions within a proxy namespace and sends them to
+    the origin as a single BATCH request, each call returns a future which
+    is resolved once the batch is executed
+
+        async with proxy.batch() as batch:
+            a = batch['add'](1, 2)
+            b = batch['subtract'](6, 1)
+        a.result(), b.result()
+
+    concurrent = True
+        calls are run concurrently on the origin, else run in order
+    """
+    def __init__(self, proxy, concurrent: bool = False):
+        self.proxy = proxy
+        self.concurrent = concurrent
+        self.requests = []
+        self.futures = []
+
+    def __len__(self):
+        return len(self.requests)
+
+    def __getitem__(self, func_name):
+        # raises IndexError if function is not in namespace
+        func = self.proxy[func_name]
+        def batch_call(*args, **kwargs) -> asyncio.Future:
+            validate = getattr(func, 'validate', None)
+            if validate:
+                validate(*args, **kwargs)
+                args, kwargs = wire_arguments(args, kwargs)
+            future = asyncio.get_running_loop().create_future()
+            self.requests.append({
+                'action': func_name,
+                'args': list(args),
+                'kwargs': kwargs
+            })
+            self.futures.append(future)
+            return future
+        batch_call.__name__ = func_name
+        return batch_call
+
+    async def execute(self):
+        """
+        sends collected calls as a single request, returns list of results
+        in call order
+        """
+        requests, futures = self.requests, self.futures
+        self.requests, self.futures = [], []
+        if not requests:
+            return []
+        try:
+            results = await self.proxy.proxy_request(
+                {
+                    'action': 'BATCH',
+                    'requests': requests,
+                    'concurrent': self.concurrent
+                }
+            )
+            if not isinstance(results, list):
+                raise Exception(f"unexpected batch response: {results}")
+            for i, result in enumerate(results):
+                if hasattr(result, '__contains__') and 'GENERATOR_START' in result:
+                    generator = await self.proxy.proxy_generator(
+                        result['GENERATOR_START']
+                    )
+                    # SERVER proxies register generators with the server instead
+                    if generator:
+                        results[i] = generator
+        except BaseException as e:
+            for future in futures:
+                if not future.done():
+                    future.set_exception(e)
+            raise
+        for future, result in zip(futures, results):
+            future.set_result(result)
+        return results
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            await self.execute()
+        else:
+            for future in self.futures:
+                future.cancel()
@@ -0,0 +1,46 @@
+import time
+from typing import Optional
+from collections import deque
+
+class WireCapture:
+    """
+    samples 1 in every `sample` websocket frames, counted separately for sent
+    & received frames, into a ring buffer of the last `size` frames, each
+    truncated to max_bytes - frames of encrypted sessions are captured as
+    sent, encrypted
+
+        capture = WireCapture(sample=100)
+        capture.record('sent', session_id, frame)
+        capture.frames()
+    """
+    def __init__(self, sample: int = 100, size: int = 1000, max_bytes: int = 256):
+        if sample < 1:
+            raise Exception(f"wire capture sample must be at least 1")
+        self.sample = sample
+        self.max_bytes = max_bytes
+        self.buffer = deque(maxlen=size)
+        self.seen = {'sent': 0, 'received': 0}
+
+    def record(self, direction: str, session_id, frame):
+        seen = self.seen[direction] = self.seen.get(direction, 0) + 1
+        if seen % self.sample:
+            return
+        data = frame[:self.max_bytes]
+        if isinstance(data, (bytes, bytearray)):
+            # readable & serializable by any codec
+            data = bytes(data).decode(errors='backslashreplace')
+        self.buffer.append({
+            'time': time.time(),
+            'direction': direction, # sent | received
+            'session_id': session_id,
+            'size': len(frame),
+            'truncated': len(frame) > self.max_bytes,
+            'frame': data
+        })
+
+    def frames(self, limit: Optional[int] = None) -> list:
+        """
+        returns captured frames, oldest first, or the last `limit` frames
+        """
+        frames = list(self.buffer)
+        return frames[-limit:] if limit else frames
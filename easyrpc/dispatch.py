@@ -0,0 +1,65 @@
+import asyncio
+from concurrent.futures._base import CancelledError
+
+DISPATCH_MODES = {'inline', 'concurrent'}
+
+class RequestDispatcher:
+    """
+    runs incoming ws_action requests for a single websocket connection
+
+    dispatch modes:
+        inline - each request is awaited before the next frame is read (default)
+        concurrent - each request runs as its own task, at most `max_concurrency`
+            requests may be in-flight, once reached the receiver waits for a
+            free slot before reading the next frame (backpressure)
+    """
+    def __init__(self, handler, mode: str = 'inline', max_concurrency: int = 100, log=None):
+        if not mode in DISPATCH_MODES:
+            raise Exception(f"dispatch mode {mode} is not one of {DISPATCH_MODES}")
+        self.handler = handler
+        self.mode = mode
+        self.max_concurrency = max_concurrency
+        self.limiter = asyncio.Semaphore(max_concurrency) if mode == 'concurrent' else None
+        self.tasks = {} # request_id: task
+        self.log = log
+
+    @property
+    def in_flight(self):
+        return len(self.tasks)
+
+    async def dispatch(self, request, request_id, response_expected):
+        if self.mode == 'inline':
+            return await self.handler(request, request_id, response_expected)
+
+        await self.limiter.acquire()
+        task = asyncio.create_task(
+            self.handler(request, request_id, response_expected)
+        )
+        self.tasks[request_id] = task
+        task.add_done_callback(lambda task: self._task_done(request_id, task))
+
+    def _task_done(self, request_id, task):
+        if self.tasks.get(request_id) is task:
+            del self.tasks[request_id]
+        self.limiter.release()
+        if task.cancelled():
+            return
+        exception = task.exception()
+        if exception and self.log and not isinstance(exception, CancelledError):
+            self.log.error(f"error dispatching request: {repr(exception)}")
+
+    def cancel_request(self, request_id):
+        """
+        cancels an in-flight request after its caller was cancelled or timed out,
+        requests run inline are not cancelled
+        """
+        task = self.tasks.get(request_id)
+        if task:
+            task.cancel()
+
+    def cancel(self):
+        """
+        cancels all in-flight requests, used once the connection has closed
+        """
+        for task in list(self.tasks.values()):
+            task.cancel()
@@ -0,0 +1,226 @@
+import asyncio
+import struct
+
+# message kinds
+REQUEST = 1
+RESPONSE = 2
+PING = 3
+PONG = 4
+CANCEL = 5
+
+# flags
+RESPONSE_EXPECTED = 0x01
+
+class DictEnvelope:
+    """
+    default envelope, messages are serialized as
+    {'ws_action': {'type', 'request' | 'response', 'request_id', 'response_expected'}}
+    """
+    name = 'dict'
+    def __init__(self, codec):
+        self.codec = codec
+        self.binary = codec.binary
+
+    def request(self, request_id, request, response_expected=True):
+        return {
+            'ws_action': {
+                'type': 'request',
+                'response_expected': response_expected,
+                'request': request,
+                'request_id': request_id
+            }
+        }
+    def response(self, request_id, response):
+        return {
+            'ws_action': {
+                'type': 'response',
+                'response': response,
+                'request_id': request_id
+            }
+        }
+    def cancel(self, request_id):
+        return {
+            'ws_action': {
+                'type': 'cancel',
+                'request_id': request_id
+            }
+        }
+    def ping(self):
+        return {'ping': 'ping'}
+    def pong(self):
+        return {'pong': 'pong'}
+
+    def dumps(self, message):
+        return self.codec.dumps(message)
+
+    def loads(self, data):
+        """
+        returns (kind, request_id, response_expected, request | response)
+        """
+        message = self.codec.loads(data)
+        if not 'ws_action' in message:
+            if 'ping' in message:
+                return PING, None, False, None
+            if 'pong' in message:
+                return PONG, None, False, None
+            return None, None, False, message
+        ws_action = message['ws_action']
+        if ws_action['type'] == 'request':
+            return REQUEST, ws_action['request_id'], ws_action['response_expected'], ws_action['request']
+        if ws_action['type'] == 'response':
+            return RESPONSE, ws_action['request_id'], False, ws_action['response']
+        if ws_action['type'] == 'cancel':
+            return CANCEL, ws_action['request_id'], False, None
+        return None, ws_action.get('request_id'), False, ws_action
+
+class CompactEnvelope:
+    """
+    binary framing - fixed 10 byte header followed by the codec serialized payload
+        kind: uint8 | flags: uint8 | request_id: uint64 | payload
+    request ids must be integers
+    """
+    name = 'compact'
+    header = struct.Struct('!BBQ')
+    def __init__(self, codec):
+        self.codec = codec
+        self.binary = True
+
+    def request(self, request_id, request, response_expected=True):
+        return (REQUEST, RESPONSE_EXPECTED if response_expected else 0, request_id, request)
+    def response(self, request_id, response):
+        return (RESPONSE, 0, request_id, response)
+    def cancel(self, request_id):
+        return (CANCEL, 0, request_id, None)
+    def ping(self):
+        return (PING, 0, 0, None)
+    def pong(self):
+        return (PONG, 0, 0, None)
+
+    def dumps(self, message):
+        kind, flags, request_id, payload = message
+        header = self.header.pack(kind, flags, request_id)
+        if kind in {PING, PONG, CANCEL}:
+            return header
+        payload = self.codec.dumps(payload)
+        if not self.codec.binary:
+            payload = payload.encode()
+        return header + payload
+
+    def loads(self, data):
+        """
+        returns (kind, request_id, response_expected, request | response)
+        """
+        kind, flags, request_id = self.header.unpack_from(data)
+        if kind in {PING, PONG}:
+            return kind, None, False, None
+        if kind == CANCEL:
+            return kind, request_id, False, None
+        payload = data[self.header.size:]
+        if not self.codec.binary:
+            payload = bytes(payload).decode()
+        return kind, request_id, bool(flags & RESPONSE_EXPECTED), self.codec.loads(payload)
+
+ENVELOPES = {
+    'dict': DictEnvelope,
+    'compact': CompactEnvelope
+}
+
+def get_envelope(name: str, codec):
+    if not name in ENVELOPES:
+        raise Exception(f"no envelope with name {name} - available: {list(ENVELOPES)}")
+    return ENVELOPES[name](codec)
+
+class Coalescer:
+    """
+    packs all currently queued messages into a single websocket frame, 
+    bounded by max_bytes / max_messages, each message is prefixed by its
+    length - uint32 | message | uint32 | message ...
+    """
+    length = struct.Struct('!I')
+    def __init__(self, envelope, max_bytes: int = 1048576, max_messages: int = 256):
+        self.envelope = envelope
+        self.max_bytes = max_bytes
+        self.max_messages = max_messages
+
+    def dumps(self, message, dumps=None):
+        data = (dumps or self.envelope.dumps)(message)
+        if isinstance(data, str):
+            data = data.encode()
+        return data
+
+    def pack(self, message, queue, dumps=None):
+        """
+        returns frame containing message & messages pulled from queue
+        without waiting, each serialized by dumps, default envelope.dumps
+        """
+        frame = bytearray()
+        count = 0
+        while True:
+            data = self.dumps(message, dumps)
+            frame += self.length.pack(len(data))
+            frame += data
+            count += 1
+            if count >= self.max_messages or len(frame) >= self.max_bytes:
+                break
+            try:
+                message = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                break
+        return bytes(frame)
+
+    def split(self, frame):
+        """
+        returns list of messages within frame, ready for envelope.loads
+        """
+        messages = []
+        view = memoryview(frame)
+        offset = 0
+        while offset < len(view):
+            (size,) = self.length.unpack_from(view, offset)
+            offset += self.length.size
+            data = bytes(view[offset:offset+size])
+            messages.append(data if self.envelope.binary else data.decode())
+            offset += size
+        return messages
+
+class Wire:
+    """
+    framing for a single websocket connection - envelope, then optionally 
+    coalescing & session encryption
+
+        dumps - serializes each queued message, defaults to envelope.dumps, 
+            i.e to unwrap messages queued along with other state
+    """
+    def __init__(self, envelope, coalescer: Coalescer = None, cipher=None, dumps=None):
+        self.envelope = envelope
+        self.coalescer = coalescer
+        self.cipher = cipher
+        self.dumps = dumps or envelope.dumps
+        self.binary = envelope.binary or coalescer is not None or cipher is not None
+
+    def frame(self, message, queue):
+        """
+        returns websocket frame for message, with queued messages when coalescing
+        """
+        if self.coalescer:
+            data = self.coalescer.pack(message, queue, self.dumps)
+        else:
+            data = self.dumps(message)
+        if self.cipher:
+            if isinstance(data, str):
+                data = data.encode()
+            data = self.cipher.encrypt(data)
+        return data
+
+    def messages(self, frame):
+        """
+        returns list of (kind, request_id, response_expected, request | response)
+        within frame
+        """
+        if self.cipher:
+            frame = self.cipher.decrypt(frame)
+            if not self.coalescer and not self.envelope.binary:
+                frame = frame.decode()
+        if self.coalescer:
+            return [self.envelope.loads(data) for data in self.coalescer.split(frame)]
+        return [self.envelope.loads(frame)]
@@ -10,6 +10,24 @@ class ServerUnreachable(Exception):
             self,
             f"Proxy -> Server unreachable: server {server} - port: {port}"
         )
+class ClientConnectionClosed(Exception):
+    def __init__(self, client_id):
+        super().__init__(
+            self,
+            f"Server -> Client connection closed: client {client_id}"
+        )
+class RemoteCallError(Exception):
+    def __init__(self, error):
+        super().__init__(
+            self,
+            f"Remote call failed: {error}"
+        )
+class WorkerConnectionClosed(Exception):
+    def __init__(self, worker_id):
+        super().__init__(
+            self,
+            f"Worker -> Worker connection closed: worker {worker_id}"
+        )
 
 # exceptions that will allow proxy to retry
 KNOWN_EXCEPTIONS = (
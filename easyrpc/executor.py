@@ -0,0 +1,71 @@
+import asyncio
+from functools import partial, wraps
+from inspect import iscoroutinefunction, isasyncgenfunction, isgeneratorfunction
+from concurrent.futures import Executor, ThreadPoolExecutor, ProcessPoolExecutor
+
+EXECUTORS = {'inline', 'thread', 'process'}
+
+class OriginExecutors:
+    """
+    pools synchronous origin functions are run in, per function execution policy
+
+        inline - called on the event loop (default), for fast non-blocking functions
+        thread - run in a ThreadPoolExecutor, for blocking io
+        process - run in a ProcessPoolExecutor, for cpu bound functions, the 
+            function, args & result must be picklable
+        or a concurrent.futures.Executor instance
+
+    pools are created on first use, register_shutdown is then called once with
+    shutdown, i.e to shut pools down with the app
+    """
+    def __init__(
+        self, 
+        max_thread_workers: int = None, 
+        max_process_workers: int = None, 
+        register_shutdown=None
+    ):
+        self.max_workers = {
+            'thread': max_thread_workers,
+            'process': max_process_workers
+        }
+        self.pools = {}
+        self.register_shutdown = register_shutdown
+
+    def get_pool(self, executor: str) -> Executor:
+        if not executor in self.pools:
+            if self.register_shutdown:
+                self.register_shutdown(self.shutdown)
+                self.register_shutdown = None
+            pool_type = ThreadPoolExecutor if executor == 'thread' else ProcessPoolExecutor
+            self.pools[executor] = pool_type(max_workers=self.max_workers[executor])
+        return self.pools[executor]
+
+    def wrap(self, func, executor):
+        """
+        returns func, or a coroutine function running func within executor 
+        """
+        if executor == 'inline':
+            return func
+        if not isinstance(executor, Executor) and not executor in EXECUTORS:
+            raise Exception(f"executor {executor} is not one of {EXECUTORS} or a concurrent.futures.Executor")
+        if iscoroutinefunction(func) or isasyncgenfunction(func) or isgeneratorfunction(func):
+            raise Exception(
+                f"executor {executor} is not supported for coroutine or generator functions, "
+                f"{func.__name__} must use executor 'inline'"
+            )
+
+        @wraps(func)
+        async def run_in_executor(*args, **kwargs):
+            pool = executor if isinstance(executor, Executor) else self.get_pool(executor)
+            return await asyncio.get_running_loop().run_in_executor(
+                pool, 
+                partial(func, *args, **kwargs)
+            )
+        return run_in_executor
+
+    def shutdown(self):
+        for pool in self.pools.values():
+            # forked process workers left running keep the server's listening
+            # socket open after it exits
+            pool.shutdown(wait=True, cancel_futures=True)
+        self.pools = {}
@@ -1,10 +1,18 @@
+import time
+import asyncio
 from typing import Optional
 from easyrpc.register import  AsyncGenerator
 
+# marks end of items produced by a streaming RpcGenerator
+_END = object()
+
 class RpcGenerator:
     def __init__(self, generator):
         self.generator = generator
         self.started = False
+        self.queue = None
+        self.producer = None
+        self.ended = False
     def start(self):
         if isinstance(self.generator, AsyncGenerator):
             async def generator():
@@ -24,4 +32,251 @@ class RpcGenerator:
         except StopAsyncIteration:
             return 'GENERATOR_END'
     async def asend(self, message):
-        return await self.next()
\ No newline at end of file
+        return await self.next()
+
+    def stream(self, window: int):
+        """
+        starts producing items ahead of requests, at most `window` items
+        are buffered before the producer waits on the consumer
+        """
+        if not self.started:
+            self.start()
+        self.queue = asyncio.Queue(window)
+        async def produce():
+            try:
+                async for item in self.rpc_generator:
+                    await self.queue.put(item)
+            except Exception as e:
+                await self.queue.put(repr(e))
+            await self.queue.put(_END)
+        self.producer = asyncio.create_task(produce())
+
+    async def next_chunk(self, count: int):
+        """
+        returns up to `count` produced items, waiting only for the first
+            {'GENERATOR_ITEMS': [items], 'GENERATOR_END': bool}
+        """
+        if self.ended:
+            return {'GENERATOR_ITEMS': [], 'GENERATOR_END': True}
+        if not self.producer:
+            self.stream(count)
+        items = []
+        item = await self.queue.get()
+        while True:
+            if item is _END:
+                self.ended = True
+                break
+            items.append(item)
+            if len(items) >= count:
+                break
+            try:
+                item = self.queue.get_nowait()
+            except asyncio.QueueEmpty:
+                break
+        return {'GENERATOR_ITEMS': items, 'GENERATOR_END': self.ended}
+
+    async def close(self):
+        """
+        stops producing items & closes the underlying generator, running
+        its cleanup (finally blocks, context managers)
+        """
+        self.ended = True
+        if self.producer:
+            self.producer.cancel()
+            await asyncio.gather(self.producer, return_exceptions=True)
+            try:
+                # release a next_chunk waiting on the cancelled producer
+                self.queue.put_nowait(_END)
+            except asyncio.QueueFull:
+                pass
+        if self.started:
+            await self.rpc_generator.aclose()
+        if isinstance(self.generator, AsyncGenerator):
+            await self.generator.aclose()
+        elif hasattr(self.generator, 'close'):
+            self.generator.close()
+
+class ServerGenerators:
+    """
+    generators started on a server & awaiting GENERATOR_NEXT requests, keyed
+    by generator_id - RpcGenerators of local origins or async generators relaying
+    a generator of another session
+
+    owners - sessions whose disconnect closes the generator, i.e the session
+        a relayed generator runs on & the session consuming it
+    idle_timeout - seconds, generators without a request within idle_timeout 
+        are closed, None disables
+    max_per_owner - generators each session may have open at once, 0 disables
+    """
+    def __init__(self, log, idle_timeout: float = 300, max_per_owner: int = 100):
+        self.log = log
+        self.idle_timeout = idle_timeout
+        self.max_per_owner = max_per_owner
+        self.generators = {}
+        self.owners = {} # generator_id -> {owner}
+        self.owned = {} # owner -> {generator_id}
+        self.used = {} # generator_id -> time of last request
+        self.sweep_task = None
+
+    def __len__(self):
+        return len(self.generators)
+    def __contains__(self, generator_id):
+        return generator_id in self.generators
+
+    def get(self, generator_id, default=None):
+        """
+        returns generator, marking it as used
+        """
+        if not generator_id in self.generators:
+            return default
+        self.used[generator_id] = time.monotonic()
+        return self.generators[generator_id]
+
+    def full(self, owner) -> bool:
+        if not self.max_per_owner or owner is None:
+            return False
+        return len(self.owned.get(owner, ())) >= self.max_per_owner
+
+    def add(self, generator_id, generator, owner=None):
+        """
+        adds or replaces generator, replacing keeps the existing owners
+        """
+        self.generators[generator_id] = generator
+        self.owners.setdefault(generator_id, set())
+        self.claim(generator_id, owner)
+        self.used[generator_id] = time.monotonic()
+        self.schedule_sweep()
+
+    def claim(self, generator_id, owner):
+        """
+        adds owner to generator, closed once any of its owners disconnects
+        """
+        if generator_id in self.generators and owner is not None:
+            self.owners[generator_id].add(owner)
+            self.owned.setdefault(owner, set()).add(generator_id)
+
+    def pop(self, generator_id, default=None):
+        for owner in self.owners.pop(generator_id, ()):
+            owned = self.owned.get(owner)
+            if owned is not None:
+                owned.discard(generator_id)
+                if not owned:
+                    del self.owned[owner]
+        self.used.pop(generator_id, None)
+        return self.generators.pop(generator_id, default)
+
+    def release(self, generator_id):
+        """
+        removes an exhausted relay generator, unless since wrapped by a streaming 
+        RpcGenerator which is removed once its last chunk is sent
+        """
+        if not isinstance(self.generators.get(generator_id), RpcGenerator):
+            self.pop(generator_id)
+
+    async def close(self, generator_id):
+        generator = self.pop(generator_id)
+        if generator is None:
+            return
+        self.log.debug(f"closing generator {generator_id}")
+        try:
+            if isinstance(generator, RpcGenerator):
+                await generator.close()
+            else:
+                await generator.aclose()
+        except Exception as e:
+            self.log.error(f"error closing generator {generator_id} - {repr(e)}")
+
+    async def close_owner(self, owner):
+        """
+        closes all generators owned by session, i.e once disconnected
+        """
+        for generator_id in list(self.owned.get(owner, ())):
+            await self.close(generator_id)
+
+    def schedule_sweep(self):
+        if not self.idle_timeout or self.sweep_task:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        self.sweep_task = loop.create_task(self.sweep())
+
+    async def sweep(self):
+        """
+        closes idle generators, runs while any generators are open
+        """
+        try:
+            while self.generators:
+                await asyncio.sleep(self.idle_timeout / 2)
+                expired = time.monotonic() - self.idle_timeout
+                for generator_id, used in list(self.used.items()):
+                    if used < expired:
+                        self.log.warning(f"generator {generator_id} idle for {self.idle_timeout}s - closing")
+                        await self.close(generator_id)
+        finally:
+            self.sweep_task = None
+
+async def stream_items(send_request, generator_id, window: int = 0):
+    """
+    yields items of a generator started on another connection, `send_request`
+    sends a request on the connection & returns its response
+
+    window = 0
+        each item is requested with a GENERATOR_NEXT round-trip, None items 
+        are sent as a chunk of one item - a None response means the request failed
+    window > 0
+        items are requested in chunks of up to window items, the next chunk 
+        is requested before the current is consumed
+
+    if closed before the generator ends (aclose() or garbage collected), 
+    a GENERATOR_CLOSE is sent so the generator is closed where it runs
+    """
+    request = {'action': 'GENERATOR_NEXT', 'generator_id': generator_id}
+    ended = False
+    pending = None
+    try:
+        if not window:
+            while True:
+                result = await send_request(request)
+                if result == 'GENERATOR_END':
+                    break
+                if isinstance(result, dict) and 'GENERATOR_ERROR' in result:
+                    raise Exception(result['GENERATOR_ERROR'])
+                if result is None:
+                    raise Exception(f"unexpected generator response: {result}")
+                if isinstance(result, dict) and 'GENERATOR_ITEMS' in result:
+                    for item in result['GENERATOR_ITEMS']:
+                        yield item
+                    continue
+                yield result
+            ended = True
+            return
+
+        request['count'] = window
+        pending = asyncio.ensure_future(send_request(request))
+        while pending:
+            chunk = await pending
+            pending = None
+            if isinstance(chunk, dict) and 'GENERATOR_ERROR' in chunk:
+                raise Exception(chunk['GENERATOR_ERROR'])
+            if not isinstance(chunk, dict) or not 'GENERATOR_ITEMS' in chunk:
+                raise Exception(f"unexpected generator response: {chunk}")
+            ended = chunk['GENERATOR_END']
+            if not ended:
+                # grant credit for the next chunk, produced while this is consumed
+                pending = asyncio.ensure_future(send_request(request))
+            for item in chunk['GENERATOR_ITEMS']:
+                yield item
+    finally:
+        if pending:
+            pending.cancel()
+        if not ended:
+            try:
+                await send_request(
+                    {'action': 'GENERATOR_CLOSE', 'generator_id': generator_id}, 
+                    False
+                )
+            except Exception:
+                # connection closed, generators of closed sessions are closed by the origin
+                pass
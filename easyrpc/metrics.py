@@ -0,0 +1,146 @@
+import bisect
+
+# histogram bucket upper bounds in seconds, 4 buckets per doubling from 50us to ~107s
+BUCKETS = tuple(0.00005 * 2 ** (i / 4) for i in range(85))
+
+# `le` label values of BUCKETS, rendered once
+BUCKET_BOUNDS = tuple(f'{bound:.6g}' for bound in BUCKETS)
+
+class Histogram:
+    """
+    latency histogram with fixed log-spaced buckets, recording is a bisect
+    & an increment, quantiles are estimated from bucket upper bounds
+    """
+    __slots__ = ('counts', 'count', 'sum', 'max')
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def record(self, seconds: float):
+        self.counts[bisect.bisect_left(BUCKETS, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def quantile(self, q: float) -> float:
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank and count:
+                return min(BUCKETS[index], self.max) if index < len(BUCKETS) else self.max
+        return self.max
+
+    def snapshot(self) -> dict:
+        return {
+            'count': self.count,
+            'sum': self.sum,
+            'max': self.max,
+            'p50': self.quantile(0.50),
+            'p90': self.quantile(0.90),
+            'p99': self.quantile(0.99)
+        }
+
+class FunctionMetrics:
+    __slots__ = ('calls', 'errors', 'latency')
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.latency = Histogram()
+
+class Metrics:
+    """
+    calls, errors & latency per (namespace, function) & gauges read when a
+    snapshot is taken, collected on the event loop without locks
+
+        metrics.record(namespace, f_name, seconds, error=False)
+        metrics.gauge('pending_requests', lambda: len(pending))
+    """
+    def __init__(self):
+        self.functions = {} # (namespace, f_name) -> FunctionMetrics
+        self.gauges = {} # name -> callable returning current value
+
+    def get(self, namespace, f_name) -> FunctionMetrics:
+        key = (namespace, f_name)
+        function = self.functions.get(key)
+        if function is None:
+            function = self.functions[key] = FunctionMetrics()
+        return function
+
+    def record(self, namespace, f_name, seconds: float, error: bool = False):
+        function = self.get(namespace, f_name)
+        function.calls += 1
+        if error:
+            function.errors += 1
+        function.latency.record(seconds)
+
+    def error(self, namespace, f_name):
+        self.get(namespace, f_name).errors += 1
+
+    def gauge(self, name: str, read):
+        self.gauges[name] = read
+
+    def snapshot(self) -> dict:
+        """
+        returns {'functions': {namespace: {f_name: {'calls', 'errors', 'latency'}}}, 'gauges': {name: value}}
+        """
+        functions = {}
+        for (namespace, f_name), function in self.functions.items():
+            functions.setdefault(namespace, {})[f_name] = {
+                'calls': function.calls,
+                'errors': function.errors,
+                'latency': function.latency.snapshot()
+            }
+        return {
+            'functions': functions,
+            'gauges': {name: read() for name, read in self.gauges.items()}
+        }
+
+def format_labels(labels: dict) -> str:
+    escaped = (
+        (k, str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for k, v in labels.items()
+    )
+    return '{' + ','.join(f'{k}="{v}"' for k, v in escaped) + '}'
+
+def render_prometheus(metrics: Metrics, prefix: str = 'easyrpc', **labels) -> str:
+    """
+    returns metrics in prometheus text exposition format, `labels` are added
+    to each sample - samples of each metric family are grouped under its TYPE
+    line & every bucket bound is always present, so the series of a function
+    are the same on every scrape
+    """
+    functions = [
+        (format_labels({**labels, 'namespace': namespace, 'function': f_name}), function)
+        for (namespace, f_name), function in list(metrics.functions.items())
+    ]
+    lines = [f"# TYPE {prefix}_calls_total counter"]
+    for label_text, function in functions:
+        lines.append(f"{prefix}_calls_total{label_text} {function.calls}")
+
+    lines.append(f"# TYPE {prefix}_errors_total counter")
+    for label_text, function in functions:
+        lines.append(f"{prefix}_errors_total{label_text} {function.errors}")
+
+    lines.append(f"# TYPE {prefix}_call_seconds histogram")
+    for label_text, function in functions:
+        histogram = function.latency
+        # le label is appended to the function's labels
+        bucket_labels = label_text[:-1] + ',le="'
+        cumulative = 0
+        for bound, count in zip(BUCKET_BOUNDS, histogram.counts):
+            cumulative += count
+            lines.append(f'{prefix}_call_seconds_bucket{bucket_labels}{bound}"}} {cumulative}')
+        lines.append(f'{prefix}_call_seconds_bucket{bucket_labels}+Inf"}} {histogram.count}')
+        lines.append(f"{prefix}_call_seconds_sum{label_text} {histogram.sum}")
+        lines.append(f"{prefix}_call_seconds_count{label_text} {histogram.count}")
+
+    for name, read in metrics.gauges.items():
+        lines.append(f"# TYPE {prefix}_{name} gauge")
+        lines.append(f"{prefix}_{name}{format_labels(labels)} {read()}")
+    return '\n'.join(lines) + '\n'
@@ -8,17 +8,25 @@ class Origin:
         self.obj = obj
         self._register = get_origin_register(obj)
 
-    def __call__(self, func=None, namespace='DEFAULT'):
+    def __call__(self, func=None, namespace='DEFAULT', executor='inline'):
         """
         used to register function with a defined namespace
+
+        executor - where synchronous functions are run when called
+            inline - on the event loop (default)
+            thread | process - in the server's thread or process pool
+            or a concurrent.futures.Executor instance
         """
+        if not executor == 'inline' and not hasattr(self.obj, 'executors'):
+            raise Exception(f"executor {executor} is only supported for functions registered on an EasyRpcServer")
         def register_in_namespace(func):
             namespaces = [namespace]
             if self.obj.kind == 'SERVER' and namespace in self.obj.namespace_groups:
                 namespaces = list(self.obj.namespace_groups[namespace])
             for n_space in namespaces:
                 self.obj.log.debug(f"ORIGIN - registered function {func.__name__} in {n_space} namespace")
-                function = self._register(func, namespace=n_space)
+                function = self._register(func, namespace=n_space, executor=executor)
+            self.obj.invalidate_dispatch()
             return function
         if not func:
             return register_in_namespace
@@ -0,0 +1,60 @@
+import asyncio
+
+class PendingRequests:
+    """
+    requests awaiting a response, tracked as futures keyed by request id
+
+    entries are always removed once the response arrives, the waiter times
+    out or is cancelled, or the connection owning the request fails
+    """
+    def __init__(self):
+        self.futures = {}
+        self.owners = {}
+
+    def __contains__(self, request_id):
+        return request_id in self.futures
+    def __len__(self):
+        return len(self.futures)
+
+    def create(self, request_id, owner=None):
+        """
+        returns a future resolved with the response to request_id,
+        `owner` optionally ties the request to a connection for fail_all
+        """
+        future = asyncio.get_running_loop().create_future()
+        self.futures[request_id] = future
+        if owner is not None:
+            self.owners[request_id] = owner
+        return future
+
+    def resolve(self, request_id, response):
+        future = self.futures.get(request_id)
+        if future and not future.done():
+            future.set_result(response)
+
+    def discard(self, request_id):
+        self.futures.pop(request_id, None)
+        self.owners.pop(request_id, None)
+
+    async def wait(self, request_id, future, timeout: float = None):
+        """
+        waits for the response to request_id, raises asyncio.TimeoutError
+        if not received within timeout
+        """
+        try:
+            if timeout is None:
+                return await future
+            return await asyncio.wait_for(future, timeout)
+        finally:
+            self.discard(request_id)
+
+    def fail_all(self, exception: Exception, owner=None):
+        """
+        fails & removes all pending requests, or only those of `owner`
+        """
+        for request_id, future in list(self.futures.items()):
+            if owner is not None and self.owners.get(request_id) != owner:
+                continue
+            if not future.done():
+                future.set_exception(exception)
+            self.discard(request_id)
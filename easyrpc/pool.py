@@ -0,0 +1,55 @@
+import itertools
+
+POOL_STRATEGIES = {'round_robin', 'least_in_flight'}
+
+class PooledConnection:
+    """
+    a single websocket connection within a ConnectionPool, `in_flight` counts
+    requests sent on the connection which are awaiting a response
+    """
+    def __init__(self, index: int, send_queue, wire, dispatcher=None):
+        self.index = index
+        self.send_queue = send_queue
+        self.wire = wire
+        self.dispatcher = dispatcher
+        self.in_flight = 0
+    def __repr__(self):
+        return f"PooledConnection({self.index}, in_flight={self.in_flight})"
+
+class ConnectionPool:
+    """
+    websocket connections opened by an EasyRpcProxy to the same origin,
+    which the origin treats as a single session
+
+    strategies:
+        round_robin - requests are sent on each connection in turn (default)
+        least_in_flight - requests are sent on the connection with the fewest
+            requests awaiting a response
+    """
+    def __init__(self, strategy: str = 'round_robin'):
+        if not strategy in POOL_STRATEGIES:
+            raise Exception(f"pool strategy {strategy} is not one of {POOL_STRATEGIES}")
+        self.strategy = strategy
+        self.connections = []
+        self.turns = itertools.count()
+
+    def __len__(self):
+        return len(self.connections)
+    def __iter__(self):
+        return iter(self.connections)
+
+    def add(self, connection: PooledConnection):
+        self.connections.append(connection)
+
+    def clear(self):
+        self.connections = []
+
+    def select(self) -> PooledConnection:
+        """
+        returns connection the next request should be sent on
+        """
+        if len(self.connections) == 1:
+            return self.connections[0]
+        if self.strategy == 'least_in_flight':
+            return min(self.connections, key=lambda connection: connection.in_flight)
+        return self.connections[next(self.turns) % len(self.connections)]
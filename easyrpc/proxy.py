@@ -1,25 +1,40 @@
 import uuid, time, json
-import pickle
+import itertools
 import logging
 import asyncio
+from typing import Union, Optional
+from functools import partial
 from concurrent.futures._base import CancelledError
 
-from aiohttp import ClientSession, WSMessage, WSMsgType
+from aiohttp import ClientSession, WSMsgType
 from aiohttp.client_exceptions import ClientConnectorError
 
-from easyrpc.register import (
-    create_proxy_from_config, 
-    Coroutine, 
-    Generator, 
-    AsyncGenerator, 
-    async_generator_asend
+from easyrpc.register import create_proxy_from_config
+from easyrpc.sigtools import content_hash
+from easyrpc.auth import (
+    encode, 
+    decode, 
+    session_encryption_supported, 
+    create_session_nonce, 
+    SessionCipher
 )
-from easyrpc.auth import encode, decode
 from easyrpc.origin import Origin
-from easyrpc.generator import RpcGenerator
+from easyrpc.dispatch import RequestDispatcher
+from easyrpc.serialization import CODECS, get_codec
+from easyrpc.envelope import REQUEST, RESPONSE, CANCEL, Coalescer, Wire, get_envelope
+from easyrpc.pending import PendingRequests
+from easyrpc.batch import RpcBatch
+from easyrpc.generator import stream_items
+from easyrpc.pool import ConnectionPool, PooledConnection
+from easyrpc.routing import forward_route
+from easyrpc.balance import raise_remote_errors
+from easyrpc.metrics import Metrics
+from easyrpc.tracing import Traced, current_span, traced_response, dumps_traced
+from easyrpc.capture import WireCapture
 from easyrpc.exceptions import (
     ServerConnectionError,
     ServerUnreachable,
+    RemoteCallError,
     KNOWN_EXCEPTIONS
 )
 
@@ -37,17 +52,66 @@ class EasyRpcProxy:
         response_expected: bool = True,
         encryption_enabled: bool = False,
         server = None, #EasyRpcServer
-        serialization: str = 'pickle',
+        serialization: Union[str, list] = 'pickle',
         logger: logging.Logger = None,
         debug: bool = False,
         ssl_verify: bool = True,
+        envelope: str = 'dict', # dict | compact
+        request_timeout: float = None, # seconds, None waits indefinitely
+        coalesce_writes: bool = False,
+        max_coalesce_bytes: int = 1048576,
+        max_coalesce_messages: int = 256,
+        pool_size: int = 1,
+        pool_strategy: str = 'round_robin', # round_robin | least_in_flight
+        validate_args: bool = True,
+        registry_poll_interval: float = 300, # seconds, fallback polling while origin pushes registry updates
+        stream_window: int = 0, # generator items requested per chunk, 0 requests each item
+        tracer = None, # easyrpc.tracing.Tracer, defaults to tracer of server
+        wire_capture: int = 0, # samples 1 in N frames sent & received, 0 is disabled
     ):
         self.kind = 'PROXY'
+        self.jobs = []
 
-        # 'json' or 'pickle'
-        self.serialization = serialization
-        self.serialize = json.dumps if serialization == 'json' else pickle.dumps
-        self.deserialize = json.loads if serialization == 'json' else pickle.loads
+        # codec name or list of codec names in order of preference - 'pickle', 'json', 
+        # 'msgpack', 'orjson' or a custom codec, see easyrpc.serialization.register_codec
+        self.serialization = [serialization] if isinstance(serialization, str) else list(serialization)
+        self.serialization = [name for name in self.serialization if name in CODECS]
+        if not self.serialization:
+            raise Exception(f"no registered codec in serialization {serialization} - available: {list(CODECS)}")
+        # updated with codec selected by server during setup
+        self.codec = get_codec(self.serialization[0])
+
+        # message framing requested during setup, falls back to 'dict'
+        # if not supported by server
+        self.envelope_type = envelope
+        self.envelope = get_envelope(envelope, self.codec)
+
+        # request ids are not reset on reconnect, late responses to requests sent
+        # on a previous connection never match a new pending request
+        self.request_ids = itertools.count(1)
+        self.requests = PendingRequests()
+        self.request_timeout = request_timeout
+
+        # opt-in - send all queued messages as a single frame, if accepted by server
+        self.coalesce_writes = coalesce_writes
+        self.max_coalesce_bytes = max_coalesce_bytes
+        self.max_coalesce_messages = max_coalesce_messages
+        self.wire = Wire(self.envelope, dumps=partial(dumps_traced, self.envelope.dumps))
+
+        # websocket connections opened per session, treated by the origin as
+        # a single session - requests are spread across connections by pool_strategy
+        if pool_size < 1:
+            raise Exception(f"pool_size must be at least 1")
+        self.pool_size = pool_size
+        self.pool_strategy = pool_strategy
+        self.pool = ConnectionPool(pool_strategy)
+
+        # False skips argument validation for proxy functions, for trusted callers
+        self.validate_args = validate_args
+
+        # > 0 - generators are streamed in chunks of up to stream_window items, with the
+        # next chunk requested (and produced by the origin) while the current is consumed
+        self.stream_window = stream_window
 
         self.origin_host = origin_host
         self.origin_port = origin_port
@@ -69,35 +133,93 @@ class EasyRpcProxy:
         self.session_id = str(uuid.uuid1()) if not session_id else session_id
         self.client_connections = {}
 
+        # calls, errors & latency of proxy functions, see get_metrics
+        self.metrics = Metrics()
+        self.metrics.gauge('pending_requests', lambda: len(self.requests))
+        self.metrics.gauge(
+            'send_queue_depth', 
+            lambda: sum(connection.send_queue.qsize() for connection in self.pool)
+        )
+        self.metrics.gauge(
+            'in_flight', 
+            lambda: sum(connection.in_flight for connection in self.pool)
+        )
+
+        # spans of calls made, requests carry the trace context of the call
+        self.tracer = tracer
+        if self.server and not tracer:
+            self.tracer = self.server.tracer
+
+        # sampled & truncated frames, see get_wire_capture
+        self.wire_capture = WireCapture(sample=wire_capture) if wire_capture else None
+
         self.debug = debug
         if self.server:
             logger = self.server.log
         self.setup_logger(logger=logger, level='DEBUG' if self.debug else 'ERROR')
 
         self.proxy_funcs = {}
+        # f_name -> content hash of config, proxy funcs are reused while unchanged
+        self.proxy_func_hashes = {}
+        # etag of last origin registry config, None forces a full refresh
+        self.registry_etag = None
+        self.registry_synced = 0
+
+        # origins push registry updates, polling is then only a fallback run every
+        # registry_poll_interval - child servers push over their own connection
+        self.registry_push = proxy_type == 'SERVER_PROXY'
+        self.registry_poll_interval = registry_poll_interval
 
-        self.jobs = []
         if proxy_type == 'SERVER':
-            self.run_cron(
-                self.get_upstream_registered_functions,
-                30
-            )
+            self.refresh_registry = self.get_upstream_registered_functions
         elif proxy_type == 'PROXY':
-            self.run_cron(
-                self.get_all_registered_functions,
-                30
-            )
+            self.refresh_registry = self.get_all_registered_functions
         else:
-            self.run_cron(
-                self.get_downstream_registered_functions,
-                30
-            )
+            self.refresh_registry = self.get_downstream_registered_functions
+        self.run_cron(self.poll_registry, 30)
     def __contains__(self, func):
         return func in self.proxy_funcs
+    @property
+    def connected(self) -> bool:
+        """
+        True while the session with the origin is open
+        """
+        if self.proxy_type == 'SERVER_PROXY':
+            return self.origin_id in self.server.server_wires
+        return len(self.pool) > 0
     def __getitem__(self, func):
         if func in self.proxy_funcs:
             return self.proxy_funcs[func]
         raise IndexError(f"function {func} not found")
+    def get_wire_capture(self, limit: Optional[int] = None):
+        """
+        returns frames sampled while wire_capture is set, oldest first, see
+        EasyRpcServer.get_wire_capture
+        """
+        if not self.wire_capture:
+            return []
+        return self.wire_capture.frames(limit)
+    def get_metrics(self):
+        """
+        returns snapshot of calls, errors & latency (seconds) of each proxy 
+        function called & current queue depths, see easyrpc.metrics.Metrics
+        """
+        return self.metrics.snapshot()
+    def batch(self, concurrent: bool = False):
+        """
+        returns RpcBatch which collects calls into a single request
+
+            async with proxy.batch() as batch:
+                a = batch['add'](1, 2)
+            a.result()
+        """
+        return RpcBatch(self, concurrent=concurrent)
+    def invalidate_dispatch(self):
+        """
+        proxy_funcs changed - clears dispatch tables of associated EasyRpcServer
+        """
+        if self.server:
+            self.server.invalidate_dispatch()
     def __del__(self):
         for job in self.jobs.copy():
             try:
@@ -118,10 +240,22 @@ class EasyRpcProxy:
         response_expected: bool = True,
         encryption_enabled = False,
         server = None,
-        serialization: str = 'pickle',
+        serialization: Union[str, list] = 'pickle',
         logger: logging.Logger = None,
         debug: bool = False,
         ssl_verify: bool = False,
+        envelope: str = 'dict',
+        request_timeout: float = None,
+        coalesce_writes: bool = False,
+        max_coalesce_bytes: int = 1048576,
+        max_coalesce_messages: int = 256,
+        pool_size: int = 1,
+        pool_strategy: str = 'round_robin',
+        validate_args: bool = True,
+        registry_poll_interval: float = 300,
+        stream_window: int = 0,
+        tracer = None,
+        wire_capture: int = 0,
     ):
         proxy = cls(
             origin_host, 
@@ -139,6 +273,18 @@ class EasyRpcProxy:
             logger=logger,
             debug=debug,
             ssl_verify=ssl_verify,
+            envelope=envelope,
+            request_timeout=request_timeout,
+            coalesce_writes=coalesce_writes,
+            max_coalesce_bytes=max_coalesce_bytes,
+            max_coalesce_messages=max_coalesce_messages,
+            pool_size=pool_size,
+            pool_strategy=pool_strategy,
+            validate_args=validate_args,
+            registry_poll_interval=registry_poll_interval,
+            stream_window=stream_window,
+            tracer=tracer,
+            wire_capture=wire_capture,
         )
         """
         proxy_type:
@@ -187,37 +333,134 @@ class EasyRpcProxy:
             self.log.propogate = False
         else:
             self.log = logger
+    def create_proxy_func(self, f_name, cfg):
+        """
+        returns proxy function for f_name, reusing the existing function 
+        if its config is unchanged
+        """
+        cfg_hash = content_hash(cfg)
+        if f_name in self.proxy_funcs and self.proxy_func_hashes.get(f_name) == cfg_hash:
+            return self.proxy_funcs[f_name]
+        self.proxy_func_hashes[f_name] = cfg_hash
+        proxy_func = create_proxy_from_config(
+            cfg,
+            get_proxy(self, f_name),
+            validate_args=self.validate_args
+        )
+        # route the function's registry config took from its origin, 
+        # registered with the function on the associated EasyRpcServer
+        proxy_func.hops = cfg.get('hops', 0) + 1
+        proxy_func.route = cfg.get('route', []) + ([self.server.server_id] if self.server else [])
+        return proxy_func
+    def loops(self, cfg) -> bool:
+        """
+        True if the function config was registered by or passed through the
+        associated EasyRpcServer, i.e an echo of its own functions within a ring
+        """
+        return self.server is not None and self.server.server_id in cfg.get('route', ())
     async def get_namespace_functions(self, upstream=True, all_functions=False, trigger=None):
+        kwargs = {
+            'upstream': upstream,
+            'all_functions': all_functions,
+            'trigger': trigger
+        }
+        if self.registry_etag:
+            kwargs['etag'] = self.registry_etag
         config = await self.proxy_request(
             {
                 'action': 'get_registered_functions',
                 'args': [self.namespace],
-                'kwargs': {
-                    'upstream': upstream,
-                    'all_functions': all_functions,
-                    'trigger': trigger
-                    }
+                'kwargs': kwargs
             }
         )
         if not config:
             return
+        self.registry_synced = time.time()
+        if config.get('unchanged'):
+            # origin registry is unchanged since last refresh
+            return self.proxy_funcs
+        if config.get('delta'):
+            if not config['previous'] == self.registry_etag:
+                # registry changed by a pushed update while waiting
+                self.registry_etag = None
+                return await self.get_namespace_functions(upstream, all_functions, trigger)
+            self.apply_registry_delta(config)
+            return self.proxy_funcs
+        self.registry_etag = config.get('etag')
         
-        namespaces = [self.namespace]
-        if self.server and self.namespace in self.server.namespace_groups:
-            namespaces = list(self.server.namespace_groups[self.namespace])
-        
-        for namespace in namespaces:
+        for namespace in self.get_registry_namespaces():
             self.namespaces[namespace] = {}
             for func in config['funcs']:
                 for f_name, cfg in func.items():
-                    self.proxy_funcs[f_name] = create_proxy_from_config(
-                        cfg,
-                        get_proxy(self, f_name)
-                    )
-                
-                self.origin(self.proxy_funcs[f_name], namespace=namespace)
+                    if self.loops(cfg):
+                        continue
+                    self.proxy_funcs[f_name] = self.create_proxy_func(f_name, cfg)
+                    self.origin(self.proxy_funcs[f_name], namespace=namespace)
 
+        self.invalidate_dispatch()
         return self.proxy_funcs
+    def get_registry_namespaces(self):
+        """
+        namespaces proxy functions are registered in, members of namespace 
+        group if the proxy namespace is a group on the associated EasyRpcServer
+        """
+        if self.server and self.namespace in self.server.namespace_groups:
+            return list(self.server.namespace_groups[self.namespace])
+        return [self.namespace]
+    async def poll_registry(self):
+        """
+        refreshes registry from origin, only every registry_poll_interval 
+        while origin pushes registry updates & the session is open, a closed
+        session is reconnected by the refresh
+        """
+        if (
+            self.registry_push and self.connected and 
+            time.time() - self.registry_synced < self.registry_poll_interval
+        ):
+            return
+        return await self.refresh_registry()
+    async def apply_registry_update(self, update):
+        """
+        applies functions added or removed from origin registry, pushed by origin
+        once changed, see easyrpc.registry.RegistryWatchers
+        """
+        self.registry_push = True
+        if not update['previous'] == self.registry_etag:
+            # missed an update - fall back to a full refresh, which must not be 
+            # awaited by the receiver which reads its response
+            self.registry_etag = None
+            asyncio.create_task(self.refresh_registry())
+            return
+        self.apply_registry_delta(update)
+    def apply_registry_delta(self, delta):
+        """
+        registers functions added & removes functions removed within `delta`,
+        from a pushed REGISTRY_UPDATE or a get_registered_functions delta 
+        """
+        for f_name in delta['removed']:
+            self.proxy_funcs.pop(f_name, None)
+            self.proxy_func_hashes.pop(f_name, None)
+        added, looped = {}, []
+        for func in delta['added']:
+            for f_name, cfg in func.items():
+                if self.loops(cfg):
+                    # function now reaches the origin through this server
+                    self.proxy_funcs.pop(f_name, None)
+                    self.proxy_func_hashes.pop(f_name, None)
+                    looped.append(f_name)
+                    continue
+                added[f_name] = self.proxy_funcs[f_name] = self.create_proxy_func(f_name, cfg)
+
+        for namespace in self.get_registry_namespaces():
+            namespace_funcs = self.namespaces.setdefault(namespace, {})
+            for f_name in list(delta['removed']) + looped + list(added):
+                namespace_funcs.pop(f_name, None)
+            for f_name, proxy_func in added.items():
+                self.origin(proxy_func, namespace=namespace)
+
+        self.registry_etag = delta['etag']
+        self.registry_synced = time.time()
+        self.invalidate_dispatch()
     async def get_downstream_registered_functions(self):
         return await self.get_namespace_functions(upstream=False)
 
@@ -237,28 +480,37 @@ class EasyRpcProxy:
                 proxy_funcs.add(f_name)
                 if not f_name in self.proxy_funcs:
                     continue
-                self.proxy_funcs[f_name] = create_proxy_from_config(
-                    cfg,
-                    get_proxy(self, f_name)
-                )
+                self.proxy_funcs[f_name] = self.create_proxy_func(f_name, cfg)
         
         if not self.server:
             return
+        self.invalidate_dispatch()
         for func_name, func in self.proxy_funcs.items():
             if func_name in self.server.namespaces[self.namespace]:
                 continue
             self.server.origin(func, namespace=self.namespace)
     
-    async def cleanup_proxy_session(self):
+    async def cleanup_proxy_session(self, connection: PooledConnection = None):
+        """
+        closes the session & fails its pending requests, `connection` is the
+        pooled connection which closed, if any
+        """
         self.log.warning(f"cleanup_proxy_session called")
+        error = ServerConnectionError(self.origin_host, self.origin_port)
+        if connection is not None and not connection in self.pool:
+            # late cleanup of a session already cleaned up, the proxy may have
+            # since reconnected with the same session_id
+            self.requests.fail_all(error, owner=connection)
+            return
         if not self.session_id in self.client_connections:
             return
-        try:
-            await self.client_connections[self.session_id].asend('finished')
-        except StopAsyncIteration:
-            pass
-        if self.session_id in self.client_connections:
-            del self.client_connections[self.session_id]
+        self.requests.fail_all(error)
+        self.pool.clear()
+        for client_connection in self.client_connections.pop(self.session_id):
+            try:
+                await client_connection.asend('finished')
+            except StopAsyncIteration:
+                pass
         if self.session_id in self.sessions:
             session = self.sessions.pop(self.session_id)
             try:
@@ -267,6 +519,11 @@ class EasyRpcProxy:
                 pass
         self.proxy_funcs = {}
         self.namespaces = {}
+        self.registry_etag = None
+        if self.server:
+            self.server.registry_watchers.unwatch(self.session_id)
+            await self.server.server_generators.close_owner(self.session_id)
+        self.invalidate_dispatch()
     
     async def get_endpoint_sessions(self):
         loop = asyncio.get_running_loop()
@@ -288,30 +545,29 @@ class EasyRpcProxy:
         self.sessions[self.session_id].append({'session': client, 'loop': loop})
         return await client.asend(None)
 
-    def get_ws_sender(self, ws):
-        if self.serialization == 'json':
-            ws_send = ws.send_json
-        else:
-            ws_send = ws.send_bytes 
+    def get_ws_sender(self, ws, connection: PooledConnection):
+        wire = connection.wire
+        send_queue = connection.send_queue
+        ws_send = ws.send_bytes if wire.binary else ws.send_str
         async def ws_sender():
             try:
                 empty = True
                 while True:
                     if empty:
-                        request = await self.client_send_queue.get()
+                        request = await send_queue.get()
                         empty = False
                     else:
                         try:
-                            request = self.client_send_queue.get_nowait()
+                            request = send_queue.get_nowait()
                         except asyncio.QueueEmpty:
                             empty = True
                             continue
                     last_exception = None
+                    frame = wire.frame(request, send_queue)
+                    if self.wire_capture:
+                        self.wire_capture.record('sent', self.session_id, frame)
                     try:
-                        if self.serialization == 'pickle':
-                            # serialize data before sending
-                            request = self.serialize(request)
-                        await ws_send(request)
+                        await ws_send(frame)
                     except ConnectionResetError:
                         last_exception = ServerConnectionError(
                             self.origin_host,
@@ -322,14 +578,49 @@ class EasyRpcProxy:
             except Exception as e:
                 if not isinstance(e, CancelledError):
                     self.log.exception(f"error with ws_sender")
-            await self.cleanup_proxy_session()
+            await self.cleanup_proxy_session(connection)
         return ws_sender
-    def get_ws_receiver(self, ws):             
+    async def respond(self, request, request_id, response_expected, send_queue: asyncio.Queue):
+        """
+        runs a request sent by the origin on the associated EasyRpcServer,
+        response is sent on the connection the request was received on
+        """
+        if self.encryption_enabled and not self.wire.cipher:
+            request = decode(request, self.server_secret)['data']
+        if isinstance(request, dict) and request.get('action') == 'REGISTRY_UPDATE':
+            return await self.apply_registry_update(request)
+
+        if not self.server:
+            response = {"error": "proxy has no associated EasyRpcServer"}
+        else:
+            self.log.debug("###### proxy_type %s request: %s #####", self.proxy_type, request)
+            response = await self.server.execute_request(
+                self.namespace,
+                request,
+                request_id,
+                session_id=self.session_id,
+                notify=partial(self.proxy_request, response_expected=False)
+            )
+            if not response_expected:
+                return
+
+        await send_queue.put(
+            traced_response(self.tracer, request, self.envelope.response(request_id, response))
+        )
+
+    def get_ws_receiver(self, ws, connection: PooledConnection):
+        wire = connection.wire
+        dispatcher = connection.dispatcher = RequestDispatcher(
+            partial(self.respond, send_queue=connection.send_queue),
+            mode=self.server.dispatch_mode if self.server else 'inline',
+            max_concurrency=self.server.max_concurrency if self.server else 1,
+            log=self.log
+        )
         async def ws_receiver():
             try:
                 while True:
                     message = await ws.receive()
-                    self.log.debug(f"ws_receiver got message: {message}")
+                    self.log.debug("ws_receiver got message: %s", message)
 
                     if message.type == WSMsgType.CLOSE:
                         self.log.info(f"Server sent WSCLOSE")
@@ -338,129 +629,66 @@ class EasyRpcProxy:
                     if message.data == None:
                         break
                     
-                    if self.serialization == 'json':
+                    if message.type == WSMsgType.TEXT:
                         if 'error' in message.data and not 'ws_action' in message.data:
                             break
 
-                    self.log.info(message.data)
+                    if self.wire_capture:
+                        self.wire_capture.record('received', self.session_id, message.data)
                     try:
-                        message: WSMessage = self.deserialize(message.data)
+                        messages = wire.messages(message.data)
                     except Exception as e:
+                        if wire.cipher:
+                            # session frames can no longer be decrypted in order
+                            raise
                         self.log.warning(f"error deserializing message: {repr(e)} - message: {message.data}")
-
-                    if not 'ws_action' in message:
                         continue
 
-                    if message['ws_action']['type'] == 'response':
-                        queue = self.requests.get(message['ws_action']['request_id'])
-                        if queue:
-                            await queue.put(message['ws_action']['response'])
-
-                    if message['ws_action']['type'] == 'request':
-                        request = message['ws_action']['request']
-                        request_id = message['ws_action']['request_id']
-                        response_expected = message['ws_action']['response_expected']
-
-                        if not self.server:
-                            await self.client_send_queue.put({
-                                'ws_action': {
-                                    'type': 'response',
-                                    'response': {"error": "proxy has no associated EasyRpcServer"},
-                                    'request_id': request_id
-                                }
-                            })
-                            continue
+                    for kind, request_id, response_expected, body in messages:
+                        if kind == RESPONSE:
+                            self.requests.resolve(request_id, body)
 
-                        if self.encryption_enabled:
-                            request = decode(request, self.server_secret)['data']
-
-                        if not 'action' in request:
-                            response = {
-                                'ws_action': {
-                                    'type': 'response',
-                                    'response': {"error": "missing expected input: 'action' "},
-                                    'request_id': request_id
-                                }
-                            }
-                            await self.client_send_queue.put()
-                            continue
-                        action = request['action']
-                        self.log.debug(f"###### proxy_type {self.proxy_type} action: {action} #####")
-
-                        if action == 'get_registered_functions':
-                            # get_registered_functions
-                            executed_action = self.server.get_registered_functions(
-                                namespace=self.namespace, 
-                                **request['kwargs']
-                            )
-                            self.log.debug(f"ORIGIN action: get_registered_functions")
-                        elif action == 'GENERATOR_NEXT':
-                            generator_id = request['generator_id']
-                            if not generator_id in self.server.server_generators:
-                                self.log.debug(f"no generator exists with request_id {generator_id}")
-                            executed_action = self.server.server_generators[generator_id].asend(None)     
-
-                        else:
-                            if not action in self.server[self.namespace]:
-                                await self.client_send_queue.put({
-                                    'ws_action': {
-                                        'type': 'response',
-                                        'response': {"error": f"no action {action} registered for origin within {self.server[namespace]}"},
-                                        'request_id': request_id
-                                    }
-                                })
-                                continue
-
-                            executed_action = self.server.run(
-                                self.namespace,
-                                action,
-                                request['args'] if 'args' in request else [],
-                                request['kwargs'] if 'kwargs' in request else {},
-                            )
-                            self.log.debug(f"ORIGIN action: {action}")
-                        
-                        if type(executed_action) in {Coroutine, async_generator_asend}:
-                            try:
-                                response = await executed_action
-                            except StopAsyncIteration as e:
-                                response = 'GENERATOR_END'
-                        elif type(executed_action) in {Generator, AsyncGenerator}:
-                            self.server.server_generators[request_id] = RpcGenerator(
-                                executed_action
-                            )
-                            response = {'GENERATOR_START': request_id}
-
-                        else:
-                            response = executed_action
-                        
-                        if response_expected:
-
-                            await self.client_send_queue.put({
-                                'ws_action': {
-                                    'type': 'response',
-                                    'response': response,
-                                    'request_id': request_id
-                                }
-                            })
+                        elif kind == REQUEST:
+                            await dispatcher.dispatch(body, request_id, response_expected)
+
+                        elif kind == CANCEL:
+                            # origin may send cancel on any connection within the pool
+                            for pooled in self.pool:
+                                pooled.dispatcher.cancel_request(request_id)
                         
             except Exception as e:
                 self.log.info(f"ws_receiver exiting: reason - {repr(e)}")
             finally:
-                await self.cleanup_proxy_session()
+                dispatcher.cancel()
+                await self.cleanup_proxy_session(connection)
         return ws_receiver
     async def get_proxy_ws_session(self):
         """
         pulls endpoint session if exists else creates & returns
         """
         connection_error = None
-        async def ws_client():
-            self.client_send_queue = asyncio.Queue()
-            self.requests = {}
+        async def ws_client(index: int = 0):
+            send_queue = asyncio.Queue()
+            session_nonce = None
             setup = {
                 'type': self.proxy_type,
                 'id': self.session_id, 
                 'namespace': self.namespace,
-                'serialization': self.serialization
+                'serialization': self.serialization,
+                'envelope': self.envelope_type,
+                'connection': index
+                }
+            if self.encryption_enabled:
+                if session_encryption_supported():
+                    setup['session_nonce'] = session_nonce = create_session_nonce()
+                else:
+                    self.log.warning(
+                        f"session encryption requires the 'cryptography' package - using per request jwt encoding"
+                    )
+            if self.coalesce_writes:
+                setup['coalesce'] = {
+                    'max_bytes': self.max_coalesce_bytes,
+                    'max_messages': self.max_coalesce_messages
                 }
             setup = encode(self.server_secret, **setup, log=self.log)
             session = await self.get_endpoint_sessions()
@@ -474,9 +702,6 @@ class EasyRpcProxy:
                         url, #timeout=600, heartbeat=120.0
                         ssl=self.ssl_verify
                 ) as ws:
-                    ws_sender = self.get_ws_sender(ws)
-                    ws_receiver = self.get_ws_receiver(ws)
-
                     self.log.debug(
                         f"started connection to server {self.origin_host}:{self.origin_port}"
                     )
@@ -485,7 +710,7 @@ class EasyRpcProxy:
                         try:
                             while True:
                                 if time.time() - last_ping > 10:
-                                    await self.client_send_queue.put({'ping': 'ping'})
+                                    await send_queue.put(self.envelope.ping())
                                     last_ping = time.time()
                                 await asyncio.sleep(5)
                         except Exception as e:
@@ -508,6 +733,42 @@ class EasyRpcProxy:
                         return
                     setup_response = json.loads(setup_response.data)
                     self.origin_id = setup_response['server_id']
+                    self.registry_push = setup_response.get('registry_push', False)
+                    self.codec = get_codec(
+                        setup_response.get('serialization', self.serialization[0])
+                    )
+                    self.envelope = get_envelope(
+                        setup_response.get('envelope', 'dict'),
+                        self.codec
+                    )
+                    coalescer, cipher = None, None
+                    if setup_response.get('coalesce'):
+                        coalescer = Coalescer(
+                            self.envelope,
+                            max_bytes=self.max_coalesce_bytes,
+                            max_messages=self.max_coalesce_messages
+                        )
+                    if setup_response.get('session_nonce'):
+                        cipher = SessionCipher.create(
+                            self.server_secret,
+                            session_nonce,
+                            setup_response['session_nonce'],
+                            side='client'
+                        )
+                    wire = Wire(
+                        self.envelope, 
+                        coalescer=coalescer, 
+                        cipher=cipher, 
+                        dumps=partial(dumps_traced, self.envelope.dumps)
+                    )
+                    if index == 0:
+                        # negotiated features are identical for all pooled connections
+                        self.wire = wire
+                    connection = PooledConnection(index, send_queue, wire)
+
+                    ws_sender = self.get_ws_sender(ws, connection)
+                    ws_receiver = self.get_ws_receiver(ws, connection)
+                    self.pool.add(connection)
 
                     # session jobs    
                     self.jobs.append(asyncio.create_task(ws_sender()))
@@ -522,6 +783,8 @@ class EasyRpcProxy:
 
                 self.proxy_funcs = {}
                 self.namespaces = {}
+                self.registry_etag = None
+                self.invalidate_dispatch()
             except Exception as e:
                 if type(e) in {
                     ClientConnectorError, 
@@ -537,22 +800,25 @@ class EasyRpcProxy:
         if connection_error:
             raise connection_error
 
-        if self.session_id and not self.session_id in self.client_connections:
-            self.client_connections[self.session_id] = ws_client()
+        if self.session_id in self.client_connections:
+            return self.pool
+
+        client_connections = self.client_connections[self.session_id] = []
+        for index in range(self.pool_size):
+            client_connection = ws_client(index)
+            client_connections.append(client_connection)
             try:
-                conn =  await self.client_connections[self.session_id].asend(None)
-                return conn
+                await client_connection.asend(None)
             except StopAsyncIteration:
                 self.log.error(
                     f"failed to create connection to server {self.origin_host}:{self.origin_port}"
                 )
-            except Exception as e:
-                raise e
-        try:
-            conn = await self.client_connections[self.session_id].asend(None)
-            return conn
-        except StopAsyncIteration:
-            await self.cleanup_proxy_session()
+                await self.cleanup_proxy_session()
+                return
+            except Exception:
+                await self.cleanup_proxy_session()
+                raise
+        return self.pool
 
     async def proxy_update(self, update):
         """
@@ -564,89 +830,101 @@ class EasyRpcProxy:
 
             await self.server.server_send_queue[self.origin_id].put(update)
         else:
-            await self.client_send_queue.put(update)
+            await self.pool.select().send_queue.put(update)
 
-    async def proxy_generator(self, request_id, generator_id):
+    async def proxy_generator(self, generator_id):
+        async def send_request(request, response_expected=True):
+            if self.encryption_enabled and not self.wire.cipher:
+                request = encode(self.server_secret, data=request)
+            return await self.ws_request(request, response_expected)
         async def generator():
-            ws_action = {
-                'ws_action': {
-                    'type': 'request',
-                    'response_expected': True,
-                    'request': {'action': 'GENERATOR_NEXT', 'generator_id': generator_id},
-                    'request_id': request_id
-                }
-            }    
-            while True:
-                await self.client_send_queue.put(ws_action)
-                result = await self.requests[request_id].get()
-                if result == 'GENERATOR_END':
-                    break
-                status = yield result
-                if 'status' == 'finished':
-                    break
-            del self.requests[request_id]
-
-            if not self.proxy_type == 'PROXY':
-                del self.server.server_generators[generator_id]
+            items = stream_items(send_request, generator_id, self.stream_window)
+            try:
+                async for result in items:
+                    yield result
+            finally:
+                await items.aclose()
+                if not self.proxy_type == 'PROXY':
+                    self.server.server_generators.release(generator_id)
         proxy_gen = generator()
         if not self.proxy_type == 'PROXY':
-            self.server.server_generators[generator_id] = proxy_gen
+            # closed if this proxy's session disconnects
+            self.server.server_generators.add(generator_id, proxy_gen, owner=self.session_id)
         else:
             return proxy_gen
 
+    async def ws_request(self, request, response_expected=True):
+        """
+        sends request on the websocket session, if response_expected waits 
+        up to request_timeout for the response
+        """
+        if not self.pool:
+            raise ServerConnectionError(self.origin_host, self.origin_port)
+        connection = self.pool.select()
+        request_id = next(self.request_ids)
+        envelope = self.envelope
+        ws_action = envelope.request(request_id, request, response_expected)
+        # queue wait & serialization are recorded within the call being made
+        span = current_span.get()
+        message = Traced(ws_action, span) if span else ws_action
+        if not response_expected:
+            await connection.send_queue.put(message)
+            return
+
+        # failed if connection closes
+        future = self.requests.create(request_id, owner=connection)
+        connection.in_flight += 1
+        await connection.send_queue.put(message)
+        try:
+            result = await self.requests.wait(request_id, future, self.request_timeout)
+            if span:
+                span.child('response_wait', start=message.sent or message.enqueued).finish()
+            return result
+        except (asyncio.TimeoutError, CancelledError):
+            # caller gave up - allow origin to stop working on request, cancel
+            # must be sent on the same connection as the request
+            connection.send_queue.put_nowait(envelope.cancel(request_id))
+            raise
+        finally:
+            connection.in_flight -= 1
+
     async def proxy_request(self, request, response_expected=True):
         """
-        invokes ws.send_json(request) 
+        sends request to origin
         response_expected = True Default)
-            waits for response to request_id
+            waits for response to request, raises asyncio.TimeoutError
+            if not received within request_timeout
         """
         async def make_request():
             nonlocal request
-            self.log.debug(f"proxy_request: {request}")
+            self.log.debug("proxy_request: %s", request)
             if self.proxy_type == 'SERVER_PROXY':
-                if self.encryption_enabled:
-                    request = encode(self.server.server_secret, data=request)
+                # server_request encodes request for the client connection
                 result = await self.server.server_request(
                     self.origin_id,
-                    request
+                    request,
+                    response_expected=response_expected,
+                    timeout=self.request_timeout,
+                    stream_window=self.stream_window
                 )
                 if response_expected:
                     return result
                 return
 
-            ws = await self.get_proxy_ws_session()
+            await self.get_proxy_ws_session()
 
-            if self.encryption_enabled:
+            if self.encryption_enabled and not self.wire.cipher:
                 request = encode(self.server_secret, data=request)
 
-            request_id = str(uuid.uuid1())
-
-            ws_action = {
-                'ws_action': {
-                    'type': 'request',
-                    'response_expected': response_expected,
-                    'request': request,
-                    'request_id': request_id
-                }
-            }
-            if response_expected:
-                self.requests[request_id] = asyncio.Queue(1)
-
-            await self.client_send_queue.put(ws_action)
-
-            if response_expected:
-                result =  await self.requests[request_id].get()
-                if not result:
-                    return result
-                if hasattr(result, '__contains__') and 'GENERATOR_START' in result:
-                    generator_id = result['GENERATOR_START']
-                    proxy_generator = await self.proxy_generator(request_id, generator_id)
-                    if self.proxy_type == 'PROXY':
-                        return proxy_generator
-                    return result
-
-                del self.requests[request_id]
+            result = await self.ws_request(request, response_expected)
+            if not result:
                 return result
+            if hasattr(result, '__contains__') and 'GENERATOR_START' in result:
+                generator_id = result['GENERATOR_START']
+                proxy_generator = await self.proxy_generator(generator_id)
+                if self.proxy_type == 'PROXY':
+                    return proxy_generator
+            return result
 
         try:
             return await make_request()
@@ -660,12 +938,47 @@ class EasyRpcProxy:
                 
 def get_proxy(ws_proxy: EasyRpcProxy, func_name: str):
     async def proxy(*args, **kwargs):
-        return await ws_proxy.proxy_request(
-            {
-                'action': func_name,
-                'args': list(args),
-                'kwargs': kwargs
-            },
-            response_expected=ws_proxy.response_expected
-        )
+        start = time.perf_counter()
+        error = False
+        request = forward_route({
+            'action': func_name,
+            'args': list(args),
+            'kwargs': kwargs
+        })
+        span = None
+        if ws_proxy.tracer:
+            # calls made by a server while running a request continue its trace
+            span = ws_proxy.tracer.start_span(
+                f"{'forward' if ws_proxy.server else 'call'} {func_name}",
+                parent=current_span.get(),
+                namespace=ws_proxy.namespace
+            )
+        if span:
+            request['trace'] = span.context()
+            trace = current_span.set(span)
+        raise_errors = raise_remote_errors.get()
+        if raise_errors:
+            request['raise_errors'] = True
+        try:
+            result = await ws_proxy.proxy_request(
+                request,
+                response_expected=ws_proxy.response_expected
+            )
+            if raise_errors and isinstance(result, dict) and 'RPC_ERROR' in result:
+                raise RemoteCallError(result['RPC_ERROR'])
+            return result
+        except Exception:
+            error = True
+            raise
+        finally:
+            if span:
+                current_span.reset(trace)
+                span.attributes['error'] = error
+                span.finish()
+            ws_proxy.metrics.record(
+                ws_proxy.namespace, 
+                func_name, 
+                time.perf_counter() - start, 
+                error=error
+            )
     return proxy
\ No newline at end of file
@@ -20,16 +20,17 @@ AsyncGenerator = type(ag)
 async_generator_asend = type(ag.asend(None))
 
 
-def create_proxy_from_config(config: dict, proxy: Callable):
+def create_proxy_from_config(config: dict, proxy: Callable, validate_args: bool = True):
     """
     input:
         `config` created by get_signature_as_dict() on function origin
+        `validate_args` if False, calls skip argument validation
     
     Will be run on proxy host to create a function matching signature of 
     origin function and hides away the websocket rpc logic calling function
     on origin 
     """
-    return create_proxy_from_spec(config, proxy=proxy)
+    return create_proxy_from_spec(config, proxy=proxy, validate_args=validate_args)
 
 
 def get_origin_register(obj: object):
@@ -39,7 +40,7 @@ def get_origin_register(obj: object):
         which will be used to store registered functions on
         an origin node
     """
-    def register(f, namespace):
+    def register(f, namespace, executor='inline'):
         if not namespace in obj.namespaces:
             obj.namespaces[namespace] = {}
         if not f.__name__ in obj.namespaces[namespace]:
@@ -48,9 +49,14 @@ def get_origin_register(obj: object):
                 'sig': serialize_function_signature(f),
                 'name': f.__name__,
                 'doc': f.__doc__,
-                'is_async': iscoroutinefunction(f)
+                'is_async': iscoroutinefunction(f),
+                # servers the function's config passed through from its origin, see easyrpc.routing
+                'hops': getattr(f, 'hops', 0),
+                'route': getattr(f, 'route', [obj.server_id] if obj.kind == 'SERVER' else [])
             }
-            obj.namespaces[namespace][f.__name__]['method'] = f
+            obj.namespaces[namespace][f.__name__]['method'] = (
+                f if executor == 'inline' else obj.executors.wrap(f, executor)
+            )
         return f
     return register
 
@@ -0,0 +1,89 @@
+import asyncio
+
+def registry_delta(config: dict, hashes: dict, previous_hashes: dict):
+    """
+    returns functions added (or changed) & removed between a registry version 
+    with previous_hashes and `config` with `hashes`
+        {'added': [{f_name: config}], 'removed': [f_name]}
+    """
+    funcs = {f_name: cfg for func in config['funcs'] for f_name, cfg in func.items()}
+    return {
+        'added': [
+            {f_name: funcs[f_name]} for f_name, cfg_hash in hashes.items()
+            if not previous_hashes.get(f_name) == cfg_hash
+        ],
+        'removed': [f_name for f_name in previous_hashes if not f_name in hashes]
+    }
+
+class RegistryWatchers:
+    """
+    sessions which requested a registry config with get_registered_functions,
+    each is pushed a REGISTRY_UPDATE with the functions added or removed from
+    its config whenever the registry changes, rather than waiting on its next poll
+
+        {
+            'action': 'REGISTRY_UPDATE',
+            'namespace': namespace,
+            'previous': etag the update applies to,
+            'etag': etag once applied,
+            'added': [{f_name: config}],
+            'removed': [f_name]
+        }
+    """
+    def __init__(self, server, delay: float = 0.1):
+        self.server = server
+        self.delay = delay # seconds, coalesces bursts of registry changes
+        self.watchers = {} # (session_id, key) -> {'etag', 'hashes', 'notify'}
+        self.push_task = None
+
+    def __len__(self):
+        return len(self.watchers)
+
+    def watch(self, session_id, key, notify):
+        """
+        `notify` - coroutine function called with each REGISTRY_UPDATE for session
+        """
+        config, hashes = self.server.get_registry(key)
+        self.watchers[(session_id, key)] = {
+            'etag': config['etag'],
+            'hashes': hashes,
+            'notify': notify
+        }
+
+    def unwatch(self, session_id):
+        for watcher in [watcher for watcher in self.watchers if watcher[0] == session_id]:
+            del self.watchers[watcher]
+
+    def changed(self):
+        """
+        registry changed, schedules push of updates to watchers
+        """
+        if not self.watchers or self.push_task:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        self.push_task = loop.create_task(self.push())
+
+    async def push(self):
+        await asyncio.sleep(self.delay)
+        self.push_task = None
+
+        for (session_id, key), watcher in list(self.watchers.items()):
+            config, hashes = self.server.get_registry(key)
+            if config['etag'] == watcher['etag']:
+                continue
+            update = {
+                'action': 'REGISTRY_UPDATE',
+                'namespace': key[0],
+                'previous': watcher['etag'],
+                'etag': config['etag'],
+                **registry_delta(config, hashes, watcher['hashes'])
+            }
+            watcher['etag'], watcher['hashes'] = config['etag'], hashes
+            try:
+                await watcher['notify'](update)
+            except Exception as e:
+                self.server.log.error(f"error pushing registry update to {session_id} - {repr(e)}")
+                self.watchers.pop((session_id, key), None)
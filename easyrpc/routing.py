@@ -0,0 +1,41 @@
+from contextvars import ContextVar
+
+# calls forwarded along a route longer than MAX_HOPS are rejected
+MAX_HOPS = 16
+
+# server_ids of servers a request being run has passed through, attached
+# to requests forwarded to other servers while the request runs
+call_route = ContextVar('call_route', default=None)
+
+def forward_route(request: dict) -> dict:
+    """
+    attaches the route of the request being run to a forwarded request
+    """
+    route = call_route.get()
+    if route:
+        request['route'] = route
+    return request
+
+def route_error(server_id, request: dict):
+    """
+    returns an error if forwarding `request` to server_id would loop or
+    exceed MAX_HOPS, else None
+    """
+    route = request.get('route') or []
+    if server_id in route:
+        return {"error": f"routing loop calling {request.get('action')} - route {route}"}
+    if len(route) >= MAX_HOPS:
+        return {"error": f"route calling {request.get('action')} exceeds {MAX_HOPS} hops - route {route}"}
+
+def shortest_routes(candidates) -> dict:
+    """
+    returns {f_name: route} with the fewest hops for each f_name within candidates,
+    an iterable of routes {'f_name', 'hops', 'next_hop', 'method'}, the first
+    route found is kept on ties
+    """
+    routes = {}
+    for route in candidates:
+        f_name = route['f_name']
+        if not f_name in routes or route['hops'] < routes[f_name]['hops']:
+            routes[f_name] = route
+    return routes
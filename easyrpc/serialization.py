@@ -0,0 +1,66 @@
+import json
+import pickle
+from functools import partial
+
+class Codec:
+    """
+    serializes / deserializes websocket messages, binary codecs
+    are sent as bytes frames, non-binary codecs as text frames
+    """
+    def __init__(self, name: str, dumps, loads, binary: bool = True):
+        self.name = name
+        self.dumps = dumps
+        self.loads = loads
+        self.binary = binary
+    def __repr__(self):
+        return f"Codec({self.name})"
+
+# name -> Codec, codecs available for negotiation during setup
+CODECS = {}
+
+def register_codec(name: str, dumps, loads, binary: bool = True):
+    """
+    register a codec which may be negotiated by proxies during setup,
+    custom codecs must be registered on both the EasyRpcServer & EasyRpcProxy
+    hosts under the same name
+    """
+    CODECS[name] = Codec(name, dumps, loads, binary=binary)
+    return CODECS[name]
+
+def get_codec(name: str):
+    if not name in CODECS:
+        raise Exception(f"no codec registered with name {name} - available: {list(CODECS)}")
+    return CODECS[name]
+
+def negotiate_codec(requested):
+    """
+    input:
+        `requested` codec name or list of codec names in order of preference
+    returns first requested codec which is registered, else None
+    """
+    if isinstance(requested, str):
+        requested = [requested]
+    for name in requested:
+        if name in CODECS:
+            return CODECS[name]
+    return None
+
+register_codec('json', json.dumps, json.loads, binary=False)
+register_codec('pickle', pickle.dumps, pickle.loads)
+
+# optional faster codecs, registered if installed
+try:
+    import orjson
+    register_codec('orjson', orjson.dumps, orjson.loads)
+except ImportError:
+    pass
+
+try:
+    import msgpack
+    register_codec(
+        'msgpack',
+        partial(msgpack.packb, use_bin_type=True),
+        partial(msgpack.unpackb, raw=False)
+    )
+except ImportError:
+    pass
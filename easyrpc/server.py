@@ -1,16 +1,51 @@
 import asyncio
-import uuid, json, pickle
+import uuid
+import time
+import itertools
 import logging
+from typing import Optional
+from collections import OrderedDict
+from functools import partial
 from concurrent.futures._base import CancelledError
 from fastapi import FastAPI
 from fastapi.websockets import WebSocket, WebSocketDisconnect
+from fastapi.responses import PlainTextResponse
 
-from easyrpc.auth import encode, decode
+from easyrpc.auth import (
+    encode, 
+    decode, 
+    session_encryption_supported, 
+    create_session_nonce, 
+    SessionCipher
+)
 from easyrpc.origin import Origin
 from easyrpc.register import Coroutine, Generator, AsyncGenerator, async_generator_asend
+from easyrpc.sigtools import content_hash
 from easyrpc.proxy import EasyRpcProxy
 from easyrpc.tools.logger import EasyRpcProxyLogger
-from easyrpc.generator import RpcGenerator
+from easyrpc.generator import RpcGenerator, ServerGenerators, stream_items
+from easyrpc.dispatch import RequestDispatcher
+from easyrpc.executor import OriginExecutors
+from easyrpc.workers import WorkerGroup
+from easyrpc.balance import BalancedFunction, BALANCE_POLICIES
+from easyrpc.routing import call_route, route_error, shortest_routes
+from easyrpc.metrics import Metrics, render_prometheus
+from easyrpc.tracing import Traced, current_span, traced_response, dumps_traced
+from easyrpc.capture import WireCapture
+from easyrpc.serialization import negotiate_codec
+from easyrpc.envelope import (
+    ENVELOPES, 
+    REQUEST, 
+    RESPONSE, 
+    PING, 
+    CANCEL, 
+    Coalescer,
+    Wire,
+    get_envelope
+)
+from easyrpc.pending import PendingRequests
+from easyrpc.registry import RegistryWatchers, registry_delta
+from easyrpc.exceptions import ClientConnectionClosed
 
 class ConnectionManager:
     def __init__(self, server):
@@ -40,7 +75,19 @@ class EasyRpcServer:
         server_secret: str, 
         encryption_enabled: bool = False,
         logger: logging.Logger = None,
-        debug: bool = False
+        debug: bool = False,
+        dispatch_mode: str = 'inline', # inline | concurrent
+        max_concurrency: int = 100, # per connection, used with dispatch_mode='concurrent'
+        stream_window: int = 0, # items per chunk when relaying generators, 0 requests each item
+        generator_idle_timeout: float = 300, # seconds, open generators without requests are closed
+        max_generators: int = 100, # open generators per session, 0 is unlimited
+        max_thread_workers: int = None, # pool size for origin(executor='thread')
+        max_process_workers: int = None, # pool size for origin(executor='process')
+        workers: str = None, # directory of unix sockets shared by workers of the same server
+        metrics_path: str = None, # i.e /metrics, serves metrics in prometheus text format
+        tracer = None, # easyrpc.tracing.Tracer, records spans of requests run & sent
+        wire_capture: int = 0, # samples 1 in N frames sent & received, 0 is disabled
+        wire_capture_namespace: str = None, # registers get_wire_capture within namespace
     ):
         self.kind = 'SERVER'
         self.loop = asyncio.get_running_loop()
@@ -48,21 +95,48 @@ class EasyRpcServer:
         self.origin_path = origin_path
         self.server_secret = server_secret
         self.encryption_enabled = encryption_enabled
+        self.dispatch_mode = dispatch_mode
+        self.max_concurrency = max_concurrency
+        self.stream_window = stream_window
         self.setup_logger(logger=logger, level='DEBUG' if debug else 'ERROR')
+        self.executors = OriginExecutors(
+            max_thread_workers=max_thread_workers,
+            max_process_workers=max_process_workers,
+            # forked pool workers would otherwise outlive the server
+            register_shutdown=lambda shutdown: server.on_event('shutdown')(shutdown)
+        )
         self.connection_manager = ConnectionManager(self)
 
         self.namespaces = {}
         self.namespace_groups = {}
 
+        # group_name -> balance policy, groups without a policy use the first function found
+        self.namespace_balance = {}
+        # group_name -> {f_name: BalancedFunction}, kept across dispatch table rebuilds
+        self.balanced_functions = {}
+
         self.origin = Origin(self)
         self._setup_ws_server(server)
 
         # send queues
         self.server_send_queue = {}
-        self.server_requests = {}
+        self.server_wires = {}
+
+        # session id -> ids of open connections, proxies with a connection pool
+        # open several connections within one session which share a send queue
+        self.server_sessions = {}
+
+        # server_requests are keyed by ids from a single counter shared by all
+        # connections, ids are never reused while the server is running
+        self.request_ids = itertools.count(1)
+        self.server_requests = PendingRequests()
 
         # generators
-        self.server_generators = {}
+        self.server_generators = ServerGenerators(
+            self.log, 
+            idle_timeout=generator_idle_timeout, 
+            max_per_owner=max_generators
+        )
 
         # server proxies
         self.server_proxies = {}
@@ -70,8 +144,59 @@ class EasyRpcServer:
         # clients that connect through this server
         self.reverse_proxies = set()
 
+        # namespace -> {func_name: func}, rebuilt after invalidate_dispatch()
+        self.dispatch_tables = {}
+        # namespace -> {func_name: {'hops', 'next_hop'}}, built with dispatch_tables
+        self.routing_tables = {}
+
+        # (namespace, upstream, trigger, all_functions) -> (config with etag, hashes)
+        # of registered functions, rebuilt after invalidate_dispatch()
+        self.registry_configs = {}
+
+        # sessions pushed registry changes
+        self.registry_watchers = RegistryWatchers(self)
+
+        # key -> {etag: hashes} of recent registry versions, proxies sending a 
+        # known etag are sent only the functions changed since
+        self.registry_versions = OrderedDict()
+        self.registry_history = 16
+
         self.server_id = str(uuid.uuid1())
 
+        # workers sharing registered functions & sessions, see WorkerGroup
+        self.workers = None
+        if workers:
+            self.workers = WorkerGroup(self, workers)
+            self.loop.create_task(self.workers.start())
+            server.on_event('shutdown')(self.workers.shutdown)
+
+        # calls, errors & latency per function, see get_metrics
+        self.metrics = Metrics()
+        self.metrics.gauge('sessions', lambda: len(self.server_sessions))
+        self.metrics.gauge(
+            'send_queue_depth', 
+            lambda: sum(queue.qsize() for queue in self.server_send_queue.values())
+        )
+        self.metrics.gauge('pending_requests', lambda: len(self.server_requests))
+        self.metrics.gauge('generators', lambda: len(self.server_generators))
+        if metrics_path:
+            @server.get(metrics_path, response_class=PlainTextResponse)
+            async def metrics():
+                return PlainTextResponse(
+                    render_prometheus(self.metrics, origin_path=self.origin_path),
+                    media_type='text/plain; version=0.0.4'
+                )
+
+        # spans of requests run, continuing traces of requests carrying a trace context
+        self.tracer = tracer
+
+        # sampled & truncated frames, see get_wire_capture
+        self.wire_capture = WireCapture(sample=wire_capture) if wire_capture else None
+        if wire_capture_namespace:
+            async def get_wire_capture(limit: Optional[int] = None):
+                return self.get_wire_capture(limit)
+            self.origin(get_wire_capture, namespace=wire_capture_namespace)
+
     @classmethod
     async def create(
         cls,
@@ -80,7 +205,19 @@ class EasyRpcServer:
         server_secret: str, 
         encryption_enabled: bool = False,
         logger: logging.Logger = None,
-        debug: bool = False
+        debug: bool = False,
+        dispatch_mode: str = 'inline',
+        max_concurrency: int = 100,
+        stream_window: int = 0,
+        generator_idle_timeout: float = 300,
+        max_generators: int = 100,
+        max_thread_workers: int = None,
+        max_process_workers: int = None,
+        workers: str = None,
+        metrics_path: str = None,
+        tracer = None,
+        wire_capture: int = 0,
+        wire_capture_namespace: str = None,
     ):
         return cls(
             server,
@@ -88,7 +225,19 @@ class EasyRpcServer:
             server_secret,
             encryption_enabled,
             logger,
-            debug
+            debug,
+            dispatch_mode=dispatch_mode,
+            max_concurrency=max_concurrency,
+            stream_window=stream_window,
+            generator_idle_timeout=generator_idle_timeout,
+            max_generators=max_generators,
+            max_thread_workers=max_thread_workers,
+            max_process_workers=max_process_workers,
+            workers=workers,
+            metrics_path=metrics_path,
+            tracer=tracer,
+            wire_capture=wire_capture,
+            wire_capture_namespace=wire_capture_namespace,
         )
     async def create_server_proxy_logger(
         self,
@@ -123,6 +272,7 @@ class EasyRpcServer:
         namespaces = [namespace] if not namespace in self.namespace_groups else list(self.namespace_groups[namespace])
         for n_space in namespaces:
             self.server_proxies[n_space][proxy_logger.session_id] = proxy_logger
+        self.invalidate_dispatch()
         return proxy_logger
 
         
@@ -160,7 +310,8 @@ class EasyRpcServer:
             response_expected,
             encryption_enabled,
             server=self,
-            ssl_verify=ssl_verify
+            ssl_verify=ssl_verify,
+            stream_window=self.stream_window
         )
         if proxy_type == 'SERVER':
             self.server_proxies[namespace]['parent'] = new_proxy
@@ -168,22 +319,51 @@ class EasyRpcServer:
             namespaces = [namespace] if not namespace in self.namespace_groups else list(self.namespace_groups[namespace])
             for n_space in namespaces:
                 self.server_proxies[n_space][new_proxy.session_id] = new_proxy
+        self.invalidate_dispatch()
         return new_proxy
-    def create_namespace_group(self, group_name: str, *namespaces):
+    def create_namespace_group(
+        self, 
+        group_name: str, 
+        *namespaces, 
+        balance: str = None, 
+        failover_cooldown: float = 5
+    ):
         """
         group two or more namespaces into a single reference space. Functions are not 
         registered to groups but the member namespaces. Namespaces do not allow for 
         duplicate functions, but namespace groups may contain namespaces with same-name 
         functions. When a function is called from a namespace group the first function 
-        with the matching name is used, a duplicate could be used in outage or 
-        load-balancing scenarios  
+        with the matching name is used, unless a balance policy is set
+
+        balance - first | round_robin | least_in_flight | ewma, calls are spread
+            across duplicate functions by policy & fail over to the next duplicate
+            if a call raises or its connection is down, see BalancedFunction
+        failover_cooldown - seconds a failed duplicate is skipped while others are available
         """
         if group_name in self.namespace_groups:
             raise Exception(f"a namespace_group named {group_name} already exists")
+        if balance:
+            if not balance in BALANCE_POLICIES:
+                raise Exception(f"balance policy {balance} is not one of {BALANCE_POLICIES}")
+            self.namespace_balance[group_name] = (balance, failover_cooldown)
+            self.balanced_functions[group_name] = {}
         for namespace in namespaces:
             if not namespace in self.namespaces:
                 self.namespaces[namespace] = {}
         self.namespace_groups[group_name] = set(namespaces)
+        self.invalidate_dispatch()
+
+    def invalidate_dispatch(self):
+        """
+        clears cached namespace dispatch tables, called when functions are 
+        registered or proxy functions change, tables are rebuilt on next lookup
+        """
+        self.dispatch_tables.clear()
+        self.routing_tables.clear()
+        self.registry_configs.clear()
+        self.registry_watchers.changed()
+        if self.workers:
+            self.workers.changed()
     def register_logger(self, logger: logging.Logger, namespace: str):
 
         @self.origin(namespace=namespace)
@@ -246,166 +426,155 @@ class EasyRpcServer:
             decoded_id = setup['id']
             namespace = setup['namespace']
             session_id = setup['id']
-            serialization = setup['serialization']
-            if serialization == 'json':
-                ws_send = websocket.send_json
-                serialize = json.dumps
-                deserialize = json.loads
-            else:
-                ws_send = websocket.send_bytes
-                serialize = pickle.dumps
-                deserialize = pickle.loads
+            # unique per websocket, a reconnecting client may reuse its index
+            # before the previous connection is closed
+            connection_id = (decoded_id, setup.get('connection', 0), id(websocket))
+            codec = negotiate_codec(setup.get('serialization', 'pickle'))
+            if not codec:
+                self.log.debug(f"no supported codec in requested serialization {setup['serialization']}")
+                await websocket.send_json({
+                    "error": f"no supported codec in requested serialization {setup['serialization']}"
+                    })
+                return
+            envelope = get_envelope(
+                setup['envelope'] if setup.get('envelope') in ENVELOPES else 'dict',
+                codec
+            )
 
+            # coalesce queued messages into single frames, using limits requested by client
+            coalescer = None
+            if setup.get('coalesce'):
+                coalescer = Coalescer(envelope, **setup['coalesce'])
 
-            self.connection_manager.store_connect(decoded_id, websocket)
+            # session encryption replaces per-request jwt encoding when supported by both sides
+            cipher, session_nonce = None, None
+            if self.encryption_enabled and setup.get('session_nonce') and session_encryption_supported():
+                session_nonce = create_session_nonce()
+                cipher = SessionCipher.create(
+                    self.server_secret, 
+                    setup['session_nonce'], 
+                    session_nonce, 
+                    side='server'
+                )
+            jwt_encrypted = self.encryption_enabled and cipher is None
+
+            wire = Wire(
+                envelope, 
+                coalescer=coalescer, 
+                cipher=cipher, 
+                dumps=partial(dumps_traced, envelope.dumps)
+            )
+            ws_send = websocket.send_bytes if wire.binary else websocket.send_text
+
+            self.connection_manager.store_connect(connection_id, websocket)
 
             finished = asyncio.Queue(2)
 
-            # queue of requests to be sent to client
-            self.server_send_queue[decoded_id] = asyncio.Queue()
+            # queue of requests to be sent to client, shared by each connection
+            # within a pooled session & sent by whichever sender is free
+            pooled = decoded_id in self.server_sessions
+            self.server_sessions.setdefault(decoded_id, set()).add(connection_id)
+            if not pooled:
+                self.server_send_queue[decoded_id] = asyncio.Queue()
+                self.server_wires[decoded_id] = wire
+            send_queue = self.server_send_queue[decoded_id]
 
             async def ws_sender():
                 try:
                     empty = True
                     while True:
                         if empty:
-                            request = await self.server_send_queue[decoded_id].get()
+                            request = await send_queue.get()
                             empty = False
                         else:
                             try:
-                                request = self.server_send_queue[decoded_id].get_nowait()
+                                request = send_queue.get_nowait()
                             except asyncio.QueueEmpty:
                                 empty = True
                                 continue
-                        
-                        if serialization == 'pickle':
-                            request = serialize(request)
-                        await ws_send(request)
+
+                        frame = wire.frame(request, send_queue)
+                        if self.wire_capture:
+                            self.wire_capture.record('sent', decoded_id, frame)
+                        await ws_send(frame)
                 except Exception as e:
                     if not isinstance(e, CancelledError):
                         self.log.exception(f"error with ws_sender")
                 await finished.put('finished')
 
+            async def respond(request, request_id, response_expected):
+                if jwt_encrypted:
+                    request = decode(request, self.server_secret, log=self.log)['data']
+                response = await self.execute_request(
+                    namespace, 
+                    request, 
+                    request_id, 
+                    session_id=decoded_id
+                )
+                if response_expected:
+                    self.log.debug("ws_action - response: %s", response)
+                    await send_queue.put(
+                        traced_response(self.tracer, request, envelope.response(request_id, response))
+                    )
+
+            dispatcher = RequestDispatcher(
+                respond,
+                mode=self.dispatch_mode,
+                max_concurrency=self.max_concurrency,
+                log=self.log
+            )
+
             async def ws_receiver():
                 try:
                     while True:
                         message = await websocket.receive()
                         
-                        if 'text' in message and 'ping' in message['text']:
-                            await self.server_send_queue[decoded_id].put({'pong': 'pong'})
-                        
                         if message['type'] == 'websocket.disconnect':
                             raise WebSocketDisconnect
 
-                        message = message['text'] if 'text' in message else message['bytes']
-                        message = deserialize(message)
-
-                        self.log.debug(f"received message: {message}")
-
-                        if 'ws_action' in message:  
-                            if message['ws_action']['type'] == 'response':
-                                queue = self.server_requests.get(message['ws_action']['request_id'])
-                                if queue:
-                                    await queue.put(message['ws_action']['response'])
-                            if message['ws_action']['type'] == 'request':
-                                
-                                request = message['ws_action']['request']
-                                request_id = message['ws_action']['request_id']
-                                response_expected = message['ws_action']['response_expected']
-
-                                if self.encryption_enabled:
-                                    request = decode(request, self.server_secret,log=self.log)['data']
-
-                                if not 'action' in request:
-                                    await self.server_send_queue[decoded_id].put({
-                                        'ws_action': {
-                                            'type': 'response',
-                                            'response': {"error": "missing expected input: 'action' "},
-                                            'request_id': request_id
-                                        }
-                                    })
-                                    continue
-                                action = request['action']
-                                self.log.debug(f"ws_action: {action}")
-                                if action == 'get_registered_functions':
-                                    # get_registered_functions
-                                    executed_action = self.get_registered_functions(
-                                        namespace=namespace,
-                                        **request['kwargs']
-                                    )
-                                    self.log.debug(f"ORIGIN action: get_registered_functions")
-                                elif action == 'GENERATOR_NEXT':
-                                    generator_id = request['generator_id']
-                                    if not generator_id in self.server_generators:
-                                        self.log.debug(f"no generator exists with request_id {generator_id}")
-                                    executed_action = self.server_generators[generator_id].asend(None)
-
-                                else:
-                                    if not action in self[namespace]:
-                                        self.log.debug(f"ws_receive: {action} not in orgin")
-                                        await self.server_send_queue[decoded_id].put({
-                                            'ws_action': {
-                                                'type': 'response',
-                                                'response': {"error": f"no action {action} registered for origin within {self[namespace]}"},
-                                                'request_id': request_id
-                                            }
-                                        })
-                                        continue
-                                    
-                                    
-                                    executed_action = self.run(
-                                        namespace,
-                                        action,
-                                        request['args'] if 'args' in request else [],
-                                        request['kwargs'] if 'kwargs' in request else {},
-                                    )
-                                    self.log.debug(f"ORIGIN action: {action}")
- 
-                                if type(executed_action) in {Coroutine, async_generator_asend}:
-                                    try:
-                                        response = await executed_action
-                                    except Exception as e:
-                                        if isinstance(e, StopAsyncIteration):
-                                            response = 'GENERATOR_END'
-                                        else:
-                                            response = repr(e)
-                                elif type(executed_action) in {Generator, AsyncGenerator}:
-                                    self.server_generators[request_id] = RpcGenerator(
-                                        executed_action
-                                    )
-                                    response = {'GENERATOR_START': request_id}
-                                else:
-                                    response = executed_action
-                                
-                                if response_expected:
-                                    self.log.debug(f"ws_action - response: {response}")
-                                    await self.server_send_queue[decoded_id].put({
-                                        'ws_action': {
-                                            'type': 'response',
-                                            'response': response,
-                                            'request_id': request_id
-                                        }
-                                    })
+                        message = message['text'] if message.get('text') is not None else message['bytes']
+                        if self.wire_capture:
+                            self.wire_capture.record('received', decoded_id, message)
+                        for kind, request_id, response_expected, body in wire.messages(message):
+                            self.log.debug("received message: %s %s %s", kind, request_id, body)
 
+                            if kind == PING:
+                                await send_queue.put(envelope.pong())
+                            elif kind == RESPONSE:
+                                self.server_requests.resolve(request_id, body)
+                            elif kind == REQUEST:
+                                await dispatcher.dispatch(body, request_id, response_expected)
+                            elif kind == CANCEL:
+                                dispatcher.cancel_request(request_id)
 
                 except Exception as e:
                     if not isinstance(e, CancelledError):
                         self.log.exception(f"error with ws_receiver")
+                dispatcher.cancel()
                 await finished.put('finished')
             
             loop = asyncio.get_running_loop()
-            loop.create_task(
-                ws_sender()
-            )
-            loop.create_task(
-                ws_receiver()
-            )
+            connection_tasks = [
+                loop.create_task(ws_sender()),
+                loop.create_task(ws_receiver())
+            ]
 
-            await websocket.send_json({'auth': 'ok', 'server_id': self.server_id})
+            await websocket.send_json({
+                'auth': 'ok', 
+                'server_id': self.server_id,
+                'serialization': codec.name,
+                'envelope': envelope.name,
+                'coalesce': coalescer is not None,
+                'session_nonce': session_nonce,
+                'registry_push': True
+            })
 
-            self.reverse_proxies.add(session_id)
+            # session is registered once, by the first connection within a pool
+            if not pooled:
+                self.reverse_proxies.add(session_id)
+                self.invalidate_dispatch()
 
-            if setup['type'] == 'SERVER':
+            if setup['type'] == 'SERVER' and not pooled:
                 """
                 session was started by a server, need to create proxy to gather 
                 server function in namespace, if any
@@ -421,109 +590,384 @@ class EasyRpcServer:
                 await finished.get()
 
                 # child connection closed
-                self.log.debug(f"client websocket connection with id {decoded_id} finished")
-                
-                # check if child is server or proxy
-                if setup['type'] == 'SERVER':
-                    
-                    if session_id in self.server_proxies[namespace]:
-                        del self.server_proxies[namespace][session_id]
-                    if session_id in self.reverse_proxies:
-                        self.reverse_proxies.remove(session_id)
+                self.log.debug(f"client websocket connection with id {connection_id} finished")
             except Exception as e:
                 if not isinstance(e, CancelledError):
                     self.log.exception(f"error with ws_sender")
             
-            self.connection_manager.disconnect(decoded_id)
-    async def server_generator(self, client_id, request_id, generator_id):
+            for task in connection_tasks:
+                task.cancel()
+            self.connection_manager.disconnect(connection_id)
+
+            session = self.server_sessions[decoded_id]
+            session.discard(connection_id)
+            if session:
+                # other connections within pool remain open
+                return
+            del self.server_sessions[decoded_id]
+            if self.workers:
+                self.workers.changed()
+            self.registry_watchers.unwatch(decoded_id)
+            await self.server_generators.close_owner(decoded_id)
+
+            # check if child is server or proxy
+            if setup['type'] == 'SERVER':
+                if session_id in self.server_proxies[namespace]:
+                    del self.server_proxies[namespace][session_id]
+                if session_id in self.reverse_proxies:
+                    self.reverse_proxies.remove(session_id)
+                self.invalidate_dispatch()
+
+            self.server_requests.fail_all(
+                ClientConnectionClosed(decoded_id),
+                owner=decoded_id
+            )
+            del self.server_send_queue[decoded_id]
+            del self.server_wires[decoded_id]
+    async def execute_request(self, namespace, request, request_id, session_id=None, notify=None):
+        """
+        runs a decoded ws_action request received within namespace & returns
+        the response which should be sent back to the requestor
+
+        session_id - session request was received on
+        notify - coroutine function sending a request to session, defaults to
+            server_request for sessions connected to this server
+        """
+        if not 'action' in request:
+            return {"error": "missing expected input: 'action' "}
+
+        action = request['action']
+        self.log.debug("ws_action: %s", action)
+        if action == 'get_registered_functions':
+            # get_registered_functions
+            watcher = None
+            if session_id:
+                if not notify:
+                    async def notify(update):
+                        await self.server_request(session_id, update, response_expected=False)
+                watcher = (session_id, notify)
+            executed_action = self.get_registry_config(
+                namespace,
+                watcher=watcher,
+                **request['kwargs']
+            )
+            self.log.debug("ORIGIN action: get_registered_functions")
+        elif action == 'REGISTRY_UPDATE':
+            # registry of child server connected with session_id changed
+            for n_space in self.namespace_groups.get(namespace, [namespace]):
+                proxy = self.server_proxies.get(n_space, {}).get(session_id)
+                if proxy:
+                    await proxy.apply_registry_update(request)
+                    break
+            return None
+        elif action == 'BATCH':
+            return await self.execute_batch(namespace, request, request_id, session_id)
+        elif action == 'GENERATOR_NEXT':
+            generator_id = request['generator_id']
+            if request.get('count'):
+                return await self.generator_chunk(generator_id, request['count'])
+            return await self.generator_next(generator_id)
+        elif action == 'GENERATOR_CLOSE':
+            # consumer stopped before GENERATOR_END
+            await self.server_generators.close(request['generator_id'])
+            return None
+        else:
+            if not action in self[namespace]:
+                self.log.debug("ws_receive: %s not in orgin", action)
+                return {"error": f"no action {action} registered for origin within {self[namespace]}"}
+
+            error = route_error(self.server_id, request)
+            if error:
+                self.log.error(error['error'])
+                return error
+
+            # requests forwarded while running action carry its route
+            route = call_route.set([*(request.get('route') or []), self.server_id])
+            span = None
+            if self.tracer:
+                span = self.tracer.start_span(
+                    f"execute {action}", 
+                    parent=request.get('trace'),
+                    namespace=namespace,
+                    server_id=self.server_id
+                )
+            trace = current_span.set(span)
+            start = time.perf_counter()
+            try:
+                # balanced callers fail over on errors, see BalancedFunction
+                raise_errors = request.get('raise_errors', False)
+                executed_action = self.run(
+                    namespace,
+                    action,
+                    request['args'] if 'args' in request else [],
+                    request['kwargs'] if 'kwargs' in request else {},
+                    raise_errors=raise_errors
+                )
+                self.log.debug("ORIGIN action: %s", action)
+                return await self.complete_request(
+                    executed_action, 
+                    session_id, 
+                    call=(namespace, action), 
+                    raise_errors=raise_errors
+                )
+            finally:
+                call_route.reset(route)
+                current_span.reset(trace)
+                if span:
+                    span.finish()
+                self.metrics.record(namespace, action, time.perf_counter() - start)
+
+        return await self.complete_request(executed_action, session_id)
+    async def complete_request(self, executed_action, session_id=None, call=None, raise_errors=False):
+        """
+        awaits executed_action or starts the generator it returned, returning 
+        the response to the request
+
+        call - (namespace, f_name) errors are counted for within metrics
+        raise_errors - errors are returned as {'RPC_ERROR': repr(e)} rather than repr(e)
+        """
+        if type(executed_action) in {Coroutine, async_generator_asend}:
+            try:
+                result = await executed_action
+            except Exception as e:
+                if isinstance(e, StopAsyncIteration):
+                    return 'GENERATOR_END'
+                if call:
+                    self.metrics.error(*call)
+                return {'RPC_ERROR': repr(e)} if raise_errors else repr(e)
+            if isinstance(result, dict) and 'GENERATOR_START' in result:
+                # generator relayed from another session, closed with either session
+                self.server_generators.claim(result['GENERATOR_START'], session_id)
+            if not type(result) in {Generator, AsyncGenerator}:
+                return result
+            # generator started by a BalancedFunction
+            executed_action = result
+        if type(executed_action) in {Generator, AsyncGenerator}:
+            generator = RpcGenerator(executed_action)
+            if self.server_generators.full(session_id):
+                await generator.close()
+                return {"error": f"session has reached max_generators {self.server_generators.max_per_owner} open generators"}
+            generator_id = str(uuid.uuid4())
+            self.server_generators.add(generator_id, generator, owner=session_id)
+            return {'GENERATOR_START': generator_id}
+        return executed_action
+    async def execute_batch(self, namespace, request, request_id, session_id=None):
+        """
+        runs each request within a BATCH request, returning list of responses
+        in request order
+        """
+        requests = [
+            sub_request for sub_request in request['requests']
+            if not sub_request.get('action') == 'BATCH'
+        ]
+        if not len(requests) == len(request['requests']):
+            return {"error": "BATCH requests may not be nested"}
+        if request.get('concurrent'):
+            return list(
+                await asyncio.gather(
+                    *[
+                        self.execute_request(namespace, sub_request, request_id, session_id=session_id) 
+                        for sub_request in requests
+                    ]
+                )
+            )
+        return [
+            await self.execute_request(namespace, sub_request, request_id, session_id=session_id) 
+            for sub_request in requests
+        ]
+    async def generator_next(self, generator_id):
+        """
+        returns next item of generator_id or 'GENERATOR_END'
+        """
+        generator = self.server_generators.get(generator_id)
+        if generator is None:
+            self.log.debug(f"no generator exists with id {generator_id}")
+            return {'GENERATOR_ERROR': f"no generator exists with id {generator_id}"}
+        try:
+            result = await generator.asend(None)
+        except StopAsyncIteration:
+            result = 'GENERATOR_END'
+        except Exception as e:
+            if not isinstance(generator, RpcGenerator):
+                # relayed session closed or failed, the relay has ended
+                self.server_generators.pop(generator_id)
+                return {'GENERATOR_ERROR': repr(e)}
+            return repr(e)
+        if result == 'GENERATOR_END':
+            self.server_generators.pop(generator_id)
+        if result is None:
+            # None responses mark failed requests, see stream_items
+            return {'GENERATOR_ITEMS': [None], 'GENERATOR_END': False}
+        return result
+    async def generator_chunk(self, generator_id, count: int):
+        """
+        returns next chunk of up to `count` items of generator_id, the 
+        generator produces up to `count` items ahead of the next request
+        """
+        generator = self.server_generators.get(generator_id)
+        if generator is None:
+            self.log.debug(f"no generator exists with id {generator_id}")
+            return {'GENERATOR_ERROR': f"no generator exists with id {generator_id}"}
+        if not isinstance(generator, RpcGenerator):
+            # generator relayed from another session
+            generator = RpcGenerator(generator)
+            self.server_generators.add(generator_id, generator)
+        chunk = await generator.next_chunk(count)
+        if chunk['GENERATOR_END']:
+            self.server_generators.pop(generator_id, None)
+        return chunk
+    async def server_generator(
+        self, 
+        client_id, 
+        generator_id, 
+        timeout: float = None, 
+        stream_window: int = 0
+    ):
+        async def send_request(request, response_expected=True):
+            return await self.server_request(
+                client_id,
+                request,
+                response_expected=response_expected,
+                timeout=timeout,
+                encode_request=False
+            )
         async def generator():
-            ws_action = {
-                'ws_action': {
-                    'type': 'request',
-                    'response_expected': True,
-                    'request': {'action': 'GENERATOR_NEXT', 'generator_id': generator_id},
-                    'request_id': request_id
-                }
-            }
             self.log.debug(f"generator {generator_id} starting")
-            while True:
-                await self.server_send_queue[client_id].put(ws_action)
-                result = await self.server_requests[request_id].get()
-                if result == 'GENERATOR_END':
-                    break
-                status = yield result
-                if 'status' == 'finished':
-                    break
-            self.log.debug(f"generator {generator_id} exiting")
-            del self.server_requests[request_id]
-            del self.server_generators[generator_id]
-        self.server_generators[generator_id] = generator()
-    async def server_request(self, client_id, request, response_expected=True):
+            items = stream_items(send_request, generator_id, stream_window)
+            try:
+                async for result in items:
+                    yield result
+            finally:
+                await items.aclose()
+                self.log.debug(f"generator {generator_id} exiting")
+                self.server_generators.release(generator_id)
+        # closed if the session relayed from disconnects, or the consuming session
+        self.server_generators.add(generator_id, generator(), owner=client_id)
+    async def server_request(
+        self, 
+        client_id, 
+        request, 
+        response_expected=True, 
+        timeout: float = None, 
+        encode_request: bool = True,
+        stream_window: int = 0
+    ):
         """
-        invokes websocket.send_json(request) using session with client_id
+        sends request to client using session with client_id
         response_expected = True (Default)
-            waits for response to request_id
+            waits for response to request_id, raises asyncio.TimeoutError
+            if not received within timeout
+        stream_window > 0
+            generators returned are streamed in chunks of up to stream_window items
+
+        raises ClientConnectionClosed if the session is closed, or closes before
+        the response is received
         """
+        if self.workers and not client_id in self.server_wires:
+            # session may be connected to another worker
+            peer = self.workers.session_peer(client_id)
+            if peer:
+                return await self.workers.session_request(
+                    peer,
+                    client_id,
+                    request,
+                    response_expected=response_expected,
+                    timeout=timeout,
+                    encode_request=encode_request,
+                    stream_window=stream_window
+                )
+        if not client_id in self.server_wires:
+            raise ClientConnectionClosed(client_id)
         try:
-            if self.encryption_enabled:
+            wire = self.server_wires[client_id]
+            if self.encryption_enabled and encode_request and not wire.cipher:
                 request = encode(self.server_secret, data=request, log=self.log)
-            request_id = str(uuid.uuid1())
-            ws_action = {
-                'ws_action': {
-                    'type': 'request',
-                    'response_expected': response_expected,
-                    'request': request,
-                    'request_id': request_id
-                }
-            }
-            if response_expected:
-                self.server_requests[request_id] = asyncio.Queue(1)
-
-            await self.server_send_queue[client_id].put(ws_action)
-
-
-            if response_expected:
-                result = await self.server_requests[request_id].get()
-                self.log.debug(f"server_request: result {result}")
-                if not result:
-                    return result
-                if hasattr(result, '__contains__') and 'GENERATOR_START' in result:
-                    generator_id = result['GENERATOR_START']
-                    await self.server_generator(client_id, request_id, generator_id)
-                    return result
-                del self.server_requests[request_id]
+            request_id = next(self.request_ids)
+            envelope = wire.envelope
+            ws_action = envelope.request(
+                request_id, 
+                request, 
+                response_expected
+            )
+            # queue wait & serialization are recorded within the call being made
+            span = current_span.get()
+            message = Traced(ws_action, span) if span else ws_action
+            if not response_expected:
+                await self.server_send_queue[client_id].put(message)
+                return
+
+            future = self.server_requests.create(request_id, owner=client_id)
+            await self.server_send_queue[client_id].put(message)
+            try:
+                result = await self.server_requests.wait(request_id, future, timeout)
+                if span:
+                    span.child('response_wait', start=message.sent or message.enqueued).finish()
+            except (asyncio.TimeoutError, CancelledError):
+                # requestor gave up - allow client to stop working on request
+                if client_id in self.server_send_queue:
+                    self.server_send_queue[client_id].put_nowait(
+                        envelope.cancel(request_id)
+                    )
+                raise
+
+            self.log.debug("server_request: result %s", result)
+            if not result:
                 return result
+            if hasattr(result, '__contains__') and 'GENERATOR_START' in result:
+                generator_id = result['GENERATOR_START']
+                await self.server_generator(
+                    client_id, 
+                    generator_id, 
+                    timeout=timeout, 
+                    stream_window=stream_window
+                )
+            return result
 
+        except (asyncio.TimeoutError, ClientConnectionClosed):
+            raise
         except Exception as e:
             self.log.exception("error during server_request")
-    def run(self, namespace, func, args=[], kwargs={}):
+    def run(self, namespace, func, args=[], kwargs={}, raise_errors=False):
         """
         returns function called with given args & kwargs
         if type async, returns coroutine that should be awaited
+        raise_errors - errors are returned as {'RPC_ERROR': repr(e)} rather than repr(e)
         """
-        if namespace in self.namespaces or namespace in self.namespace_groups:
-            if func in self[namespace]:
+        if (
+            namespace in self.namespaces or 
+            namespace in self.namespace_groups or
+            self.workers and self.workers.provides(namespace)
+        ):
+            function = self[namespace].get(func)
+            if function:
                 try:
-                    return self[namespace][func](
+                    return function(
                         *args,
                         **kwargs
                     )
                 except Exception as e:
                     self.log.exception(f'error running {func}')
-                    return repr(e)
+                    self.metrics.error(namespace, func)
+                    return {'RPC_ERROR': repr(e)} if raise_errors else repr(e)
         return None
     def get_parent_registered_functions(self, namespace, cfg='config', trigger=None):
-        self.log.debug(f"get_parent_registered_functions: ns {namespace} ser_proxies: {self.server_proxies} rev_proxies: {self.reverse_proxies}")
+        self.log.debug(
+            "get_parent_registered_functions: ns %s ser_proxies: %s rev_proxies: %s", 
+            namespace, self.server_proxies, self.reverse_proxies
+        )
         parent_funcs = []
         if 'parent' in self.server_proxies[namespace] and namespace in self.server_proxies[namespace]['parent'].namespaces:
             for f_name, config in self.server_proxies[namespace]['parent'].namespaces[namespace].items():
                 parent_funcs.append({f_name: config[cfg]})
-        self.log.debug(f"get_parent_registered_functions: reverse_proxies {self.reverse_proxies}")
+        self.log.debug("get_parent_registered_functions: reverse_proxies %s", self.reverse_proxies)
         for proxy in self.reverse_proxies:
             if trigger and trigger == proxy:
                 continue
             if proxy in self.server_proxies[namespace]:
-                self.log.debug(f"get_parent_registered_functions: reverse_proxy {self.server_proxies[namespace][proxy].namespaces[namespace]}")
+                self.log.debug(
+                    "get_parent_registered_functions: reverse_proxy %s", 
+                    self.server_proxies[namespace][proxy].namespaces[namespace]
+                )
                 for f_name, config in self.server_proxies[namespace][proxy].namespaces[namespace].items():
                     parent_funcs.append({f_name: config[cfg]})
 
@@ -538,7 +982,32 @@ class EasyRpcServer:
                     child_funcs.append({f_name: config[cfg]})
         return child_funcs
 
-    def get_registered_functions(self, namespace='DEFAULT', upstream=True, cfg='config', trigger=None, all_functions=False):
+    def get_worker_registered_functions(self, namespace, funcs, cfg='config'):
+        """
+        returns functions of other workers within namespace, excluding 
+        duplicates & functions within funcs
+        """
+        f_names = {f_name for func in funcs for f_name in func}
+        worker_funcs = []
+        for peer in self.workers.peers.values():
+            for f_name, config in peer.namespaces.get(namespace, {}).items():
+                if not f_name in f_names:
+                    f_names.add(f_name)
+                    worker_funcs.append({f_name: config[cfg]})
+        return worker_funcs
+
+    def get_registered_functions(
+        self, 
+        namespace='DEFAULT', 
+        upstream=True, 
+        cfg='config', 
+        trigger=None, 
+        all_functions=False, 
+        workers=True
+    ):
+        """
+        workers - include functions provided only by other workers, see WorkerGroup
+        """
         if namespace in self.namespace_groups:
             group_funcs = []
             for n_space in self.namespace_groups[namespace]:
@@ -550,10 +1019,16 @@ class EasyRpcServer:
 
                 if all_functions or not upstream:
                     group_funcs += self.get_child_registered_functions(n_space, cfg=cfg)
+
+                if workers and self.workers:
+                    group_funcs += self.get_worker_registered_functions(n_space, group_funcs, cfg=cfg)
             return {'funcs': group_funcs}
 
         # single namespaces    
-        self.log.debug(f"get_registered_functions: ns {namespace}, upstream {upstream} cfg {cfg} trigger: {trigger} af {all_functions}")
+        self.log.debug(
+            "get_registered_functions: ns %s, upstream %s cfg %s trigger: %s af %s", 
+            namespace, upstream, cfg, trigger, all_functions
+        )
         local_funcs = []
         if namespace in self.namespaces:
             local_funcs = [
@@ -563,14 +1038,87 @@ class EasyRpcServer:
             local_funcs += self.get_parent_registered_functions(namespace, cfg=cfg, trigger=trigger)
         if all_functions or not upstream:
             local_funcs += self.get_child_registered_functions(namespace, cfg=cfg)
+        if workers and self.workers:
+            local_funcs += self.get_worker_registered_functions(namespace, local_funcs, cfg=cfg)
         return {
             'funcs': local_funcs
             }
+    def get_registry(self, key):
+        """
+        returns (config, hashes) for key (namespace, upstream, trigger, all_functions),
+        the get_registered_functions config with its etag & the content hash of each 
+        function config, cached until the registry changes
+        """
+        if not key in self.registry_configs:
+            namespace, upstream, trigger, all_functions = key
+            config = self.get_registered_functions(
+                namespace,
+                upstream=upstream,
+                trigger=trigger,
+                all_functions=all_functions
+            )
+            hashes = {
+                f_name: content_hash(cfg) for func in config['funcs'] for f_name, cfg in func.items()
+            }
+            config['etag'] = content_hash(hashes)
+            self.registry_configs[key] = config, hashes
+            self.add_registry_version(key, config['etag'], hashes)
+        return self.registry_configs[key]
+    def add_registry_version(self, key, etag, hashes):
+        """
+        keeps the last registry_history versions for each of the most 
+        recently used keys
+        """
+        if not key in self.registry_versions:
+            self.registry_versions[key] = OrderedDict()
+        self.registry_versions.move_to_end(key)
+        versions = self.registry_versions[key]
+        versions[etag] = hashes
+        versions.move_to_end(etag)
+        while len(versions) > self.registry_history:
+            versions.popitem(last=False)
+        while len(self.registry_versions) > self.registry_history * 16:
+            self.registry_versions.popitem(last=False)
+    def get_registry_config(
+        self, 
+        namespace, 
+        upstream=True, 
+        trigger=None, 
+        all_functions=False, 
+        etag=None, 
+        watcher=None
+    ):
+        """
+        returns get_registered_functions config with its etag, or if `etag` is
+        a known version only the changes since:
+            {'etag', 'unchanged': True} - etag is current
+            {'etag', 'previous', 'delta': True, 'added', 'removed'} - see registry_delta
+        
+        watcher - (session_id, notify) session pushed REGISTRY_UPDATE's once
+            the config changes, see RegistryWatchers
+        """
+        key = (namespace, upstream, trigger, all_functions)
+        config, hashes = self.get_registry(key)
+        if watcher:
+            session_id, notify = watcher
+            self.registry_watchers.watch(session_id, key, notify)
+        if etag and etag == config['etag']:
+            return {'etag': etag, 'unchanged': True}
+        previous_hashes = self.registry_versions.get(key, {}).get(etag)
+        if etag and previous_hashes is not None:
+            return {
+                'etag': config['etag'],
+                'previous': etag,
+                'delta': True,
+                **registry_delta(config, hashes, previous_hashes)
+            }
+        return config
     def get_all_registered_functions(self, namespace):
         all_registered_functions = self.get_registered_functions(
             namespace,
             cfg='method',
-            all_functions=True
+            all_functions=True,
+            workers=False
         )
         registered_functions = {}
         for func in all_registered_functions['funcs']:
@@ -579,34 +1127,145 @@ class EasyRpcServer:
         return registered_functions
 
     def __getitem__(self, namespace):
+        if namespace in self.dispatch_tables:
+            dispatch_table = self.dispatch_tables[namespace]
+        else:
+            dispatch_table = self.build_dispatch_table(namespace)
+            self.dispatch_tables[namespace] = dispatch_table
+        if len(dispatch_table) == 0 and not namespace in self.namespace_groups:
+            raise IndexError(f"no namespace with name {namespace}")
+        return dispatch_table
+
+    def build_dispatch_table(self, namespace):
+        """
+        walks local, parent & child registered functions of namespace or 
+        namespace group, returning {func_name: func} of the route with the
+        fewest hops to each function, see get_routing_table
+        """
+        if namespace in self.namespace_balance:
+            return self.build_balanced_dispatch_table(namespace)
+        namespaces = [namespace]
         if namespace in self.namespace_groups:
-            group_functions = {}
-            for n_space in self.namespace_groups[namespace]:
-                for k, v in self.get_all_registered_functions(n_space).items():
-                    if not k in group_functions:
-                        group_functions[k] = v
-            self.log.debug(f"GET group functions: {group_functions}")
-            return group_functions
+            namespaces = sorted(self.namespace_groups[namespace])
+        routes = shortest_routes(
+            route for n_space in namespaces for route in self.get_routes(n_space)
+        )
+        self.routing_tables[namespace] = {
+            f_name: {'hops': route['hops'], 'next_hop': route['next_hop']}
+            for f_name, route in routes.items()
+        }
+        return {f_name: route['method'] for f_name, route in routes.items()}
 
-        proxy_funcs = {}
-        try:
-            if namespace in self.server_proxies:
-                for proxy_name, proxy in self.server_proxies[namespace].items():
-                    proxy_funcs[proxy_name] = proxy.proxy_funcs
-        except Exception as e:
-            self.log.exception(f"error checking proxy_funcs within __getitem__")
-        
-        local_funcs = {}
-        if namespace in self.namespaces:
-            local_funcs = self.get_all_registered_functions(namespace)
-        
-        for proxy, p_funcs in proxy_funcs.items():
-            for func_name in p_funcs:
-                if not func_name in local_funcs:
-                    local_funcs[func_name] = p_funcs[func_name]
-        if len(local_funcs) == 0:
-            raise IndexError(f"no namespace with name {namespace}")
-        return local_funcs
+    def get_routes(self, namespace):
+        """
+        yields a route {'f_name', 'hops', 'next_hop', 'method'} to each function 
+        reachable within namespace - local functions, functions of server proxies 
+        & functions of other workers
+        """
+        for f_name, function in self.namespaces.get(namespace, {}).items():
+            yield {'f_name': f_name, 'hops': 0, 'next_hop': None, 'method': function['method']}
+        for proxy_name, proxy in self.server_proxies.get(namespace, {}).items():
+            for f_name, function in proxy.namespaces.get(namespace, {}).items():
+                yield {
+                    'f_name': f_name, 
+                    'hops': function['config'].get('hops', 1), 
+                    'next_hop': proxy_name, 
+                    'method': function['method']
+                }
+        if self.workers:
+            for peer in self.workers.peers.values():
+                for f_name, function in peer.namespaces.get(namespace, {}).items():
+                    yield {
+                        'f_name': f_name, 
+                        'hops': function['config'].get('hops', 0), 
+                        'next_hop': f"worker:{peer.worker_id}", 
+                        'method': function['method']
+                    }
+
+    def get_wire_capture(self, limit: Optional[int] = None):
+        """
+        returns frames sampled while wire_capture is set, oldest first
+
+            [{'time', 'direction', 'session_id', 'size', 'truncated', 'frame'}]
+        """
+        if not self.wire_capture:
+            return []
+        return self.wire_capture.frames(limit)
+
+    def get_metrics(self):
+        """
+        returns snapshot of calls, errors & latency (seconds) of each function 
+        called on the server & current queue depths
+
+            {
+                'functions': {namespace: {f_name: {'calls', 'errors', 'latency'}}},
+                'gauges': {'sessions', 'send_queue_depth', 'pending_requests', 'generators'}
+            }
+        """
+        return self.metrics.snapshot()
+
+    def get_routing_table(self, namespace):
+        """
+        returns {f_name: {'hops', 'next_hop'}} of namespace or namespace group, 
+        next_hop is None for local functions, 'parent', the session id of a child 
+        or worker:<worker_id> of another worker
+        """
+        if not namespace in self.routing_tables:
+            self[namespace]
+        return self.routing_tables.get(namespace, {})
+
+    def get_group_providers(self, group_name):
+        """
+        returns {f_name: [(func, available)]} of each distinct function within the 
+        member namespaces of group_name, `available` returns False while the 
+        connection to the function is down, None if local
+        """
+        providers = {}
+        def add(f_name, func, available=None):
+            if not any(func is provider for provider, _ in providers.get(f_name, [])):
+                providers.setdefault(f_name, []).append((func, available))
+
+        for n_space in sorted(self.namespace_groups[group_name]):
+            for f_name, function in self.namespaces.get(n_space, {}).items():
+                add(f_name, function['method'])
+            for proxy in self.server_proxies.get(n_space, {}).values():
+                for f_name, function in proxy.namespaces.get(n_space, {}).items():
+                    add(f_name, function['method'], lambda proxy=proxy: proxy.connected)
+            if self.workers:
+                for peer in list(self.workers.peers.values()):
+                    for f_name, function in peer.namespaces.get(n_space, {}).items():
+                        add(
+                            f_name, 
+                            function['method'], 
+                            lambda peer=peer: self.workers.peers.get(peer.worker_id) is peer
+                        )
+        return providers
+
+    def build_balanced_dispatch_table(self, group_name):
+        """
+        returns {func_name: func} of group_name, functions with duplicates 
+        are BalancedFunctions calling one of the duplicates by policy
+        """
+        policy, cooldown = self.namespace_balance[group_name]
+        balanced_functions = self.balanced_functions[group_name]
+        group_functions = {}
+        for f_name, providers in self.get_group_providers(group_name).items():
+            if len(providers) == 1:
+                group_functions[f_name] = providers[0][0]
+                balanced_functions.pop(f_name, None)
+                continue
+            if not f_name in balanced_functions:
+                balanced_functions[f_name] = BalancedFunction(
+                    f_name, 
+                    policy, 
+                    cooldown=cooldown,
+                    log=self.log
+                )
+            balanced_functions[f_name].update(providers)
+            group_functions[f_name] = balanced_functions[f_name]
+        for f_name in [f_name for f_name in balanced_functions if not f_name in group_functions]:
+            del balanced_functions[f_name]
+        return group_functions
 
         
     
\ No newline at end of file
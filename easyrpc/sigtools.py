@@ -1,7 +1,10 @@
 from __future__ import annotations
 import enum
+import functools
+import hashlib
 import importlib
 import inspect
+import itertools
 import json
 import types
 import typing
@@ -246,107 +249,276 @@ def deserialize_signature(spec: dict) -> inspect.Signature:
 
 
 # -----------------------------
-# Runtime type validation (common cases)
+# Compiled runtime validation (common cases)
 # -----------------------------
 
-def _check_type(value: Any, tp: Any) -> bool:
+def _type_error(value: Any, tp: Any) -> TypeError:
+    return TypeError(f"Value {value!r} does not match {tp!r}")
+
+
+def _compile_isinstance(tp: Any) -> typing.Callable[[Any], Any]:
+    """Plain classes (or a tuple of them) are validated by isinstance, without coercion."""
+    def check_type(value):
+        if isinstance(value, tp):
+            return value
+        raise _type_error(value, tp)
+    # lets containers check all elements with a single isinstance map
+    check_type.plain_type = tp
+    return check_type
+
+
+def _compile_elements(elem_t: Any) -> typing.Callable[[Any], Any]:
+    """
+    Returns function validating every element of an iterable, which returns None
+    when all elements are accepted unchanged, else a list of coerced elements.
+    """
+    coerce = _compile_type(elem_t)
+    if coerce is None:
+        return lambda values: None
+
+    plain_type = getattr(coerce, "plain_type", None)
+    if plain_type is not None:
+        def check_elements(values):
+            # isinstance is mapped in C rather than a python call per element
+            if all(map(isinstance, values, itertools.repeat(plain_type))):
+                return None
+            for value in values:
+                coerce(value)  # raises for first invalid element
+        return check_elements
+
+    def coerce_elements(values):
+        return [coerce(value) for value in values]
+    return coerce_elements
+
+
+def _compile_type(tp: Any) -> typing.Optional[typing.Callable[[Any], Any]]:
+    """
+    Compiles annotation tp once into a function which validates & coerces a value,
+    raising TypeError. Returns None if any value is accepted unchanged.
+    """
     if tp is inspect._empty or tp is Any:
-        return True
+        return None
     if tp is None or tp is type(None):
-        return value is None
+        return _compile_isinstance(type(None))
 
     origin = get_origin(tp)
     args = get_args(tp)
 
     if origin is typing.Annotated:
         # Validate against underlying type, ignore metadata for enforcement.
-        return _check_type(value, args[0])
+        return _compile_type(args[0])
 
     if origin is typing.Union or origin is types.UnionType:
-        return any(_check_type(value, a) for a in args)
+        options = [_compile_type(a) for a in args]
+        if None in options:
+            return None
+        plain_types = [getattr(option, "plain_type", None) for option in options]
+        if all(isinstance(t, type) for t in plain_types):
+            return _compile_isinstance(tuple(plain_types))
+
+        def coerce_union(value):
+            last_err = None
+            for option in options:
+                try:
+                    return option(value)
+                except Exception as e:
+                    last_err = e
+            raise TypeError(f"Value {value!r} does not match any Union option") from last_err
+        return coerce_union
 
     if origin is typing.Literal:
-        return value in args
+        def check_literal(value):
+            if value in args:
+                return value
+            raise _type_error(value, tp)
+        return check_literal
 
     if origin in (list, set, frozenset):
-        if not isinstance(value, origin):
-            return False
         (elem_t,) = args or (Any,)
-        return all(_check_type(x, elem_t) for x in value)
+        elements = _compile_elements(elem_t)
+
+        def coerce_collection(value):
+            if not isinstance(value, origin):
+                raise _type_error(value, tp)
+            coerced = elements(value)
+            return value if coerced is None else origin(coerced)
+        return coerce_collection
 
     if origin is dict:
-        if not isinstance(value, dict):
-            return False
         key_t, val_t = args if args else (Any, Any)
-        return all(_check_type(k, key_t) and _check_type(v, val_t) for k, v in value.items())
+        keys, values = _compile_elements(key_t), _compile_elements(val_t)
+
+        def coerce_dict(value):
+            if not isinstance(value, dict):
+                raise _type_error(value, tp)
+            coerced_keys, coerced_values = keys(value.keys()), values(value.values())
+            if coerced_keys is None and coerced_values is None:
+                return value
+            return dict(
+                zip(
+                    value.keys() if coerced_keys is None else coerced_keys,
+                    value.values() if coerced_values is None else coerced_values,
+                )
+            )
+        return coerce_dict
 
     if origin is tuple:
-        if not isinstance(value, tuple):
-            return False
-        if not args:
-            return True
         # tuple[T, ...]
         if len(args) == 2 and args[1] is Ellipsis:
-            return all(_check_type(x, args[0]) for x in value)
+            elements = _compile_elements(args[0])
+
+            def coerce_var_tuple(value):
+                if not isinstance(value, tuple):
+                    raise _type_error(value, tp)
+                coerced = elements(value)
+                return value if coerced is None else tuple(coerced)
+            return coerce_var_tuple
+
         # tuple[T1, T2, ...]
-        return len(value) == len(args) and all(_check_type(x, t) for x, t in zip(value, args))
+        items = [_compile_type(a) for a in args]
+
+        def coerce_tuple(value):
+            if not isinstance(value, tuple):
+                raise _type_error(value, tp)
+            if not items:
+                return value
+            if not len(value) == len(items):
+                raise _type_error(value, tp)
+            return tuple(x if item is None else item(x) for x, item in zip(value, items))
+        return coerce_tuple
 
     # Fallback for many parameterized generics: shallow isinstance(origin)
     if origin is not None:
-        try:
-            return isinstance(value, origin)
-        except TypeError:
-            return True  # unsupported runtime-check generic
+        def check_origin(value):
+            try:
+                if isinstance(value, origin):
+                    return value
+            except TypeError:
+                return value  # unsupported runtime-check generic
+            raise _type_error(value, tp)
+        return check_origin
+
+    if isinstance(tp, type) and issubclass(tp, enum.Enum):
+        def coerce_enum(value):
+            if isinstance(value, tp):
+                return value
+            try:
+                return tp(value)  # converts "a" -> CustomEnum.a
+            except Exception as e:
+                raise TypeError(f"Invalid enum value {value!r} for {tp.__name__}") from e
+        return coerce_enum
 
     if isinstance(tp, type):
-        return isinstance(value, tp)
+        return _compile_isinstance(tp)
 
     # Unknown/unsupported runtime-checkable annotation -> allow
-    return True
-
-def _coerce_value(value: Any, tp: Any) -> Any:
-    origin = get_origin(tp)
-    args = get_args(tp)
-
-    if tp is inspect._empty or tp is Any:
-        return value
-    if tp is None or tp is type(None):
-        if value is None:
-            return None
-        raise TypeError(f"Expected None, got {value!r}")
+    return None
 
-    if origin is typing.Annotated:
-        return _coerce_value(value, args[0])
 
-    if origin is typing.Union or origin is types.UnionType:
-        last_err = None
-        for a in args:
-            try:
-                return _coerce_value(value, a)
-            except Exception as e:
-                last_err = e
-        raise TypeError(f"Value {value!r} does not match any Union option") from last_err
-
-    if isinstance(tp, type) and issubclass(tp, enum.Enum):
-        if isinstance(value, tp):
-            return value
-        try:
-            return tp(value)  # converts "a" -> CustomEnum.a
-        except Exception as e:
-            raise TypeError(f"Invalid enum value {value!r} for {tp.__name__}") from e
+def compile_validator(sig: inspect.Signature) -> typing.Callable[..., tuple]:
+    """
+    Compiles sig into a function which enforces the same call signature rules as
+    sig.bind, validating & coercing each annotated argument. The function returns
+    the coerced (args, kwargs).
+    """
+    params = list(sig.parameters.values())
+    coercers = {p.name: _compile_type(p.annotation) for p in params}
 
-    # fallback: no coercion, just return original
-    if _check_type(value, tp):
-        return value
-    raise TypeError(f"Value {value!r} does not match {tp!r}")
+    simple = all(
+        p.kind in (inspect.Parameter.POSITIONAL_OR_KEYWORD, inspect.Parameter.KEYWORD_ONLY)
+        for p in params
+    )
+    if not simple:
+        def validate(*args, **kwargs):
+            bound = sig.bind(*args, **kwargs)
+            for name, value in bound.arguments.items():
+                coerce = coercers[name]
+                if coerce is None:
+                    continue
+                kind = sig.parameters[name].kind
+                if kind is inspect.Parameter.VAR_POSITIONAL:
+                    bound.arguments[name] = tuple(coerce(x) for x in value)
+                elif kind is inspect.Parameter.VAR_KEYWORD:
+                    bound.arguments[name] = {k: coerce(v) for k, v in value.items()}
+                else:
+                    bound.arguments[name] = coerce(value)
+            return bound.args, bound.kwargs
+        return validate
+
+    # Fast path - binds without sig.bind, keeping the call shape of the caller.
+    positional = [p.name for p in params if p.kind is inspect.Parameter.POSITIONAL_OR_KEYWORD]
+    positional_index = {name: i for i, name in enumerate(positional)}
+    positional_coercers = [coercers[name] for name in positional]
+    required = [p.name for p in params if p.default is inspect._empty]
+
+    def validate(*args, **kwargs):
+        if len(args) > len(positional):
+            raise TypeError("too many positional arguments")
+        if any(positional_coercers):
+            args = tuple(
+                value if coerce is None else coerce(value)
+                for value, coerce in zip(args, positional_coercers)
+            )
+        for name, value in kwargs.items():
+            if not name in coercers:
+                raise TypeError(f"got an unexpected keyword argument {name!r}")
+            if positional_index.get(name, len(args)) < len(args):
+                raise TypeError(f"multiple values for argument {name!r}")
+            coerce = coercers[name]
+            if coerce is not None:
+                kwargs[name] = coerce(value)
+        for name in required:
+            if positional_index.get(name, len(args)) >= len(args) and not name in kwargs:
+                raise TypeError(f"missing a required argument: {name!r}")
+        return args, kwargs
+    return validate
+
+
+@functools.lru_cache(maxsize=1024)
+def _compile_spec(key: str) -> tuple:
+    sig = deserialize_signature(json.loads(key))
+    return sig, compile_validator(sig)
+
+
+def content_hash(spec: Any) -> str:
+    """Hash of a JSON-serializable spec, equal for specs with equal content."""
+    return hashlib.sha1(json.dumps(spec, sort_keys=True, default=repr).encode()).hexdigest()
+
+
+def compile_spec(sig_spec: dict) -> tuple:
+    """
+    Returns (signature, validator) for a serialized signature, compiled once per
+    distinct spec & shared by all stubs created from it.
+    """
+    return _compile_spec(json.dumps(sig_spec, sort_keys=True))
 
 
 # -----------------------------
 # Rebuild a stub function with matching call-shape + validation
 # -----------------------------
 
-def create_proxy_from_spec(spec: dict, proxy: typing.Callable[..., Any] = None) -> typing.Callable[..., Any]:
-    sig = deserialize_signature(spec['sig'])
+def wire_arguments(args: tuple, kwargs: dict) -> tuple:
+    """
+    returns (args, kwargs) as sent to the origin, enum members as their values,
+    which any codec can encode & the origin coerces
+    """
+    if any(isinstance(v, enum.Enum) for v in args):
+        args = tuple(v.value if isinstance(v, enum.Enum) else v for v in args)
+    if any(isinstance(v, enum.Enum) for v in kwargs.values()):
+        kwargs = {k: v.value if isinstance(v, enum.Enum) else v for k, v in kwargs.items()}
+    return args, kwargs
+
+
+def create_proxy_from_spec(
+    spec: dict,
+    proxy: typing.Callable[..., Any] = None,
+    validate_args: bool = True,
+) -> typing.Callable[..., Any]:
+    """
+    validate_args = False
+        skips argument validation, arguments are forwarded to proxy as is
+    """
+    sig, validate = compile_spec(spec['sig'])
 
     annotations = {
         p.name: p.annotation
@@ -356,40 +528,24 @@ def create_proxy_from_spec(spec: dict, proxy: typing.Callable[..., Any] = None)
     if sig.return_annotation is not inspect._empty:
         annotations["return"] = sig.return_annotation
 
-    # proxy.__name__ = spec.get("name", "stub")
-    # proxy.__annotations__ = annotations
-    # proxy.__signature__ = sig
-    # proxy.__doc__ = spec.get("doc", "")
-
-    def stub(*args, **kwargs):
-        # Enforce same call signature rules (missing args, bad kwargs, etc.)
-        bound = sig.bind(*args, **kwargs)
-        bound.apply_defaults()
-
-        for name, value in list(bound.arguments.items()):
-            p = sig.parameters[name]
-            ann = p.annotation
-            if ann is inspect._empty:
-                continue
-
-            if p.kind is inspect.Parameter.VAR_POSITIONAL:
-                bound.arguments[name] = tuple(_coerce_value(x, ann) for x in value)
-            elif p.kind is inspect.Parameter.VAR_KEYWORD:
-                bound.arguments[name] = {k: _coerce_value(v, ann) for k, v in value.items()}
-            else:
-                bound.arguments[name] = _coerce_value(value, ann)
-
-        result = proxy(*args, **kwargs)
-        return result
-        # if isinstance(result, Coroutine):
-        #     return await result
-        # return result
+    if validate_args:
+        def stub(*args, **kwargs):
+            # validated only, coerced values i.e enum members may not be
+            # encodable by the session's codec
+            validate(*args, **kwargs)
+            args, kwargs = wire_arguments(args, kwargs)
+            return proxy(*args, **kwargs)
+    else:
+        def stub(*args, **kwargs):
+            return proxy(*args, **kwargs)
 
     stub.__name__ = spec.get("name", "stub")
     stub.__annotations__ = annotations
     # Helps inspect.signature(stub) report the reconstructed signature
     stub.__signature__ = sig
     stub.__doc__ = spec.get("doc", "")
+    # allows call arguments to be validated without calling proxy, i.e batches
+    stub.validate = validate if validate_args else None
     return stub
 
 
@@ -63,6 +63,12 @@ class EasyRpcProxyDatabase(EasyRpcProxy):
     async def run(self, query):
         return await self['run'](query)
 
+    async def apply_registry_update(self, update):
+        await super().apply_registry_update(update)
+        # table functions added / removed - refresh instead of waiting on interval,
+        # not awaited as refresh_tables waits on responses read by the receiver
+        asyncio.create_task(self.refresh_tables())
+
     async def refresh_tables(self):
         tables = await self.show_tables()
     
@@ -87,4 +93,5 @@ class EasyRpcProxyDatabase(EasyRpcProxy):
                 if isinstance(e, asyncio.CancelledError):
                     break
                 self.log.error(f"error during _cron_refresh_tables - {repr(e)}")
-            await asyncio.sleep(10)
\ No newline at end of file
+            # tables are refreshed once registry updates are pushed, polling is a fallback
+            await asyncio.sleep(self.registry_poll_interval if self.registry_push else 10)
\ No newline at end of file
@@ -0,0 +1,274 @@
+import os
+import json
+import time
+import random
+import asyncio
+from contextvars import ContextVar
+
+# span of the call being made or request being run, requests sent while
+# set carry its trace context & record their spans as its children
+current_span = ContextVar('current_span', default=None)
+
+class Span:
+    """
+    a timed operation within a trace, ids are hex strings compatible with otlp
+    """
+    __slots__ = ('tracer', 'trace_id', 'span_id', 'parent_id', 'name', 'start', 'end', 'attributes')
+    def __init__(self, tracer, name: str, trace_id: str, parent_id: str = None, start: int = None, **attributes):
+        self.tracer = tracer
+        self.trace_id = trace_id
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.name = name
+        self.start = start or time.time_ns()
+        self.end = None
+        self.attributes = attributes
+    def __repr__(self):
+        return f"Span({self.name}, trace_id={self.trace_id}, span_id={self.span_id})"
+
+    def context(self) -> dict:
+        """
+        trace context sent with requests, {'trace_id', 'span_id'}
+        """
+        return {'trace_id': self.trace_id, 'span_id': self.span_id}
+
+    def child(self, name: str, start: int = None, **attributes):
+        return Span(self.tracer, name, self.trace_id, self.span_id, start=start, **attributes)
+
+    def finish(self, end: int = None):
+        self.end = end or time.time_ns()
+        self.tracer.record(self)
+
+    def to_dict(self) -> dict:
+        return {
+            'trace_id': self.trace_id,
+            'span_id': self.span_id,
+            'parent_id': self.parent_id,
+            'name': self.name,
+            'service': self.tracer.service,
+            'start_ns': self.start,
+            'end_ns': self.end,
+            'duration_ms': (self.end - self.start) / 1e6,
+            'attributes': self.attributes
+        }
+
+class Traced:
+    """
+    message within a send queue, its queue wait & serialization are recorded
+    as children of `span` once framed by the sender, `sent` is then set
+
+        finish - span is finished once message is framed
+    """
+    __slots__ = ('message', 'span', 'finish', 'enqueued', 'sent')
+    def __init__(self, message, span: Span, finish: bool = False):
+        self.message = message
+        self.span = span
+        self.finish = finish
+        self.enqueued = time.time_ns()
+        self.sent = None
+
+def dumps_traced(dumps, message):
+    """
+    returns dumps(message), recording spans if message is Traced, used as 
+    Wire(dumps=partial(dumps_traced, envelope.dumps))
+    """
+    if not isinstance(message, Traced):
+        return dumps(message)
+    start = time.time_ns()
+    data = dumps(message.message)
+    message.sent = time.time_ns()
+    message.span.child('queue_wait', start=message.enqueued).finish(start)
+    message.span.child('serialize', start=start).finish(message.sent)
+    if message.finish:
+        message.span.finish(message.sent)
+    return data
+
+def traced_response(tracer, request, response):
+    """
+    returns response wrapped as Traced within a 'respond' span, if tracer is set
+    & request carries a trace context
+    """
+    if tracer and isinstance(request, dict) and request.get('trace'):
+        return Traced(response, tracer.start_span('respond', parent=request['trace']), finish=True)
+    return response
+
+class Tracer:
+    """
+    records spans of calls made & requests run, exported in batches
+
+        service - name of the server or proxy recording spans
+        exporter - FileExporter | OtlpExporter, or any object with an async
+            export(spans) method
+        sample_rate - fraction of calls started by this tracer which are traced,
+            requests carrying a trace context are always traced
+    """
+    def __init__(
+        self,
+        service: str,
+        exporter=None,
+        sample_rate: float = 1.0,
+        batch_size: int = 512,
+        flush_interval: float = 1.0,
+        max_spans: int = 10000
+    ):
+        self.service = service
+        self.exporter = exporter
+        self.sample_rate = sample_rate
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_spans = max_spans # spans buffered before new spans are dropped
+        self.spans = []
+        self.dropped = 0
+        self.flush_task = None
+
+    def start_span(self, name: str, parent=None, **attributes):
+        """
+        returns Span child of parent, a Span or trace context, or a new trace
+        if sampled, else None
+        """
+        if isinstance(parent, Span):
+            return parent.child(name, **attributes)
+        if parent:
+            return Span(self, name, parent['trace_id'], parent['span_id'], **attributes)
+        if self.sample_rate < 1.0 and random.random() >= self.sample_rate:
+            return None
+        return Span(self, name, os.urandom(16).hex(), **attributes)
+
+    def record(self, span: Span):
+        if len(self.spans) >= self.max_spans:
+            self.dropped += 1
+            return
+        self.spans.append(span)
+        if self.exporter and not self.flush_task:
+            try:
+                loop = asyncio.get_running_loop()
+            except RuntimeError:
+                return
+            self.flush_task = loop.create_task(self.flush_later())
+
+    async def flush_later(self):
+        if len(self.spans) < self.batch_size:
+            await asyncio.sleep(self.flush_interval)
+        self.flush_task = None
+        try:
+            await self.flush()
+        except Exception:
+            # spans are kept & exported with the next flush
+            pass
+
+    async def flush(self):
+        """
+        exports buffered spans, spans are kept if not exported
+        """
+        spans, self.spans = self.spans, []
+        if not spans or not self.exporter:
+            self.spans = spans + self.spans
+            return
+        try:
+            await self.exporter.export(spans)
+        except Exception:
+            self.spans = spans[-self.max_spans:] + self.spans
+            raise
+
+class FileExporter:
+    """
+    appends spans as json lines to path
+    """
+    def __init__(self, path: str):
+        self.path = path
+
+    async def export(self, spans: list):
+        with open(self.path, 'a') as f:
+            for span in spans:
+                f.write(json.dumps(span.to_dict(), default=repr) + '\n')
+
+def otlp_attributes(attributes: dict) -> list:
+    def value(v):
+        if isinstance(v, bool):
+            return {'boolValue': v}
+        if isinstance(v, int):
+            return {'intValue': str(v)}
+        if isinstance(v, float):
+            return {'doubleValue': v}
+        return {'stringValue': str(v)}
+    return [{'key': k, 'value': value(v)} for k, v in attributes.items()]
+
+def otlp_payload(spans: list) -> dict:
+    """
+    returns spans as an otlp/json ExportTraceServiceRequest
+    """
+    services = {}
+    for span in spans:
+        services.setdefault(span.tracer.service, []).append(span)
+    return {
+        'resourceSpans': [
+            {
+                'resource': {'attributes': otlp_attributes({'service.name': service})},
+                'scopeSpans': [{
+                    'scope': {'name': 'easyrpc'},
+                    'spans': [
+                        {
+                            'traceId': span.trace_id,
+                            'spanId': span.span_id,
+                            'parentSpanId': span.parent_id or '',
+                            'name': span.name,
+                            'kind': 1,
+                            'startTimeUnixNano': str(span.start),
+                            'endTimeUnixNano': str(span.end),
+                            'attributes': otlp_attributes(span.attributes)
+                        }
+                        for span in service_spans
+                    ]
+                }]
+            }
+            for service, service_spans in services.items()
+        ]
+    }
+
+class OtlpExporter:
+    """
+    posts spans as otlp/json to a collector, i.e http://localhost:4318/v1/traces
+    """
+    def __init__(self, url: str, timeout: float = 10):
+        self.url = url
+        self.timeout = timeout
+
+    async def export(self, spans: list):
+        from aiohttp import ClientSession, ClientTimeout
+        async with ClientSession(timeout=ClientTimeout(total=self.timeout)) as session:
+            async with session.post(self.url, json=otlp_payload(spans)) as response:
+                if response.status >= 300:
+                    raise Exception(f"otlp collector {self.url} responded {response.status}")
+
+def add_collector_route(server, path: str = '/v1/traces', file: str = None):
+    """
+    adds route to FastAPI server accepting otlp/json spans, a stand-in for an otlp
+    collector during development - returns list of received spans, or spans are 
+    appended as json lines to file
+    """
+    from fastapi import Request
+    collected = []
+
+    @server.post(path)
+    async def collect(request: Request):
+        payload = await request.json()
+        spans = [
+            {
+                'service': {
+                    attribute['key']: attribute['value'].get('stringValue') 
+                    for attribute in resource_spans.get('resource', {}).get('attributes', [])
+                }.get('service.name'),
+                **span
+            }
+            for resource_spans in payload.get('resourceSpans', [])
+            for scope_spans in resource_spans.get('scopeSpans', [])
+            for span in scope_spans.get('spans', [])
+        ]
+        if file:
+            with open(file, 'a') as f:
+                for span in spans:
+                    f.write(json.dumps(span) + '\n')
+        else:
+            collected.extend(spans)
+        return {}
+    return collected
@@ -0,0 +1,425 @@
+import os
+import hmac
+import stat
+import asyncio
+import pickle
+import struct
+import hashlib
+import itertools
+from concurrent.futures._base import CancelledError
+
+from easyrpc.pending import PendingRequests
+from easyrpc.generator import stream_items
+from easyrpc.sigtools import content_hash
+from easyrpc.exceptions import WorkerConnectionClosed, RemoteCallError
+from easyrpc.balance import raise_remote_errors
+from easyrpc.routing import forward_route
+from easyrpc.tracing import current_span
+
+# 4 byte length prefix of each frame sent between workers
+FRAME_HEADER = struct.Struct('!I')
+
+# HMAC-SHA256 of the pickled message, prefixed to each frame
+FRAME_MAC_SIZE = hashlib.sha256().digest_size
+
+# actions a worker runs for generators it started on behalf of another worker
+GENERATOR_ACTIONS = {'GENERATOR_NEXT', 'GENERATOR_CLOSE'}
+
+def frame_key(secret: str) -> bytes:
+    """
+    returns key signing frames between workers, derived from server_secret
+    """
+    return hmac.new(secret.encode(), b'easyrpc workers', hashlib.sha256).digest()
+
+async def read_frame(reader: asyncio.StreamReader, key: bytes):
+    """
+    reads a frame, only unpickled if signed with key
+    """
+    size, = FRAME_HEADER.unpack(await reader.readexactly(FRAME_HEADER.size))
+    frame = await reader.readexactly(size)
+    mac, data = frame[:FRAME_MAC_SIZE], frame[FRAME_MAC_SIZE:]
+    if not hmac.compare_digest(mac, hmac.new(key, data, hashlib.sha256).digest()):
+        raise Exception(f"invalid signature on worker frame")
+    return pickle.loads(data)
+
+def write_frame(writer: asyncio.StreamWriter, key: bytes, message):
+    data = pickle.dumps(message)
+    mac = hmac.new(key, data, hashlib.sha256).digest()
+    writer.write(FRAME_HEADER.pack(len(mac) + len(data)) + mac + data)
+
+def check_path(path: str):
+    """
+    creates path accessible only by the current user, raises if an existing
+    path is owned by another user or accessible by group or others
+    """
+    os.makedirs(path, mode=0o700, exist_ok=True)
+    path_stat = os.stat(path)
+    if path_stat.st_uid != os.getuid():
+        raise Exception(f"workers path {path} is not owned by the user running the server")
+    if stat.S_IMODE(path_stat.st_mode) & 0o077:
+        raise Exception(f"workers path {path} must not be accessible by group or others, i.e chmod 700")
+
+class WorkerPeer:
+    """
+    another worker within a WorkerGroup & the functions & sessions it provides
+
+        namespaces - {namespace: {f_name: {'config', 'method'}}}, `method`
+            forwards the call to the peer
+        sessions - ids of sessions connected to the peer
+    """
+    def __init__(self, worker_id, reader: asyncio.StreamReader, writer: asyncio.StreamWriter, key: bytes):
+        self.worker_id = worker_id
+        self.reader = reader
+        self.writer = writer
+        self.key = key
+        self.namespaces = {}
+        self.sessions = set()
+    def __repr__(self):
+        return f"WorkerPeer({self.worker_id})"
+
+    async def send(self, message):
+        write_frame(self.writer, self.key, message)
+        await self.writer.drain()
+
+    def close(self):
+        self.writer.close()
+
+class WorkerGroup:
+    """
+    EasyRpcServers on one host sharing registered functions & sessions, i.e
+    the workers of a uvicorn server started with --workers, which each hold
+    a share of the client connections
+
+    each worker listens on a unix socket `path`/<server_id>.sock & connects
+    to the other sockets within `path`, announcing to each peer:
+        REGISTRY - functions registered on the worker or by sessions connected
+            to it, {namespace: {f_name: config}}, & the ids of its sessions
+
+    calls to functions provided only by a peer are forwarded to the peer:
+        REQUEST - runs request within namespace on the peer
+        SESSION_REQUEST - server_request sent to a session connected to the peer
+        RESPONSE - response to a REQUEST or SESSION_REQUEST
+
+    path must be accessible only by the user running the server, frames are
+    pickled & signed with a key derived from server_secret, frames of workers
+    using another server_secret are rejected before unpickling
+    """
+    def __init__(self, server, path: str, delay: float = 0.1):
+        check_path(path)
+        self.server = server
+        self.log = server.log
+        self.path = path
+        self.key = frame_key(server.server_secret)
+        self.delay = delay # seconds, coalesces bursts of registry changes
+        self.worker_id = server.server_id
+        self.socket_path = os.path.join(path, f"{self.worker_id}.sock")
+        self.peers = {} # worker_id -> WorkerPeer
+        self.request_ids = itertools.count(1)
+        self.requests = PendingRequests()
+        self.listener = None
+        self.registry = None # cached local_registry()
+        self.etag = None # etag of the registry last announced
+        self.announce_task = None
+        self.tasks = set()
+
+    def __len__(self):
+        return len(self.peers)
+
+    async def start(self):
+        """
+        listens for peers within path, then connects to existing peers
+        """
+        self.listener = await asyncio.start_unix_server(self.accept, path=self.socket_path)
+        for name in os.listdir(self.path):
+            socket_path = os.path.join(self.path, name)
+            if not name.endswith('.sock') or socket_path == self.socket_path:
+                continue
+            try:
+                reader, writer = await asyncio.open_unix_connection(socket_path)
+            except ConnectionRefusedError:
+                # worker exited without removing its socket
+                self.log.debug(f"removing stale worker socket {socket_path}")
+                os.unlink(socket_path)
+                continue
+            except OSError as e:
+                self.log.error(f"unable to connect to worker socket {socket_path} - {repr(e)}")
+                continue
+            write_frame(writer, self.key, {'type': 'HELLO', 'worker_id': self.worker_id})
+            self.spawn(self.serve(reader, writer))
+        self.log.debug(f"worker {self.worker_id} listening on {self.socket_path}")
+
+    async def accept(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        write_frame(writer, self.key, {'type': 'HELLO', 'worker_id': self.worker_id})
+        await self.serve(reader, writer)
+
+    async def shutdown(self):
+        if self.listener:
+            self.listener.close()
+            self.listener = None
+            if os.path.exists(self.socket_path):
+                os.unlink(self.socket_path)
+        for peer in list(self.peers.values()):
+            peer.close()
+        for task in list(self.tasks):
+            task.cancel()
+
+    def spawn(self, coro):
+        task = asyncio.get_running_loop().create_task(coro)
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+        return task
+
+    async def serve(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """
+        reads frames of a peer until its connection closes
+        """
+        peer = None
+        try:
+            hello = await read_frame(reader, self.key)
+            peer = WorkerPeer(hello['worker_id'], reader, writer, self.key)
+            # peers connecting to each other at once each keep serving on both
+            # connections, requests are sent on the latest
+            self.peers[peer.worker_id] = peer
+            self.log.debug(f"worker {self.worker_id} connected to worker {peer.worker_id}")
+            await peer.send(self.registry_message())
+
+            while True:
+                message = await read_frame(reader, self.key)
+                if message['type'] == 'RESPONSE':
+                    self.requests.resolve(message['id'], message['response'])
+                elif message['type'] in {'REQUEST', 'SESSION_REQUEST'}:
+                    self.spawn(self.respond(peer, message))
+                elif message['type'] == 'REGISTRY':
+                    self.update_peer(peer, message)
+        except (asyncio.IncompleteReadError, ConnectionError, CancelledError):
+            pass
+        except Exception as e:
+            self.log.exception(f"error with worker connection")
+        writer.close()
+        if peer and self.peers.get(peer.worker_id) is peer:
+            del self.peers[peer.worker_id]
+            self.requests.fail_all(
+                WorkerConnectionClosed(peer.worker_id),
+                owner=peer.worker_id
+            )
+            # generators started for or relayed from peer
+            await self.server.server_generators.close_owner(peer.worker_id)
+            self.server.invalidate_dispatch()
+
+    def local_registry(self):
+        """
+        returns {namespace: {f_name: config}} of functions registered on this
+        worker or by its sessions, excluding functions of peers
+        """
+        if self.registry is None:
+            registry = {}
+            for namespace, functions in self.server.namespaces.items():
+                for f_name, function in functions.items():
+                    registry.setdefault(namespace, {})[f_name] = function['config']
+            for namespace, proxies in self.server.server_proxies.items():
+                for proxy in proxies.values():
+                    for f_name, function in proxy.namespaces.get(namespace, {}).items():
+                        registry.setdefault(namespace, {}).setdefault(f_name, function['config'])
+            self.registry = registry
+        return self.registry
+
+    def registry_message(self):
+        registry = self.local_registry()
+        sessions = sorted(self.server.server_sessions)
+        self.etag = content_hash([registry, sessions])
+        return {
+            'type': 'REGISTRY',
+            'registry': registry,
+            'sessions': sessions
+        }
+
+    def changed(self):
+        """
+        registry or sessions changed, schedules announcement to peers
+        """
+        self.registry = None
+        if not self.peers or self.announce_task:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        self.announce_task = loop.create_task(self.announce())
+
+    async def announce(self):
+        await asyncio.sleep(self.delay)
+        self.announce_task = None
+        etag = self.etag
+        message = self.registry_message()
+        if etag == self.etag:
+            # peer registries changed, not this worker's
+            return
+        for peer in list(self.peers.values()):
+            try:
+                await peer.send(message)
+            except Exception as e:
+                self.log.error(f"error announcing registry to worker {peer.worker_id} - {repr(e)}")
+
+    def update_peer(self, peer: WorkerPeer, message):
+        namespaces = {
+            namespace: {
+                f_name: {
+                    'config': config,
+                    'method': self.create_forward(peer, namespace, f_name)
+                }
+                for f_name, config in functions.items()
+            }
+            for namespace, functions in message['registry'].items()
+        }
+        # peer may announce on a connection other than the one requests are sent on
+        for target in {peer, self.peers.get(peer.worker_id, peer)}:
+            target.namespaces = namespaces
+            target.sessions = set(message['sessions'])
+        self.server.invalidate_dispatch()
+
+    def provides(self, namespace) -> bool:
+        return any(namespace in peer.namespaces for peer in self.peers.values())
+
+    def session_peer(self, session_id):
+        """
+        returns peer the session is connected to, if any
+        """
+        for peer in self.peers.values():
+            if session_id in peer.sessions:
+                return peer
+
+    def create_forward(self, peer: WorkerPeer, namespace, f_name):
+        async def forward(*args, **kwargs):
+            request = forward_route({'action': f_name, 'args': list(args), 'kwargs': kwargs})
+            span = current_span.get()
+            if span:
+                # peer continues the trace of the request being run
+                request['trace'] = span.context()
+            raise_errors = raise_remote_errors.get()
+            if raise_errors:
+                request['raise_errors'] = True
+            result = await self.request(peer, namespace, request)
+            if raise_errors and isinstance(result, dict) and 'RPC_ERROR' in result:
+                raise RemoteCallError(result['RPC_ERROR'])
+            return result
+        forward.__name__ = f_name
+        return forward
+
+    async def send_request(self, peer: WorkerPeer, message, response_expected=True, timeout: float = None):
+        """
+        sends REQUEST or SESSION_REQUEST message to peer, if response_expected
+        waits up to timeout for its response
+        """
+        if not response_expected:
+            await peer.send({**message, 'id': None})
+            return
+        request_id = next(self.request_ids)
+        future = self.requests.create(request_id, owner=peer.worker_id)
+        await peer.send({**message, 'id': request_id})
+        return await self.requests.wait(request_id, future, timeout)
+
+    async def request(self, peer: WorkerPeer, namespace, request, response_expected=True):
+        """
+        runs request within namespace on peer
+        """
+        result = await self.send_request(
+            peer,
+            {'type': 'REQUEST', 'namespace': namespace, 'request': request},
+            response_expected
+        )
+        self.relay_generator(peer, result)
+        return result
+
+    async def session_request(
+        self,
+        peer: WorkerPeer,
+        session_id,
+        request,
+        response_expected=True,
+        timeout: float = None,
+        encode_request: bool = True,
+        stream_window: int = 0
+    ):
+        """
+        sends server_request to session connected to peer
+        """
+        result = await self.send_request(
+            peer,
+            {
+                'type': 'SESSION_REQUEST',
+                'session_id': session_id,
+                'request': request,
+                'response_expected': response_expected,
+                'timeout': timeout,
+                'encode_request': encode_request,
+                'stream_window': stream_window
+            },
+            response_expected
+        )
+        self.relay_generator(peer, result)
+        return result
+
+    def relay_generator(self, peer: WorkerPeer, result):
+        """
+        generators started on peer are relayed by a generator added to the
+        server's generators under the same generator_id
+        """
+        if not isinstance(result, dict) or not 'GENERATOR_START' in result:
+            return
+        generator_id = result['GENERATOR_START']
+
+        async def send_request(request, response_expected=True):
+            return await self.send_request(
+                peer,
+                {'type': 'REQUEST', 'namespace': None, 'request': request},
+                response_expected
+            )
+        async def generator():
+            items = stream_items(send_request, generator_id, self.server.stream_window)
+            try:
+                async for item in items:
+                    yield item
+            finally:
+                await items.aclose()
+                self.server.server_generators.release(generator_id)
+        self.server.server_generators.add(generator_id, generator(), owner=peer.worker_id)
+
+    async def respond(self, peer: WorkerPeer, message):
+        request = message['request']
+        try:
+            if message['type'] == 'SESSION_REQUEST':
+                response = await self.server.server_request(
+                    message['session_id'],
+                    request,
+                    response_expected=message['response_expected'],
+                    timeout=message['timeout'],
+                    encode_request=message['encode_request'],
+                    stream_window=message['stream_window']
+                )
+                if isinstance(response, dict) and 'GENERATOR_START' in response:
+                    # relay of the session's generator, closed if peer disconnects
+                    self.server.server_generators.claim(response['GENERATOR_START'], peer.worker_id)
+            elif (
+                request.get('action') in GENERATOR_ACTIONS or
+                request.get('action') in self.local_registry().get(message['namespace'], {})
+            ):
+                # generators started for peer are owned by peer, limited by
+                # max_generators & closed if peer disconnects
+                response = await self.server.execute_request(
+                    message['namespace'],
+                    request,
+                    message['id'],
+                    session_id=peer.worker_id
+                )
+            else:
+                # never forwarded again, peers may have a stale registry
+                response = {"error": f"no action {request.get('action')} registered on worker {self.worker_id}"}
+        except Exception as e:
+            self.log.exception(f"error responding to worker {peer.worker_id}")
+            response = repr(e)
+        if message['id'] is None:
+            return
+        try:
+            await peer.send({'type': 'RESPONSE', 'id': message['id'], 'response': response})
+        except Exception as e:
+            self.log.error(f"error responding to worker {peer.worker_id} - {repr(e)}")
@@ -18,4 +18,5 @@ setuptools.setup(
      ],
      python_requires='>=3.11.0, <4',   
      install_requires=['PyJWT==2.0.0', 'fastapi', 'uvicorn', 'websockets', 'aiohttp'],
+     extras_require={'encryption': ['cryptography']},
  )
\ No newline at end of file
@@ -1,17 +1,32 @@
+import asyncio
+import json
+import os, time, tempfile
 from typing import Literal, Union, Optional
 from enum import Enum
 from click import Tuple
 from fastapi import FastAPI
 from easyrpc.server import EasyRpcServer
+from easyrpc.serialization import register_codec
+from easyrpc.tracing import Tracer
 
 server = FastAPI()
 
+# custom codec, also registered by test client
+def tagged_loads(data: bytes):
+    if not data.startswith(b'TJ'):
+        raise ValueError(f"expected tagged_json frame")
+    return json.loads(data[2:])
+register_codec('tagged_json', lambda m: b'TJ' + json.dumps(m).encode(), tagged_loads)
+
 # @server.on_event('startup')
 # async def setup():
 math_server = EasyRpcServer(
     server, 
     '/ws/core', 
-    server_secret='abcd1234'
+    server_secret='abcd1234',
+    metrics_path='/metrics',
+    wire_capture=2,
+    wire_capture_namespace='admin'
 )
 
 @math_server.origin(namespace='basic_math')
@@ -54,6 +69,14 @@ class CustomEnum(str, Enum):
 async def enum_test(e: CustomEnum) -> str:
     return e
 
+class Color(Enum):
+    red = 1
+    green = 2
+@math_server.origin(namespace='core')
+async def plain_enum_test(color: Color) -> str:
+    # arguments arrive as sent, coerced by the origin
+    return Color(color).name
+
 # generator
 class Data:
     a: int = 1
@@ -72,3 +95,168 @@ async def generator():
 async def generate_objects(*args):
     for object in args:
         yield object
+
+# registry updates
+@math_server.origin(namespace='dynamic')
+async def register_function(name: str):
+    async def function():
+        return name
+    function.__name__ = name
+    math_server.origin(function, namespace='dynamic')
+    return name
+
+# concurrent dispatch
+concurrent_server = EasyRpcServer(
+    server,
+    '/ws/concurrent',
+    server_secret='abcd1234',
+    dispatch_mode='concurrent',
+    max_concurrency=10
+)
+
+@concurrent_server.origin(namespace='concurrent')
+async def slow_echo(delay: float, value):
+    await asyncio.sleep(delay)
+    return value
+
+# executors
+@concurrent_server.origin(namespace='concurrent', executor='thread')
+def blocking_echo(delay: float, value):
+    time.sleep(delay)
+    return value
+
+@concurrent_server.origin(namespace='concurrent', executor='process')
+def process_id():
+    return os.getpid()
+
+@concurrent_server.origin(namespace='concurrent')
+def server_process_id():
+    return os.getpid()
+
+# session encryption
+encrypted_server = EasyRpcServer(
+    server,
+    '/ws/encrypted',
+    server_secret='abcd1234',
+    encryption_enabled=True
+)
+
+@encrypted_server.origin(namespace='encrypted')
+async def secret_echo(value):
+    return value
+
+@encrypted_server.origin(namespace='encrypted')
+async def secret_generator(count: int):
+    for i in range(count):
+        yield i
+
+# generator lifecycle
+generator_server = EasyRpcServer(
+    server,
+    '/ws/generators',
+    server_secret='abcd1234',
+    generator_idle_timeout=2,
+    max_generators=2
+)
+open_generators = set()
+
+@generator_server.origin(namespace='generators')
+async def tracked_generator(name: str, count: int):
+    open_generators.add(name)
+    try:
+        for i in range(count):
+            yield i
+    finally:
+        open_generators.discard(name)
+
+@generator_server.origin(namespace='generators')
+async def get_open_generators():
+    return sorted(open_generators)
+
+# workers sharing registered functions
+workers_path = tempfile.mkdtemp()
+worker_a = EasyRpcServer(
+    server,
+    '/ws/worker_a',
+    server_secret='abcd1234',
+    workers=workers_path
+)
+worker_b = EasyRpcServer(
+    server,
+    '/ws/worker_b',
+    server_secret='abcd1234',
+    workers=workers_path
+)
+
+@worker_a.origin(namespace='workers')
+async def worker_a_id():
+    return worker_a.server_id
+
+@worker_b.origin(namespace='workers')
+async def worker_b_id():
+    return worker_b.server_id
+
+@worker_b.origin(namespace='workers')
+async def worker_b_generator(count: int):
+    for i in range(count):
+        yield i
+
+# load balanced namespace group
+balanced_server = EasyRpcServer(
+    server,
+    '/ws/balanced',
+    server_secret='abcd1234'
+)
+balanced_server.create_namespace_group('balanced', 'replica_a', 'replica_b', balance='round_robin')
+
+def replica_a_functions():
+    @balanced_server.origin(namespace='replica_a')
+    async def replica():
+        return 'a'
+
+    @balanced_server.origin(namespace='replica_a')
+    async def failing_replica():
+        raise Exception('replica_a is unavailable')
+
+def replica_b_functions():
+    @balanced_server.origin(namespace='replica_b')
+    async def replica():
+        return 'b'
+
+    @balanced_server.origin(namespace='replica_b')
+    async def failing_replica():
+        return 'b'
+
+replica_a_functions()
+replica_b_functions()
+
+# duplicates registered by child servers started within tests
+balanced_server.create_namespace_group('remote_balanced', 'remote_a', 'remote_b', balance='round_robin')
+
+# traced server, spans are kept by the tracer without an exporter
+server_tracer = Tracer('traced_server')
+traced_server = EasyRpcServer(
+    server,
+    '/ws/traced',
+    server_secret='abcd1234',
+    tracer=server_tracer
+)
+
+@traced_server.origin(namespace='traced')
+async def traced_add(a: int, b: int):
+    return a + b
+
+@traced_server.origin(namespace='traced')
+async def traced_spans():
+    return [span.to_dict() for span in server_tracer.spans]
+
+# parent of child servers started within tests, relaying their generators
+relay_server = EasyRpcServer(
+    server,
+    '/ws/relay',
+    server_secret='abcd1234'
+)
+
+@relay_server.origin(namespace='relay')
+async def relay_generators():
+    return len(relay_server.server_generators)
@@ -66,4 +66,12 @@ async def test_cluster_c(manager):
     assert result == expected, f"expected result of {expected}"
 
     result = await proxy['cluster_c_func'](expected)
-    assert result == expected, f"expected result of {expected}"
\ No newline at end of file
+    assert result == expected, f"expected result of {expected}"
+    # hops counted from the origin of each function, C <- B <- A
+    hops = {
+        f_name: function['config']['hops'] 
+        for f_name, function in proxy.namespaces['shared'].items()
+    }
+    assert hops['cluster_c_func'] == 1
+    assert hops['cluster_b_func'] == 2
+    assert hops['cluster_a_func'] == 3
@@ -1,8 +1,20 @@
 import asyncio
+import json
+import inspect
 import os, time
+import tempfile
 import pytest
 import subprocess, signal
+from aiohttp import ClientSession
+from fastapi import FastAPI
 from easyrpc.proxy import EasyRpcProxy
+from easyrpc.server import EasyRpcServer
+from easyrpc.serialization import register_codec
+from easyrpc.tracing import Tracer
+from easyrpc.metrics import BUCKETS
+from easyrpc.executor import OriginExecutors
+from easyrpc.auth import session_encryption_supported
+from easyrpc.workers import read_frame, write_frame, frame_key
 
 class SomethingComplex:
     test: int = 'test'
@@ -122,4 +134,814 @@ async def test_core_functionality(manager):
     assert await core['enum_test']('c') == 'c', f"expected 'c'"
 
     with pytest.raises(TypeError):
-        await core['enum_test']('f')
\ No newline at end of file
+        await core['enum_test']('f')
+
+@pytest.mark.asyncio
+async def test_concurrent_dispatch(manager):
+    await asyncio.sleep(5)
+    proxy = await EasyRpcProxy.create(
+        SERVER, 
+        SERVER_PORT, 
+        '/ws/concurrent', 
+        server_secret='abcd1234',
+        namespace='concurrent'
+    )
+
+    # requests multiplexed on a single connection should not block each other
+    start = time.time()
+    results = await asyncio.gather(
+        *[proxy['slow_echo'](1.0, i) for i in range(10)]
+    )
+    assert results == list(range(10)), f"expected results in call order"
+    assert time.time() - start < 5, f"expected requests to run concurrently"
+
+
+@pytest.mark.asyncio
+async def test_serialization(manager):
+    await asyncio.sleep(5)
+    def tagged_loads(data: bytes):
+        if not data.startswith(b'TJ'):
+            raise ValueError(f"expected tagged_json frame")
+        return json.loads(data[2:])
+    register_codec('tagged_json', lambda m: b'TJ' + json.dumps(m).encode(), tagged_loads)
+    register_codec('client_only', json.dumps, json.loads, binary=False)
+
+    for serialization, expected_codec in [
+        ('json', 'json'),
+        ('tagged_json', 'tagged_json'),
+        (['client_only', 'json'], 'json')
+    ]:
+        proxy = await EasyRpcProxy.create(
+            SERVER, 
+            SERVER_PORT, 
+            '/ws/core', 
+            server_secret='abcd1234',
+            namespace='basic_math',
+            serialization=serialization
+        )
+        assert proxy.codec.name == expected_codec, f"expected negotiated codec {expected_codec}"
+        assert await proxy['add'](1,2) == 1 + 2 , f"expected sum result of {1+2}"
+
+    with pytest.raises(Exception):
+        await EasyRpcProxy.create(
+            SERVER, 
+            SERVER_PORT, 
+            '/ws/core', 
+            server_secret='abcd1234',
+            namespace='basic_math',
+            serialization='not_registered'
+        )
+
+
+@pytest.mark.asyncio
+async def test_compact_envelope(manager):
+    await asyncio.sleep(5)
+    for serialization in ['pickle', 'json']:
+        core = await EasyRpcProxy.create(
+            SERVER, 
+            SERVER_PORT, 
+            '/ws/core', 
+            server_secret='abcd1234',
+            namespace='core',
+            serialization=serialization,
+            envelope='compact'
+        )
+        assert core.envelope.name == 'compact', f"expected negotiated compact envelope"
+
+        result = await core['get_list']('a', 'b', 'c')
+        assert result == ['a', 'b', 'c'], f"expected result of {['a', 'b', 'c']}"
+
+        data = [d async for d in await core['generator']()]
+        assert data == [1, 2.0, False, [1,2,3]], f"expected generator results"
+
+
+@pytest.mark.asyncio
+async def test_request_timeout(manager):
+    await asyncio.sleep(5)
+    proxy = await EasyRpcProxy.create(
+        SERVER, 
+        SERVER_PORT, 
+        '/ws/concurrent', 
+        server_secret='abcd1234',
+        namespace='concurrent',
+        request_timeout=0.5
+    )
+    with pytest.raises(asyncio.TimeoutError):
+        await proxy['slow_echo'](2.0, 'slow')
+    assert len(proxy.requests) == 0, f"expected timed out request to be removed"
+
+    # cancelled callers are also removed
+    task = asyncio.create_task(proxy['slow_echo'](0.4, 'cancelled'))
+    await asyncio.sleep(0.1)
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+    assert len(proxy.requests) == 0, f"expected cancelled request to be removed"
+
+    assert await proxy['slow_echo'](0.1, 'fast') == 'fast'
+
+    # a late cleanup of a closed connection leaves requests of the session
+    # reconnected since in flight
+    slow_echo = proxy['slow_echo']
+    stale = proxy.pool.select()
+    await proxy.cleanup_proxy_session()
+    task = asyncio.create_task(slow_echo(0.4, 'reconnected'))
+    await asyncio.sleep(0.2)
+    assert not stale in proxy.pool, f"expected proxy to reconnect"
+    await proxy.cleanup_proxy_session(stale)
+    assert await task == 'reconnected'
+
+
+@pytest.mark.asyncio
+async def test_batch(manager):
+    await asyncio.sleep(5)
+    proxy = await EasyRpcProxy.create(
+        SERVER, 
+        SERVER_PORT, 
+        '/ws/core', 
+        server_secret='abcd1234',
+        namespace='basic_math'
+    )
+    async with proxy.batch() as batch:
+        added = batch['add'](1, 2)
+        subtracted = batch['subtract'](6, 1)
+        divided = batch['divide'](2, 3)
+    assert added.result() == 1 + 2, f"expected sum result of {1+2}"
+    assert subtracted.result() == 6 - 1, f"expected subtract result of {6-1}"
+    assert divided.result() == 2 / 3, f"expected divide result of {2/3}"
+
+    # arguments are validated when the call is added to a batch
+    with pytest.raises(TypeError):
+        batch['add']('a', 2)
+
+    core = await EasyRpcProxy.create(
+        SERVER, 
+        SERVER_PORT, 
+        '/ws/core', 
+        server_secret='abcd1234',
+        namespace='core'
+    )
+    batch = core.batch()
+    batch['get_list']('a', 'b', 'c')
+    batch['generator']()
+    results = await batch.execute()
+    assert results[0] == ['a', 'b', 'c'], f"expected result of {['a', 'b', 'c']}"
+    assert [d async for d in results[1]] == [1, 2.0, False, [1,2,3]], f"expected generator results"
+
+    concurrent = await EasyRpcProxy.create(
+        SERVER, 
+        SERVER_PORT, 
+        '/ws/concurrent', 
+        server_secret='abcd1234',
+        namespace='concurrent'
+    )
+    start = time.time()
+    batch = concurrent.batch(concurrent=True)
+    for i in range(5):
+        batch['slow_echo'](1.0, i)
+    assert await batch.execute() == list(range(5)), f"expected results in call order"
+    assert time.time() - start < 3, f"expected batched calls to run concurrently"
+
+
+@pytest.mark.asyncio
+async def test_coalesced_writes(manager):
+    await asyncio.sleep(5)
+    for serialization, envelope in [('pickle', 'dict'), ('json', 'dict'), ('pickle', 'compact')]:
+        proxy = await EasyRpcProxy.create(
+            SERVER, 
+            SERVER_PORT, 
+            '/ws/concurrent', 
+            server_secret='abcd1234',
+            namespace='concurrent',
+            serialization=serialization,
+            envelope=envelope,
+            coalesce_writes=True,
+            max_coalesce_messages=16
+        )
+        assert proxy.wire.coalescer is not None, f"expected server to accept coalesced writes"
+
+        results = await asyncio.gather(
+            *[proxy['slow_echo'](0.1, i) for i in range(100)]
+        )
+        assert results == list(range(100)), f"expected results in call order"
+
+
+@pytest.mark.asyncio
+async def test_session_encryption(manager):
+    await asyncio.sleep(5)
+    for serialization, envelope in [('pickle', 'dict'), ('json', 'dict'), ('pickle', 'compact')]:
+        proxy = await EasyRpcProxy.create(
+            SERVER, 
+            SERVER_PORT, 
+            '/ws/encrypted', 
+            server_secret='abcd1234',
+            namespace='encrypted',
+            encryption_enabled=True,
+            serialization=serialization,
+            envelope=envelope
+        )
+        if session_encryption_supported():
+            assert proxy.wire.cipher is not None, f"expected session encryption to be negotiated"
+        else:
+            # without the optional cryptography package requests are jwt encoded
+            assert proxy.wire.cipher is None
+
+        assert await proxy['secret_echo']({'a': [1, 2]}) == {'a': [1, 2]}
+        results = await asyncio.gather(
+            *[proxy['secret_echo'](i) for i in range(50)]
+        )
+        assert results == list(range(50))
+
+        items = [i async for i in await proxy['secret_generator'](5)]
+        assert items == list(range(5))
+
+
+@pytest.mark.asyncio
+async def test_connection_pool(manager):
+    await asyncio.sleep(5)
+    for pool_strategy in ['round_robin', 'least_in_flight']:
+        proxy = await EasyRpcProxy.create(
+            SERVER, 
+            SERVER_PORT, 
+            '/ws/concurrent', 
+            server_secret='abcd1234',
+            namespace='concurrent',
+            pool_size=4,
+            pool_strategy=pool_strategy
+        )
+        assert len(proxy.pool) == 4, f"expected 4 pooled connections"
+
+        start = time.time()
+        results = await asyncio.gather(
+            *[proxy['slow_echo'](1.0, i) for i in range(40)]
+        )
+        assert results == list(range(40)), f"expected results in call order"
+        # max_concurrency=10 per connection
+        assert time.time() - start < 3, f"expected calls to be spread across pooled connections"
+        assert all(connection.in_flight == 0 for connection in proxy.pool)
+
+
+@pytest.mark.asyncio
+async def test_argument_validation(manager):
+    await asyncio.sleep(5)
+    core = await EasyRpcProxy.create(
+        SERVER, 
+        SERVER_PORT, 
+        '/ws/core', 
+        server_secret='abcd1234',
+        namespace='core'
+    )
+    # values are validated, then forwarded to origin as passed
+    assert await core['enum_test']('a') == 'a'
+    result = await core['annotations'](1, 'b', list(range(100000)), d='d')
+    assert result[2] == list(range(100000)) and result[3] == 'd'
+
+    with pytest.raises(TypeError):
+        await core['annotations'](1, 'b', [], e='unexpected')
+    with pytest.raises(TypeError):
+        await core['annotations'](1, b='b')
+
+    # trusted callers may skip validation entirely
+    unvalidated = await EasyRpcProxy.create(
+        SERVER, 
+        SERVER_PORT, 
+        '/ws/core', 
+        server_secret='abcd1234',
+        namespace='core',
+        validate_args=False
+    )
+    result = await unvalidated['annotations']('a', 'd', (1, 2, 3))
+    assert result[0] == 'a' and result[1] == 'd', f"expected arguments to not be validated"
+
+    # plain enum members or values are sent as values any codec can encode
+    json_core = await EasyRpcProxy.create(
+        SERVER, 
+        SERVER_PORT, 
+        '/ws/core', 
+        server_secret='abcd1234',
+        namespace='core',
+        serialization='json'
+    )
+    Color = inspect.signature(json_core['plain_enum_test']).parameters['color'].annotation
+    assert await json_core['plain_enum_test'](2) == 'green'
+    assert await json_core['plain_enum_test'](Color.red) == 'red'
+    with pytest.raises(TypeError):
+        await json_core['plain_enum_test'](3)
+    assert await json_core['enum_test']('b') == 'b', f"expected connection to remain open"
+
+
+@pytest.mark.asyncio
+async def test_registry_etag(manager):
+    await asyncio.sleep(5)
+    core = await EasyRpcProxy.create(
+        SERVER, 
+        SERVER_PORT, 
+        '/ws/core', 
+        server_secret='abcd1234',
+        namespace='core'
+    )
+    etag = core.registry_etag
+    assert etag, f"expected server to send registry etag"
+    get_list = core['get_list']
+
+    # unchanged registry is not re-sent & proxy functions are reused
+    config = await core.proxy_request(
+        {
+            'action': 'get_registered_functions',
+            'args': ['core'],
+            'kwargs': {'all_functions': True, 'etag': etag}
+        }
+    )
+    assert config == {'etag': etag, 'unchanged': True}
+
+    await core.get_all_registered_functions()
+    assert core.registry_etag == etag
+    assert core['get_list'] is get_list
+    assert await core['get_list'](1, 2, 3) == [1, 2, 3]
+
+    # without an etag the full config is sent, functions with unchanged
+    # config are reused
+    core.registry_etag = None
+    await core.get_all_registered_functions()
+    assert core.registry_etag == etag
+    assert core['get_list'] is get_list
+
+
+@pytest.mark.asyncio
+async def test_registry_push(manager):
+    await asyncio.sleep(5)
+    dynamic = await EasyRpcProxy.create(
+        SERVER, 
+        SERVER_PORT, 
+        '/ws/core', 
+        server_secret='abcd1234',
+        namespace='dynamic'
+    )
+    assert dynamic.registry_push, f"expected server to push registry updates"
+    assert not 'pushed' in dynamic
+
+    # new function is pushed to proxy, rather than waiting on next poll
+    assert await dynamic['register_function']('pushed') == 'pushed'
+    for _ in range(20):
+        if 'pushed' in dynamic:
+            break
+        await asyncio.sleep(0.1)
+    assert 'pushed' in dynamic, f"expected registry update to be pushed"
+    assert await dynamic['pushed']() == 'pushed'
+
+    # proxy etag matches server registry after update
+    config = await dynamic.proxy_request(
+        {
+            'action': 'get_registered_functions',
+            'args': ['dynamic'],
+            'kwargs': {'all_functions': True, 'etag': dynamic.registry_etag}
+        }
+    )
+    assert config.get('unchanged'), f"expected proxy registry to match server"
+
+    # polls skipped while pushed updates arrive reconnect a closed session
+    await dynamic.cleanup_proxy_session()
+    assert not dynamic.connected
+    await dynamic.poll_registry()
+    assert dynamic.connected and 'pushed' in dynamic, f"expected poll to reconnect"
+
+
+@pytest.mark.asyncio
+async def test_registry_delta(manager):
+    await asyncio.sleep(5)
+    dynamic = await EasyRpcProxy.create(
+        SERVER, 
+        SERVER_PORT, 
+        '/ws/core', 
+        server_secret='abcd1234',
+        namespace='dynamic'
+    )
+    etag = dynamic.registry_etag
+    await dynamic['register_function']('first')
+    await dynamic['register_function']('second')
+
+    def get_registered_functions(etag):
+        return dynamic.proxy_request(
+            {
+                'action': 'get_registered_functions',
+                'args': ['dynamic'],
+                'kwargs': {'all_functions': True, 'etag': etag}
+            }
+        )
+
+    # known version - only changes since are sent
+    delta = await get_registered_functions(etag)
+    assert delta['delta'] and delta['previous'] == etag
+    assert sorted(f_name for func in delta['added'] for f_name in func) == ['first', 'second']
+    assert delta['removed'] == []
+
+    # unknown version - full config is sent
+    config = await get_registered_functions('unknown')
+    assert not 'delta' in config
+    assert sorted(f_name for func in config['funcs'] for f_name in func) == [
+        'first', 'register_function', 'second'
+    ]
+
+    # proxy applies delta from a stale version
+    dynamic.registry_etag = etag
+    await dynamic.get_all_registered_functions()
+    assert dynamic.registry_etag == config['etag']
+    assert await dynamic['second']() == 'second'
+
+
+@pytest.mark.asyncio
+async def test_streaming_generators(manager):
+    await asyncio.sleep(5)
+    for stream_window in [1, 3, 64]:
+        core = await EasyRpcProxy.create(
+            SERVER, 
+            SERVER_PORT, 
+            '/ws/core', 
+            server_secret='abcd1234',
+            namespace='core',
+            stream_window=stream_window
+        )
+        data = [d async for d in await core['generator']()]
+        assert data == [1, 2.0, False, [1,2,3]], f"expected generator results"
+
+        objects = [obj async for obj in await core['generate_objects'](*range(10))]
+        assert objects == list(range(10)), f"expected objects in order"
+
+    encrypted = await EasyRpcProxy.create(
+        SERVER, 
+        SERVER_PORT, 
+        '/ws/encrypted', 
+        server_secret='abcd1234',
+        namespace='encrypted',
+        encryption_enabled=True,
+        stream_window=16
+    )
+    items = [i async for i in await encrypted['secret_generator'](100)]
+    assert items == list(range(100))
+
+    # consumer stops early - chunk requested ahead is cancelled
+    items = []
+    async for i in await encrypted['secret_generator'](100):
+        items.append(i)
+        if i == 20:
+            break
+    assert items == list(range(21))
+    assert await encrypted['secret_echo']('after') == 'after'
+
+
+@pytest.mark.asyncio
+async def test_generator_lifecycle(manager):
+    await asyncio.sleep(5)
+    for stream_window in [0, 4]:
+        proxy = await EasyRpcProxy.create(
+            SERVER, 
+            SERVER_PORT, 
+            '/ws/generators', 
+            server_secret='abcd1234',
+            namespace='generators',
+            stream_window=stream_window
+        )
+        # consumer closes generator - closed on origin
+        generator = await proxy['tracked_generator']('closed', 100)
+        assert await generator.__anext__() == 0
+        assert await proxy['get_open_generators']() == ['closed']
+        await generator.aclose()
+        await asyncio.sleep(0.5)
+        assert await proxy['get_open_generators']() == []
+
+        # consumer generator garbage collected - closed on origin
+        generator = await proxy['tracked_generator']('collected', 100)
+        assert await generator.__anext__() == 0
+        del generator
+        await asyncio.sleep(0.5)
+        assert await proxy['get_open_generators']() == []
+
+        # max_generators per session
+        first = await proxy['tracked_generator']('first', 100)
+        second = await proxy['tracked_generator']('second', 100)
+        result = await proxy['tracked_generator']('third', 100)
+        assert 'error' in result, f"expected max_generators error"
+        assert await first.__anext__() == 0
+        assert await second.__anext__() == 0
+        assert await proxy['get_open_generators']() == ['first', 'second']
+
+        # idle generators are closed
+        await asyncio.sleep(4)
+        assert await proxy['get_open_generators']() == []
+        with pytest.raises(Exception):
+            [i async for i in first]
+
+    # generators of a disconnected session are closed
+    proxy = await EasyRpcProxy.create(
+        SERVER, 
+        SERVER_PORT, 
+        '/ws/generators', 
+        server_secret='abcd1234',
+        namespace='generators'
+    )
+    generator = await proxy['tracked_generator']('disconnected', 100)
+    assert await generator.__anext__() == 0
+    await proxy.cleanup_proxy_session()
+
+    proxy = await EasyRpcProxy.create(
+        SERVER, 
+        SERVER_PORT, 
+        '/ws/generators', 
+        server_secret='abcd1234',
+        namespace='generators'
+    )
+    await asyncio.sleep(0.5)
+    assert await proxy['get_open_generators']() == []
+
+
+@pytest.mark.asyncio
+async def test_relayed_generator_disconnect(manager):
+    await asyncio.sleep(5)
+    child = EasyRpcServer(FastAPI(), '/ws/relay_child', server_secret='abcd1234')
+
+    @child.origin(namespace='relay')
+    async def child_generator(count: int):
+        for i in range(count):
+            yield i
+
+    parent = await child.create_server_proxy(
+        SERVER, 
+        SERVER_PORT, 
+        '/ws/relay', 
+        server_secret='abcd1234',
+        namespace='relay'
+    )
+    proxy = await EasyRpcProxy.create(
+        SERVER, 
+        SERVER_PORT, 
+        '/ws/relay', 
+        server_secret='abcd1234',
+        namespace='relay'
+    )
+    for _ in range(20):
+        if 'child_generator' in proxy:
+            break
+        await asyncio.sleep(0.5)
+        await proxy.get_all_registered_functions()
+
+    # child disconnects mid-iteration - consumer's generator fails
+    items = []
+    with pytest.raises(Exception):
+        async for i in await proxy['child_generator'](100):
+            items.append(i)
+            if i == 2:
+                await parent.cleanup_proxy_session()
+    assert items == [0, 1, 2]
+
+    # relay closed on the parent with the child's session
+    assert await proxy['relay_generators']() == 0
+
+
+@pytest.mark.asyncio
+async def test_executors(manager):
+    await asyncio.sleep(5)
+    proxy = await EasyRpcProxy.create(
+        SERVER, 
+        SERVER_PORT, 
+        '/ws/concurrent', 
+        server_secret='abcd1234',
+        namespace='concurrent'
+    )
+    # blocking functions run in thread pool, off the event loop
+    start = time.time()
+    results = await asyncio.gather(
+        *[proxy['blocking_echo'](1.0, i) for i in range(5)],
+        proxy['slow_echo'](0.1, 'async')
+    )
+    assert results == [0, 1, 2, 3, 4, 'async']
+    assert time.time() - start < 3.0, f"expected blocking calls to run concurrently"
+
+    # cpu bound functions run in process pool
+    server_pid = await proxy['server_process_id']()
+    assert not await proxy['process_id']() == server_pid
+
+    # pools are shut down with the app, registered once the first pool exists
+    registered = []
+    executors = OriginExecutors(register_shutdown=registered.append)
+    assert executors.wrap(len, 'inline') is len and registered == []
+    assert await executors.wrap(len, 'thread')([1, 2]) == 2
+    assert await executors.wrap(len, 'thread')([1]) == 1
+    assert registered == [executors.shutdown]
+    executors.shutdown()
+
+    app = FastAPI()
+    EasyRpcServer(app, '/ws/no_executors', server_secret='abcd1234')
+    assert not app.router.on_shutdown, f"expected no shutdown handler without pools"
+
+
+@pytest.mark.asyncio
+async def test_workers(manager):
+    await asyncio.sleep(5)
+    proxy = await EasyRpcProxy.create(
+        SERVER, 
+        SERVER_PORT, 
+        '/ws/worker_a', 
+        server_secret='abcd1234',
+        namespace='workers'
+    )
+    # functions of other workers are forwarded to the worker providing them
+    assert 'worker_b_id' in proxy.proxy_funcs, f"expected worker_b functions in registry"
+    worker_a_id = await proxy['worker_a_id']()
+    worker_b_id = await proxy['worker_b_id']()
+    assert not worker_a_id == worker_b_id
+
+    # generators are relayed from the worker they run on
+    items = [i async for i in await proxy['worker_b_generator'](5)]
+    assert items == [0, 1, 2, 3, 4]
+
+    # frames not signed with the group's server_secret are rejected
+    worker_c = EasyRpcServer(
+        FastAPI(), 
+        '/ws/worker_c', 
+        server_secret='abcd1234', 
+        workers=tempfile.mkdtemp()
+    )
+    await asyncio.sleep(1)
+    reader, writer = await asyncio.open_unix_connection(worker_c.workers.socket_path)
+    await read_frame(reader, worker_c.workers.key)
+    write_frame(writer, frame_key('wrong secret'), {'type': 'HELLO', 'worker_id': 'forged'})
+    await writer.drain()
+    assert await reader.read() == b'', f"expected unsigned worker connection to be closed"
+    assert not 'forged' in worker_c.workers.peers
+    await worker_c.workers.shutdown()
+
+    # workers path accessible by others is refused
+    path = tempfile.mkdtemp()
+    os.chmod(path, 0o755)
+    with pytest.raises(Exception):
+        EasyRpcServer(FastAPI(), '/ws/worker_d', server_secret='abcd1234', workers=path)
+
+
+@pytest.mark.asyncio
+async def test_balanced_namespace_group(manager):
+    await asyncio.sleep(5)
+    proxy = await EasyRpcProxy.create(
+        SERVER, 
+        SERVER_PORT, 
+        '/ws/balanced', 
+        server_secret='abcd1234',
+        namespace='balanced'
+    )
+    # calls are spread across duplicates
+    replicas = [await proxy['replica']() for _ in range(4)]
+    assert sorted(replicas) == ['a', 'a', 'b', 'b'], f"expected calls to alternate between replicas"
+
+    # failed calls fail over to the next duplicate
+    for _ in range(4):
+        assert await proxy['failing_replica']() == 'b'
+
+
+@pytest.mark.asyncio
+async def test_balanced_child_servers(manager):
+    await asyncio.sleep(5)
+    children = {}
+    for name in ['a', 'b']:
+        child = EasyRpcServer(FastAPI(), f'/ws/child_{name}', server_secret='abcd1234')
+
+        @child.origin(namespace=f'remote_{name}')
+        async def remote_replica(name=name):
+            return name
+
+        @child.origin(namespace=f'remote_{name}')
+        async def remote_failing(name=name):
+            if name == 'a':
+                raise Exception('child a is unavailable')
+            return name
+
+        children[name] = await child.create_server_proxy(
+            SERVER, 
+            SERVER_PORT, 
+            '/ws/balanced', 
+            server_secret='abcd1234',
+            namespace=f'remote_{name}'
+        )
+
+    proxy = await EasyRpcProxy.create(
+        SERVER, 
+        SERVER_PORT, 
+        '/ws/balanced', 
+        server_secret='abcd1234',
+        namespace='remote_balanced'
+    )
+    for _ in range(20):
+        if 'remote_failing' in proxy:
+            break
+        await asyncio.sleep(0.5)
+        await proxy.get_all_registered_functions()
+
+    assert {await proxy['remote_replica']() for _ in range(4)} == {'a', 'b'}
+
+    # errors raised on child a fail over to child b
+    for _ in range(4):
+        assert await proxy['remote_failing']() == 'b'
+
+    # child a disconnects - calls fail over to child b
+    await children['a'].cleanup_proxy_session()
+    for _ in range(4):
+        assert await proxy['remote_replica']() == 'b'
+
+
+@pytest.mark.asyncio
+async def test_metrics(manager):
+    await asyncio.sleep(5)
+    proxy = await EasyRpcProxy.create(
+        SERVER, 
+        SERVER_PORT, 
+        '/ws/core', 
+        server_secret='abcd1234',
+        namespace='basic_math'
+    )
+    for i in range(5):
+        await proxy['add'](i, i)
+    await proxy['divide'](1, 0)
+
+    metrics = proxy.get_metrics()
+    assert metrics['functions']['basic_math']['add']['calls'] == 5
+    assert metrics['functions']['basic_math']['add']['latency']['count'] == 5
+    assert metrics['gauges']['pending_requests'] == 0
+
+    async with ClientSession() as session:
+        async with session.get(f"http://{SERVER}:{SERVER_PORT}/metrics") as response:
+            text = await response.text()
+    labels = 'origin_path="/ws/core",namespace="basic_math"'
+    assert f'easyrpc_calls_total{{{labels},function="add"}} 5' in text
+    assert f'easyrpc_errors_total{{{labels},function="divide"}} 1' in text
+    assert 'easyrpc_sessions' in text
+
+    # samples of each family follow its TYPE line, every bucket is present
+    families = []
+    for line in text.splitlines():
+        if line.startswith('# TYPE'):
+            families.append(line.split()[2])
+            continue
+        assert line.startswith(families[-1]), f"expected {line} within family {families[-1]}"
+    assert len(families) == len(set(families))
+    add_buckets = [line for line in text.splitlines() if f'{labels},function="add",le=' in line]
+    assert len(add_buckets) == len(BUCKETS) + 1
+
+@pytest.mark.asyncio
+async def test_tracing(manager):
+    await asyncio.sleep(5)
+    tracer = Tracer('client')
+    proxy = await EasyRpcProxy.create(
+        SERVER, 
+        SERVER_PORT, 
+        '/ws/traced', 
+        server_secret='abcd1234',
+        namespace='traced',
+        tracer=tracer
+    )
+    assert await proxy['traced_add'](1, 2) == 3
+
+    call = [span for span in tracer.spans if span.name == 'call traced_add'][0]
+    client_spans = {
+        span.name: span for span in tracer.spans if span.parent_id == call.span_id
+    }
+    assert {'queue_wait', 'serialize', 'response_wait'} <= set(client_spans)
+
+    # origin continues the trace started by the proxy
+    server_spans = {
+        span['name']: span for span in await proxy['traced_spans']()
+        if span['trace_id'] == call.trace_id
+    }
+    assert server_spans['execute traced_add']['parent_id'] == call.span_id
+    assert server_spans['respond']['parent_id'] == call.span_id
+    assert server_spans['execute traced_add']['service'] == 'traced_server'
+
+@pytest.mark.asyncio
+async def test_wire_capture(manager):
+    await asyncio.sleep(5)
+    proxy = await EasyRpcProxy.create(
+        SERVER, 
+        SERVER_PORT, 
+        '/ws/core', 
+        server_secret='abcd1234',
+        namespace='basic_math',
+        wire_capture=1
+    )
+    admin = await EasyRpcProxy.create(
+        SERVER, 
+        SERVER_PORT, 
+        '/ws/core', 
+        server_secret='abcd1234',
+        namespace='admin'
+    )
+    for i in range(10):
+        await proxy['compare'](i, 'x' * 1000)
+
+    # 1 in 2 frames sent & received by the server are captured
+    frames = await admin['get_wire_capture']()
+    assert frames
+    assert {'sent', 'received'} <= {frame['direction'] for frame in frames}
+    truncated = [frame for frame in frames if frame['truncated']]
+    assert truncated and all(frame['size'] > 256 for frame in truncated)
+    assert len(await admin['get_wire_capture'](limit=2)) == 2
+    assert len(await admin['get_wire_capture'](limit=None)) >= len(frames)
+
+    # every frame is captured by the proxy
+    assert len(proxy.get_wire_capture()) >= 20